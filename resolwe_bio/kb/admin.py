@@ -7,7 +7,7 @@ Admin
 """
 from django.contrib import admin
 
-from .models import Feature, Mapping
+from .models import Feature, Mapping, MappingClosure
 
 
 class FeatureAdmin(admin.ModelAdmin):
@@ -24,5 +24,12 @@ class MappingAdmin(admin.ModelAdmin):
     model = Mapping
 
 
+class MappingClosureAdmin(admin.ModelAdmin):
+    """Admin configuration for MappingClosure model."""
+
+    model = MappingClosure
+
+
 admin.site.register(Feature, FeatureAdmin)
 admin.site.register(Mapping, MappingAdmin)
+admin.site.register(MappingClosure, MappingClosureAdmin)
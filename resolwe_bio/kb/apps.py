@@ -6,6 +6,7 @@ Knowledge Base App Configuration
 
 """
 from django.apps import AppConfig
+from django.core import checks
 
 
 class KnowledgeBaseConfig(AppConfig):
@@ -14,3 +15,13 @@ class KnowledgeBaseConfig(AppConfig):
     name = 'resolwe_bio.kb'
     label = 'resolwe_bio_kb'
     verbose_name = 'Resolwe Bioinformatics Knowledge Base'
+
+    def ready(self):
+        """Perform application initialization."""
+        # Connect all signals
+        from . import signals  # pylint: disable=unused-variable
+        from .caching import check_cache_backend
+        from .lookup import check_cache_backend as check_lookup_cache_backend
+
+        checks.register(check_cache_backend)
+        checks.register(check_lookup_cache_backend)
@@ -0,0 +1,213 @@
+""".. Ignore pydocstyle D400.
+
+==========================
+Feature Autocomplete Index
+==========================
+
+In-memory prefix index used for feature autocompletion instead of the
+``edgeNGram`` analyzed field in Elasticsearch. It is enabled by setting
+``KB_AUTOCOMPLETE_BACKEND`` to ``'memory'``.
+
+Each process keeps sorted arrays of lowercased feature ids, names and
+aliases per (source, species) pair. The first autocomplete request of a
+process starts a background thread, which builds the index and then
+checks every ``KB_AUTOCOMPLETE_REFRESH_INTERVAL`` seconds (``60`` by
+default) whether features have changed and rebuilds it if needed.
+Requests are served from the last built index, and from the
+``autocomplete`` field in Elasticsearch until the first index is built.
+Setting the interval to ``0`` disables the background thread, and the
+index is then built and refreshed in the request thread instead.
+
+Changes of features are signalled through a version stored in the
+Django cache, so a cache backend shared between processes must be
+configured for changes to reach all of them.
+
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import array
+import bisect
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from .caching import get_feature_version
+from .models import Feature
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+BACKEND_ELASTICSEARCH = 'elasticsearch'
+BACKEND_MEMORY = 'memory'
+
+DEFAULT_REFRESH_INTERVAL = 60
+
+
+def get_autocomplete_backend():
+    """Return the configured autocomplete backend."""
+    return getattr(settings, 'KB_AUTOCOMPLETE_BACKEND', BACKEND_ELASTICSEARCH)
+
+
+def get_refresh_interval():
+    """Return the configured interval of index refreshes in seconds."""
+    return getattr(settings, 'KB_AUTOCOMPLETE_REFRESH_INTERVAL', DEFAULT_REFRESH_INTERVAL)
+
+
+class TermArray(object):
+    """Sequence of terms stored in a single string.
+
+    Terms are slices of the string between consecutive offsets, so no
+    Python object is kept per term.
+
+    """
+
+    def __init__(self, terms):
+        """Store terms from a list of strings."""
+        self.data = ''.join(terms)
+        self.offsets = array.array('l', [0])
+        for term in terms:
+            self.offsets.append(self.offsets[-1] + len(term))
+
+    def __len__(self):
+        """Return the number of terms."""
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        """Return term at ``index``."""
+        return self.data[self.offsets[index]:self.offsets[index + 1]]
+
+
+class PrefixIndex(object):
+    """Sorted array of terms and features they belong to."""
+
+    def __init__(self, entries):
+        """Build index from an iterable of (term, feature rank, exact, feature id) tuples.
+
+        Features are ordered by their ranks in search results. Terms
+        marked as exact (feature ids and names) are placed before other
+        features' terms when they are equal to the query.
+
+        """
+        entries = sorted(entries)
+        self.terms = TermArray([term for term, _, _, _ in entries])
+        self.ranks = array.array('l', (rank for _, rank, _, _ in entries))
+        self.exact = array.array('b', (exact for _, _, exact, _ in entries))
+        self.ids = array.array('l', (feature_id for _, _, _, feature_id in entries))
+
+    def search(self, prefix):
+        """Return (sort key, feature id) pairs of terms starting with ``prefix``."""
+        start = bisect.bisect_left(self.terms, prefix)
+        # All terms starting with the prefix are sorted before the prefix
+        # followed by the largest character.
+        end = bisect.bisect_left(self.terms, prefix + '\U0010ffff', lo=start)
+        return [
+            ((not (self.exact[i] and self.terms[i] == prefix), self.ranks[i]), self.ids[i])
+            for i in range(start, end)
+        ]
+
+
+class FeaturePrefixIndex(object):
+    """Per-process prefix indexes of features."""
+
+    def __init__(self):
+        """Initialize empty indexes."""
+        #: pair of version of features and prefix indexes by (source,
+        #: species) pairs built from them, replaced as a whole when
+        #: indexes are rebuilt
+        self.snapshot = None
+
+        #: background thread refreshing indexes
+        self.thread = None
+
+        self.lock = threading.Lock()
+
+    def build(self):
+        """Build and return indexes from all features."""
+        entries = {}
+
+        features = Feature.objects.order_by('name', 'id').values_list(
+            'id', 'source', 'species', 'feature_id', 'name', 'aliases'
+        )
+        for rank, (pk, source, species, feature_id, name, aliases) in enumerate(features.iterator()):
+            exact = set(term.lower() for term in [feature_id, name])
+            terms = exact.union(term.lower() for term in aliases)
+            entries.setdefault((source, species), []).extend(
+                (term, rank, term in exact, pk) for term in terms
+            )
+
+        return {key: PrefixIndex(key_entries) for key, key_entries in entries.items()}
+
+    def refresh(self):
+        """Rebuild indexes if features have changed since they were built."""
+        version = get_feature_version()
+        if self.snapshot is not None and self.snapshot[0] == version:
+            return
+
+        self.snapshot = (version, self.build())
+
+    def run(self, interval):
+        """Refresh indexes every ``interval`` seconds."""
+        while True:
+            try:
+                self.refresh()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Error refreshing feature autocomplete index.")
+            finally:
+                # Do not keep the connection of this thread open between
+                # refreshes.
+                connection.close()
+
+            time.sleep(interval)
+
+    def start(self, interval):
+        """Start refreshing indexes in a background thread, unless already started."""
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, args=(interval,), name='feature-autocomplete-index')
+                self.thread.daemon = True
+                self.thread.start()
+
+    def search(self, query, sources=None, species=None):
+        """Return ids of features matching the autocomplete query.
+
+        Features with feature id or name exactly matching the query are
+        returned first, followed by other features with a feature id,
+        name or alias starting with the query. Features are ordered by
+        name otherwise. Features can be limited to the given lists of
+        ``sources`` and ``species``.
+
+        Return ``None`` if indexes are built in the background and have
+        not been built yet.
+
+        """
+        interval = get_refresh_interval()
+        if interval:
+            self.start(interval)
+        else:
+            with self.lock:
+                self.refresh()
+
+        snapshot = self.snapshot
+        if snapshot is None:
+            return None
+
+        query = query.lower()
+        if not query:
+            return []
+
+        keys = {}
+        for (index_source, index_species), index in snapshot[1].items():
+            if sources is not None and index_source not in sources:
+                continue
+            if species is not None and index_species not in species:
+                continue
+
+            for key, pk in index.search(query):
+                keys[pk] = min(key, keys.get(pk, key))
+
+        return sorted(keys, key=keys.get)
+
+
+feature_prefix_index = FeaturePrefixIndex()  # pylint: disable=invalid-name
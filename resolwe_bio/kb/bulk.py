@@ -0,0 +1,343 @@
+""".. Ignore pydocstyle D400.
+
+===============
+Bulk Operations
+===============
+
+Set-based operations on knowledge base models used by management
+commands and API endpoints which process large numbers of objects.
+
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import json
+
+from django.db import connection
+
+from .models import Feature, Mapping
+
+# NOTE: Features are manually upserted here, so take care that the order of
+#       fields is synced with the model definition and the SQL query below.
+FEATURE_KEY_FIELDS = ('source', 'feature_id', 'species')
+FEATURE_VALUE_FIELDS = ('type', 'sub_type', 'name', 'full_name', 'description', 'aliases')
+
+# NOTE: Mappings are manually inserted here, so take care that the order of
+#       fields is synced with the model definition and the SQL query below.
+MAPPING_FIELDS = (
+    'relation_type', 'source_db', 'source_id', 'source_species', 'target_db', 'target_id', 'target_species'
+)
+
+# Mappings are identified by the fields of their unique constraint, in the
+# order of ``MAPPING_FIELDS``.
+MAPPING_KEY_FIELDS = tuple(
+    field for field in MAPPING_FIELDS
+    if field in Mapping._meta.unique_together[0]  # pylint: disable=no-member,protected-access
+)
+
+# Temporary table holding keys of all imported objects when importing in
+# sync mode, which deletes objects missing from the imported files.
+SYNC_TABLE = 'resolwe_bio_kb_sync'
+
+
+def get_feature_key(feature):
+    """Return key (a tuple of ``FEATURE_KEY_FIELDS`` values) of a feature given as a dict."""
+    return tuple(feature[field] for field in FEATURE_KEY_FIELDS)
+
+
+def upsert_features(features):
+    """Insert new and update changed features in a single statement.
+
+    Features are given as an iterable of dicts containing all fields in
+    ``FEATURE_KEY_FIELDS`` and ``FEATURE_VALUE_FIELDS``. Each feature
+    (identified by source, feature id and species) may appear only once,
+    since a single statement can not affect the same row twice.
+
+    Features are staged as a JSON array and merged into the table using
+    ``INSERT ... ON CONFLICT DO UPDATE``. Existing features are only
+    updated if their content hash differs.
+
+    Return a tuple of lists of inserted and updated feature ids.
+
+    """
+    # NOTE: For performance reasons features are serialized as JSON lists
+    #       instead of dicts.
+    rows = [
+        [feature[field] for field in FEATURE_KEY_FIELDS + FEATURE_VALUE_FIELDS]
+        + [Feature.compute_content_hash(feature)]
+        for feature in features
+    ]
+    if not rows:
+        return [], []
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            WITH tmp AS (
+                INSERT INTO {table_name} (
+                    source, feature_id, species,
+                    type, sub_type, name, full_name, description, aliases,
+                    content_hash
+                )
+                SELECT
+                    value->>0, value->>1, value->>2,
+                    value->>3, value->>4, value->>5, value->>6, value->>7,
+                    ARRAY(SELECT json_array_elements_text(value->8)),
+                    value->>9
+                FROM json_array_elements(%s)
+                ON CONFLICT (source, feature_id, species) DO UPDATE SET
+                    type = EXCLUDED.type,
+                    sub_type = EXCLUDED.sub_type,
+                    name = EXCLUDED.name,
+                    full_name = EXCLUDED.full_name,
+                    description = EXCLUDED.description,
+                    aliases = EXCLUDED.aliases,
+                    content_hash = EXCLUDED.content_hash
+                WHERE {table_name}.content_hash IS DISTINCT FROM EXCLUDED.content_hash
+                -- System column 'xmax' is only set for updated rows.
+                RETURNING id, xmax = 0 AS inserted
+            )
+            SELECT
+                COALESCE(array_agg(id) FILTER (WHERE inserted), ARRAY[]::INTEGER[]) AS inserted_ids,
+                COALESCE(array_agg(id) FILTER (WHERE NOT inserted), ARRAY[]::INTEGER[]) AS updated_ids
+            FROM tmp;
+            """.format(
+                table_name=Feature._meta.db_table,  # pylint: disable=no-member,protected-access
+            ),
+            params=[json.dumps(rows)]
+        )
+        inserted_ids, updated_ids = cursor.fetchone()
+
+    return inserted_ids, updated_ids
+
+
+def filter_changed_features(features):
+    """Return features which are new or differ from the stored ones.
+
+    Features are given as an iterable of dicts as in
+    :func:`upsert_features`. Only keys and content hashes of stored
+    features are fetched from the database, so unchanged features are
+    skipped without comparing (or writing) their values.
+
+    """
+    features = list(features)
+    if not features:
+        return []
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT {table_name}.source, {table_name}.feature_id, {table_name}.species, {table_name}.content_hash
+            FROM json_array_elements(%s)
+            JOIN {table_name}
+                ON value->>0 = {table_name}.source
+                AND value->>1 = {table_name}.feature_id
+                AND value->>2 = {table_name}.species;
+            """.format(
+                table_name=Feature._meta.db_table,  # pylint: disable=no-member,protected-access
+            ),
+            params=[json.dumps([get_feature_key(feature) for feature in features])]
+        )
+        stored_hashes = {tuple(row[:3]): row[3] for row in cursor.fetchall()}
+
+    return [
+        feature for feature in features
+        if stored_hashes.get(get_feature_key(feature)) != Feature.compute_content_hash(feature)
+    ]
+
+
+def insert_mappings(mappings):
+    """Insert mappings which do not exist yet in a single statement.
+
+    Mappings are given as an iterable of tuples with values of fields in
+    ``MAPPING_FIELDS``. Tuples are serialized to JSON lists and staged
+    as a JSON array. Mappings conflicting with existing ones on the
+    unique constraint (``MAPPING_KEY_FIELDS``) are skipped, which is
+    also safe when the same mappings are inserted concurrently.
+
+    Return a list of inserted mapping ids.
+
+    """
+    mappings = list(mappings)
+    if not mappings:
+        return []
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            WITH tmp AS(
+                INSERT INTO {table_name} (
+                    relation_type, source_db, source_id, source_species,
+                    target_db, target_id, target_species
+                )
+                SELECT
+                    value->>0, value->>1, value->>2, value->>3,
+                    value->>4, value->>5, value->>6
+                FROM json_array_elements(%s)
+                ON CONFLICT ({key_fields}) DO NOTHING
+                RETURNING id
+            )
+            SELECT COALESCE(array_agg(id), ARRAY[]::INTEGER[]) AS ids FROM tmp;
+            """.format(
+                table_name=Mapping._meta.db_table,  # pylint: disable=no-member,protected-access
+                key_fields=', '.join(MAPPING_KEY_FIELDS),
+            ),
+            params=[json.dumps(mappings)]
+        )
+        return cursor.fetchone()[0]
+
+
+def get_feature_ids(keys):
+    """Return a dict of feature ids by their keys.
+
+    Keys are tuples with values of fields in ``FEATURE_KEY_FIELDS``.
+
+    """
+    keys = list(keys)
+    if not keys:
+        return {}
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT {table_name}.id, {table_name}.source, {table_name}.feature_id, {table_name}.species
+            FROM json_array_elements(%s)
+            JOIN {table_name}
+                ON value->>0 = {table_name}.source
+                AND value->>1 = {table_name}.feature_id
+                AND value->>2 = {table_name}.species;
+            """.format(
+                table_name=Feature._meta.db_table,  # pylint: disable=no-member,protected-access
+            ),
+            params=[json.dumps(keys)]
+        )
+        return {tuple(row[1:]): row[0] for row in cursor.fetchall()}
+
+
+def get_mapping_ids(keys):
+    """Return a dict of mapping ids by their keys.
+
+    Keys are tuples with values of fields in ``MAPPING_KEY_FIELDS``.
+
+    """
+    keys = list(keys)
+    if not keys:
+        return {}
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT {table_name}.id, {key_columns}
+            FROM json_array_elements(%s)
+            JOIN {table_name}
+                ON {key_condition};
+            """.format(
+                table_name=Mapping._meta.db_table,  # pylint: disable=no-member,protected-access
+                key_columns=', '.join(
+                    '{}.{}'.format(Mapping._meta.db_table, field)  # pylint: disable=no-member,protected-access
+                    for field in MAPPING_KEY_FIELDS
+                ),
+                key_condition=' AND '.join(
+                    'value->>{index} = {table_name}.{field}'.format(
+                        index=index,
+                        table_name=Mapping._meta.db_table,  # pylint: disable=no-member,protected-access
+                        field=field,
+                    )
+                    for index, field in enumerate(MAPPING_KEY_FIELDS)
+                ),
+            ),
+            params=[json.dumps(keys)]
+        )
+        return {tuple(row[1:]): row[0] for row in cursor.fetchall()}
+
+
+def create_sync_table(key_fields):
+    """Create temporary table holding keys of objects being synchronized.
+
+    Keys are tuples with values of ``key_fields``. The table exists until
+    :func:`delete_missing` is called or the connection is closed.
+
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            DROP TABLE IF EXISTS {sync_table};
+            CREATE TEMPORARY TABLE {sync_table} (
+                {columns},
+                UNIQUE ({fields})
+            );
+            """.format(
+                sync_table=SYNC_TABLE,
+                columns=', '.join('{} VARCHAR'.format(field) for field in key_fields),
+                fields=', '.join(key_fields),
+            )
+        )
+
+
+def stage_sync_keys(key_fields, keys):
+    """Add keys (tuples with values of ``key_fields``) to the sync table."""
+    keys = list(keys)
+    if not keys:
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO {sync_table} ({fields})
+            SELECT {values}
+            FROM json_array_elements(%s)
+            ON CONFLICT DO NOTHING;
+            """.format(
+                sync_table=SYNC_TABLE,
+                fields=', '.join(key_fields),
+                values=', '.join('value->>{}'.format(index) for index in range(len(key_fields))),
+            ),
+            params=[json.dumps(keys)]
+        )
+
+
+def delete_missing(model, group_fields, key_fields):
+    """Delete objects missing from the sync table in a single statement.
+
+    Only objects in groups (values of ``group_fields``) which appear in
+    the sync table are deleted, if their key (values of ``key_fields``)
+    is not in the sync table. The sync table is dropped afterwards.
+
+    Return a list of deleted object ids.
+
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            WITH deleted AS (
+                DELETE FROM {table_name}
+                WHERE ({group_columns}) IN (SELECT DISTINCT {group_fields} FROM {sync_table})
+                    AND NOT EXISTS (
+                        SELECT 1 FROM {sync_table}
+                        WHERE {key_condition}
+                    )
+                RETURNING id
+            )
+            SELECT COALESCE(array_agg(id), ARRAY[]::INTEGER[]) FROM deleted;
+            """.format(
+                table_name=model._meta.db_table,  # pylint: disable=protected-access
+                sync_table=SYNC_TABLE,
+                group_columns=', '.join(
+                    '{}.{}'.format(model._meta.db_table, field)  # pylint: disable=protected-access
+                    for field in group_fields
+                ),
+                group_fields=', '.join(group_fields),
+                key_condition=' AND '.join(
+                    '{sync_table}.{field} = {table_name}.{field}'.format(
+                        sync_table=SYNC_TABLE,
+                        table_name=model._meta.db_table,  # pylint: disable=protected-access
+                        field=field,
+                    )
+                    for field in key_fields
+                ),
+            )
+        )
+        deleted_ids = cursor.fetchone()[0]
+
+        cursor.execute("DROP TABLE {sync_table};".format(sync_table=SYNC_TABLE))
+
+    return deleted_ids
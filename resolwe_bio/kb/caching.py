@@ -0,0 +1,137 @@
+""".. Ignore pydocstyle D400.
+
+====================
+Search Results Cache
+====================
+
+Cache of feature search results stored in the Django cache backend.
+
+Cache keys contain the current version of features, which is changed
+whenever features are changed. Entries of previous versions are never
+read again and are evicted by the cache backend. The time (in seconds)
+entries are kept is set with the ``KB_SEARCH_CACHE_TIMEOUT`` setting,
+and ``0`` disables caching.
+
+The version is only changed in the cache of the process changing
+features, so caching is only enabled by default if the default cache
+backend is shared between processes (e.g. Memcached or Redis). A
+warning is issued by the system check framework if caching is enabled
+with a per-process cache backend.
+
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import hashlib
+import json
+import uuid
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+#: cache key of the current version of features
+FEATURE_VERSION_CACHE_KEY = 'resolwe_bio_kb_feature_version'
+
+DEFAULT_TIMEOUT = 300
+
+#: cache backends, which are not shared between processes
+PER_PROCESS_BACKENDS = (
+    'django.core.cache.backends.dummy.DummyCache',
+    'django.core.cache.backends.locmem.LocMemCache',
+)
+
+
+def is_cache_shared():
+    """Check if the default cache backend is shared between processes."""
+    return settings.CACHES['default']['BACKEND'] not in PER_PROCESS_BACKENDS
+
+
+def get_cache_timeout():
+    """Return the time search results are cached in seconds (``0`` if caching is disabled)."""
+    return getattr(settings, 'KB_SEARCH_CACHE_TIMEOUT', DEFAULT_TIMEOUT if is_cache_shared() else 0)
+
+
+def check_cache_backend(app_configs, **kwargs):
+    """Warn if search results are cached with a per-process cache backend."""
+    if get_cache_timeout() and not is_cache_shared():
+        return [checks.Warning(
+            "Feature search results are cached with a cache backend which is not shared between processes.",
+            hint="Configure a shared cache backend or set KB_SEARCH_CACHE_TIMEOUT to 0, otherwise other "
+                 "processes return stale results after features are changed.",
+            id='resolwe_bio_kb.W001',
+        )]
+
+    return []
+
+
+def get_feature_version():
+    """Return the current version of features."""
+    version = cache.get(FEATURE_VERSION_CACHE_KEY)
+    if version is None:
+        # Version may have been evicted, so make sure that it is not reused.
+        cache.add(FEATURE_VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+        version = cache.get(FEATURE_VERSION_CACHE_KEY)
+
+    return version
+
+
+def invalidate_feature_search():
+    """Invalidate all cached feature search results."""
+    cache.set(FEATURE_VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+
+
+class CachedSearchMixin(object):
+    """Mixin caching responses of Elasticsearch feature viewsets.
+
+    Responses are cached by normalized query, filtering fields, ordering
+    and pagination parameters. Feature objects have no permissions, so
+    responses are shared between all users.
+
+    """
+
+    #: name of the parameter holding the general query
+    query_param = 'query'
+
+    #: whether the response of the current request may be cached, unset
+    #: by views serving a degraded response
+    cache_response = True
+
+    def normalize_query(self, query):
+        """Normalize the general query, so equivalent queries share cache entries."""
+        return query
+
+    def get_cache_key(self):
+        """Return cache key for the current request."""
+        params = {
+            self.query_param: self.normalize_query(self.get_query_param(self.query_param, None)),
+            'ordering': self.get_query_param('ordering', self.ordering),
+        }
+        for field in self.filtering_fields:
+            params[field] = self.get_query_param(field, None)
+        for param in (self.paginator.limit_query_param, self.paginator.offset_query_param):
+            params[param] = self.get_query_param(param, None)
+
+        digest = hashlib.md5(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()
+        return 'resolwe_bio_kb_search:{}:{}:{}'.format(type(self).__name__, get_feature_version(), digest)
+
+    def list_with_post(self, request):
+        """Return cached response if available."""
+        timeout = get_cache_timeout()
+        if not timeout:
+            return super(CachedSearchMixin, self).list_with_post(request)
+
+        cache_key = self.get_cache_key()
+        data = cache.get(cache_key)
+        if data is None:
+            response = super(CachedSearchMixin, self).list_with_post(request)
+            if response.status_code != 200 or not self.cache_response:
+                return response
+
+            # Store plain data instead of serializer return types.
+            data = json.loads(JSONRenderer().render(response.data).decode('utf-8'))
+            cache.set(cache_key, data, timeout)
+
+        return Response(data)
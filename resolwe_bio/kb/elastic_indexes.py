@@ -40,7 +40,8 @@ class FeatureSearchDocument(BaseDocument):
         fields={'lower': {'type': 'string', 'analyzer': identifier_analyzer}},
     )
 
-    # Autocomplete.
+    # Autocomplete. The field is kept when autocompletion is served from
+    # the in-memory prefix index, which falls back to it until it is built.
     autocomplete = dsl.String(
         multi=True,
         # During indexing, we lowercase terms and tokenize using edge_ngram.
@@ -0,0 +1,176 @@
+""".. Ignore pydocstyle D400.
+
+================
+Index Management
+================
+
+Elasticsearch operations on knowledge base indexes, which are not
+provided by the index builder.
+
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import logging
+import time
+
+import elasticsearch_dsl as dsl
+from elasticsearch.helpers import bulk, parallel_bulk
+from elasticsearch_dsl.connections import connections
+
+from resolwe.elastic.builder import index_builder
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+DEFAULT_CHUNK_SIZE = 500
+DEFAULT_THREAD_COUNT = 4
+
+#: index settings restored after the rebuild if the index did not exist yet
+DEFAULT_REFRESH_INTERVAL = '1s'
+DEFAULT_NUMBER_OF_REPLICAS = 1
+
+
+def get_indexes(model):
+    """Return indexes of objects of ``model``."""
+    return [index for index in index_builder.indexes if index.object_type == model]
+
+
+def remove_documents(model, ids):
+    """Remove documents of ``model`` objects with ``ids`` in bulk.
+
+    Objects are usually already deleted from the database, so documents
+    are removed by their ids instead of by objects.
+
+    """
+    if not ids:
+        return
+
+    for index in get_indexes(model):
+        index._refresh_connection()  # pylint: disable=protected-access
+
+        actions = (
+            {
+                '_op_type': 'delete',
+                '_index': index._index_name,  # pylint: disable=protected-access
+                '_type': index.document_class._doc_type.name,  # pylint: disable=protected-access
+                # Ids are generated the same way as in ``BaseIndex.generate_id``.
+                '_id': '{}_{}'.format(model.__name__.lower(), pk),
+            }
+            for pk in ids
+        )
+        # Documents which were never indexed are not found and are ignored.
+        _, errors = bulk(connections.get_connection(), actions, refresh=True, raise_on_error=False)
+        errors = [error for error in errors if error.get('delete', {}).get('status') != 404]
+        if errors:
+            logger.error("Failed to remove %d documents from '%s' index.", len(errors), type(index).__name__)
+
+
+def get_live_settings(connection, alias):
+    """Return refresh interval and number of replicas of the live index."""
+    if not connection.indices.exists(index=alias):
+        return DEFAULT_REFRESH_INTERVAL, DEFAULT_NUMBER_OF_REPLICAS
+
+    # Settings are returned by names of concrete indexes behind the alias.
+    live_settings = next(iter(connection.indices.get_settings(index=alias).values()))['settings']['index']
+    return (
+        live_settings.get('refresh_interval', DEFAULT_REFRESH_INTERVAL),
+        live_settings.get('number_of_replicas', DEFAULT_NUMBER_OF_REPLICAS),
+    )
+
+
+def generate_actions(index, index_name):
+    """Build documents of all objects in ``index`` as bulk actions."""
+    for obj in index.queryset.all().order_by('pk').iterator():
+        if index.filter(obj) is False:
+            continue
+
+        # Documents are built by the index and taken from its push queue
+        # instead of being pushed to the live index.
+        index.process_object(index.preprocess_object(obj))
+        for document in index.push_queue:
+            action = document.to_dict(True)
+            action['_index'] = index_name
+            yield action
+        index.push_queue = []
+
+
+def rebuild_index(index, chunk_size=DEFAULT_CHUNK_SIZE, thread_count=DEFAULT_THREAD_COUNT, replace_index=False):
+    """Rebuild ``index`` into a new versioned index and switch the alias.
+
+    A new index named by the live index and the current time is created
+    with refresh disabled and without replicas, and filled with parallel
+    bulk requests of ``chunk_size`` documents. Afterwards its settings
+    are restored to the ones of the live index and the alias (named as
+    the live index) is atomically switched to it, so searches never see
+    a partially built index. Previous versions are deleted.
+
+    Objects changed while the index is being rebuilt are only indexed in
+    the previous version, so rebuilds should not run during imports.
+
+    If the live index is a concrete index instead of an alias (i.e. it
+    was created before rebuilds with aliases were used), it has to be
+    deleted before the alias can be created, and searches fail until the
+    alias is created. This is only done if ``replace_index`` is set, and
+    ``RuntimeError`` is raised before the new index is built otherwise.
+
+    Return the name of the new index.
+
+    """
+    index._refresh_connection()  # pylint: disable=protected-access
+    connection = connections.get_connection()
+
+    alias = index._index_name  # pylint: disable=protected-access
+    index_name = '{}_{}'.format(alias, int(time.time() * 1000))
+    replace_live_index = connection.indices.exists(index=alias) and not connection.indices.exists_alias(name=alias)
+    if replace_live_index and not replace_index:
+        raise RuntimeError(
+            "Index '{}' is not an alias and has to be deleted to be replaced with one.".format(alias)
+        )
+
+    refresh_interval, number_of_replicas = get_live_settings(connection, alias)
+
+    new_index = dsl.Index(index_name)
+    new_index.doc_type(index.document_class)
+    new_index.settings(number_of_replicas=0, refresh_interval='-1')
+    new_index.create()
+
+    logger.info("Building '%s' Elasticsearch index...", index_name)
+    count_failed = 0
+    actions = generate_actions(index, index_name)
+    for success, _ in parallel_bulk(connection, actions, thread_count=thread_count, chunk_size=chunk_size,
+                                    raise_on_error=False):
+        if not success:
+            count_failed += 1
+
+    if count_failed:
+        new_index.delete()
+        raise RuntimeError("Failed to index {} documents in '{}' index.".format(count_failed, index_name))
+
+    connection.indices.put_settings(index=index_name, body={
+        'index': {
+            'refresh_interval': refresh_interval,
+            'number_of_replicas': number_of_replicas,
+        },
+    })
+    new_index.refresh()
+
+    if replace_live_index:
+        old_indexes = []
+        # Searches fail between deleting the live index and creating the
+        # alias.
+        logger.warning("Deleting index '%s' to replace it with an alias.", alias)
+        connection.indices.delete(index=alias)
+    elif connection.indices.exists_alias(name=alias):
+        old_indexes = list(connection.indices.get_alias(name=alias).keys())
+    else:
+        old_indexes = []
+
+    actions = [{'remove': {'index': old_index, 'alias': alias}} for old_index in old_indexes]
+    actions.append({'add': {'index': index_name, 'alias': alias}})
+    connection.indices.update_aliases(body={'actions': actions})
+
+    for old_index in old_indexes:
+        connection.indices.delete(index=old_index)
+
+    logger.info("Switched '%s' alias to '%s' Elasticsearch index.", alias, index_name)
+
+    return index_name
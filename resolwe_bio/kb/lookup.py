@@ -0,0 +1,126 @@
+""".. Ignore pydocstyle D400.
+
+=====================
+Mapping Lookup Tables
+=====================
+
+In-memory lookup tables used to translate feature identifiers between
+databases without querying Elasticsearch.
+
+Each process builds a table for a (source db, source species, target
+db, target species) combination on the first request and keeps it until
+mappings are changed. Changes are signalled through a version stored in
+the Django cache, so a cache backend shared between processes must be
+configured for invalidation to reach all of them.
+
+With a per-process cache backend, changes made by other processes (e.g.
+by ``insert_mappings`` django-admin command) are detected from the
+largest mapping id, which only reflects inserted mappings, and tables
+are additionally dropped every ``KB_MAPPING_LOOKUP_TIMEOUT`` seconds
+(``300`` by default, ``0`` disables expiration). A warning is issued by
+the system check framework in this case.
+
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache
+from django.db.models import Max
+
+from .caching import is_cache_shared
+from .models import Mapping
+
+#: cache key of the current version of mappings
+VERSION_CACHE_KEY = 'resolwe_bio_kb_mapping_version'
+
+DEFAULT_TIMEOUT = 300
+
+
+def get_lookup_timeout():
+    """Return the time lookup tables are kept with a per-process cache backend in seconds."""
+    return getattr(settings, 'KB_MAPPING_LOOKUP_TIMEOUT', DEFAULT_TIMEOUT)
+
+
+def check_cache_backend(app_configs, **kwargs):
+    """Warn if lookup tables are invalidated through a per-process cache backend."""
+    if not is_cache_shared():
+        return [checks.Warning(
+            "Mapping lookup tables are invalidated through a cache backend which is not shared between "
+            "processes.",
+            hint="Configure a shared cache backend, otherwise other processes only detect inserted mappings "
+                 "and drop their lookup tables every KB_MAPPING_LOOKUP_TIMEOUT seconds.",
+            id='resolwe_bio_kb.W002',
+        )]
+
+    return []
+
+
+def get_mapping_version():
+    """Return the current version of mappings."""
+    version = cache.get(VERSION_CACHE_KEY)
+    if is_cache_shared():
+        return version
+
+    timeout = get_lookup_timeout()
+    return (
+        version,
+        Mapping.objects.aggregate(Max('id'))['id__max'],
+        int(time.time() // timeout) if timeout else None,
+    )
+
+
+class MappingLookup(object):
+    """Per-process translation tables built from :class:`Mapping` objects."""
+
+    def __init__(self):
+        """Initialize empty lookup tables."""
+        #: tables of target ids (as tuples) by source ids
+        self.tables = {}
+
+        #: version of mappings the tables were built from
+        self.version = None
+
+        self.lock = threading.Lock()
+
+    def invalidate(self):
+        """Invalidate lookup tables in all processes."""
+        cache.set(VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+
+    def get_table(self, source_db, source_species, target_db, target_species):
+        """Return (and build if needed) a lookup table."""
+        key = (source_db, source_species, target_db, target_species)
+
+        with self.lock:
+            version = get_mapping_version()
+            if version != self.version:
+                self.tables = {}
+                self.version = version
+
+            if key not in self.tables:
+                mappings = Mapping.objects.filter(
+                    source_db=source_db,
+                    source_species=source_species,
+                    target_db=target_db,
+                    target_species=target_species,
+                ).order_by('source_id', 'target_id').values_list('source_id', 'target_id')
+
+                table = {}
+                for source_id, target_id in mappings.iterator():
+                    table.setdefault(source_id, []).append(target_id)
+
+                self.tables[key] = {source_id: tuple(target_ids) for source_id, target_ids in table.items()}
+
+            return self.tables[key]
+
+    def translate(self, source_db, source_species, target_db, target_species, ids):
+        """Translate ``ids`` and return a dict of lists of target ids."""
+        table = self.get_table(source_db, source_species, target_db, target_species)
+        return {source_id: list(table.get(source_id, ())) for source_id in ids}
+
+
+mapping_lookup = MappingLookup()  # pylint: disable=invalid-name
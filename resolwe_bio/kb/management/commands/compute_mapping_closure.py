@@ -0,0 +1,101 @@
+""".. Ignore pydocstyle D400.
+
+======================================
+Compute Knowledge Base Mapping Closure
+======================================
+
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from resolwe_bio.kb.models import Mapping, MappingClosure
+
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+DEFAULT_MAX_HOPS = 3
+
+
+class Command(BaseCommand):
+    """Compute transitive closure of knowledge base mappings."""
+
+    help = "Compute transitive closure of knowledge base mappings"
+
+    def add_arguments(self, parser):
+        """Command arguments."""
+        parser.add_argument('--max-hops', type=int, default=DEFAULT_MAX_HOPS,
+                            help="Maximal number of direct mappings chained together")
+
+    def handle(self, *args, **options):
+        """Command handle."""
+        if options['max_hops'] < 1:
+            raise CommandError("Maximal number of hops must be positive.")
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("DELETE FROM {closure_table};".format(
+                closure_table=MappingClosure._meta.db_table,  # pylint: disable=no-member,protected-access
+            ))
+
+            # Chains of mappings are followed from each direct mapping until
+            # the maximal number of hops is reached. Features already visited
+            # in a chain are skipped to avoid cycles, and only the shortest
+            # chain between each pair of features is kept. Ties between chains
+            # of equal length are broken by their relation paths and then by
+            # the features visited, so the same chain is kept on every run.
+            cursor.execute(
+                """
+                WITH RECURSIVE closure (
+                    source_db, source_id, source_species,
+                    target_db, target_id, target_species,
+                    hops, relation_path, visited
+                ) AS (
+                    SELECT
+                        source_db, source_id, source_species,
+                        target_db, target_id, target_species,
+                        1, ARRAY[relation_type]::VARCHAR[],
+                        ARRAY[
+                            ROW(source_db, source_id, source_species)::TEXT,
+                            ROW(target_db, target_id, target_species)::TEXT
+                        ]
+                    FROM {mapping_table}
+                    UNION ALL
+                    SELECT
+                        closure.source_db, closure.source_id, closure.source_species,
+                        mapping.target_db, mapping.target_id, mapping.target_species,
+                        closure.hops + 1, closure.relation_path || mapping.relation_type,
+                        closure.visited || ROW(mapping.target_db, mapping.target_id, mapping.target_species)::TEXT
+                    FROM closure
+                    JOIN {mapping_table} AS mapping
+                        ON mapping.source_db = closure.target_db
+                        AND mapping.source_id = closure.target_id
+                        AND mapping.source_species = closure.target_species
+                    WHERE closure.hops < %s
+                        AND NOT ROW(mapping.target_db, mapping.target_id, mapping.target_species)::TEXT
+                            = ANY(closure.visited)
+                )
+                INSERT INTO {closure_table} (
+                    source_db, source_id, source_species,
+                    target_db, target_id, target_species,
+                    hops, relation_path
+                )
+                SELECT DISTINCT ON (source_db, source_id, source_species, target_db, target_id, target_species)
+                    source_db, source_id, source_species,
+                    target_db, target_id, target_species,
+                    hops, relation_path
+                FROM closure
+                ORDER BY source_db, source_id, source_species, target_db, target_id, target_species,
+                    hops, relation_path, visited;
+                """.format(
+                    mapping_table=Mapping._meta.db_table,  # pylint: disable=no-member,protected-access
+                    closure_table=MappingClosure._meta.db_table,  # pylint: disable=no-member,protected-access
+                ),
+                params=[options['max_hops']]
+            )
+            count_total = cursor.rowcount
+
+        logger.info(  # pylint: disable=logging-not-lazy
+            "Total mapping closure entries: %d (at most %d hops)." % (count_total, options['max_hops'])
+        )
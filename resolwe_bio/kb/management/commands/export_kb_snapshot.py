@@ -0,0 +1,76 @@
+""".. Ignore pydocstyle D400.
+
+==============================
+Export Knowledge Base Snapshot
+==============================
+
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+import itertools
+import logging
+import operator
+
+from django.core.management.base import BaseCommand
+
+from resolwe_bio.kb.models import Feature, Mapping
+from resolwe_bio.kb.snapshot import FEATURE_ATTRIBUTES, SnapshotWriter
+
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+FEATURE_FIELDS = ('source', 'species', 'feature_id', 'name') + FEATURE_ATTRIBUTES
+MAPPING_GROUP_FIELDS = ('source_db', 'source_species', 'target_db', 'target_species')
+
+
+class Command(BaseCommand):
+    """Export knowledge base features and mappings to a snapshot file."""
+
+    help = "Export knowledge base features and mappings to a snapshot file"
+
+    def add_arguments(self, parser):
+        """Command arguments."""
+        parser.add_argument('file_name', type=str, help="Snapshot file name")
+        parser.add_argument('--species', type=str, nargs='+',
+                            help="Only export features and mappings of the given species")
+
+    def handle(self, *args, **options):
+        """Command handle."""
+        features = Feature.objects.order_by('source', 'species')
+        mappings = Mapping.objects.order_by(*MAPPING_GROUP_FIELDS)
+        if options['species']:
+            features = features.filter(species__in=options['species'])
+            mappings = mappings.filter(
+                source_species__in=options['species'],
+                target_species__in=options['species'],
+            )
+
+        count_features, count_mappings = 0, 0
+
+        with open(options['file_name'], 'wb') as handle:
+            writer = SnapshotWriter(handle)
+
+            # Only features and mappings of a single group are in memory at once.
+            groups = itertools.groupby(
+                features.values(*FEATURE_FIELDS).iterator(),
+                key=operator.itemgetter('source', 'species'),
+            )
+            for (source, species), group in groups:
+                group = list(group)
+                writer.add_features(source, species, group)
+                count_features += len(group)
+
+            groups = itertools.groupby(
+                mappings.values_list(*(MAPPING_GROUP_FIELDS + ('source_id', 'target_id', 'relation_type'))).iterator(),
+                key=operator.itemgetter(0, 1, 2, 3),
+            )
+            for key, group in groups:
+                group = [mapping[4:] for mapping in group]
+                writer.add_mappings(*(key + (group,)))
+                count_mappings += len(group)
+
+            writer.close()
+
+        logger.info(  # pylint: disable=logging-not-lazy
+            "Exported %d features and %d mappings to \"%s\"." %
+            (count_features, count_mappings, options['file_name'])
+        )
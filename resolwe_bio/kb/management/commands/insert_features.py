@@ -7,21 +7,28 @@ Insert Knowledge Base Features
 """
 from __future__ import absolute_import, division, print_function, unicode_literals
 import csv
+import functools
 import logging
-from tqdm import tqdm
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
 from resolwe.elastic.builder import index_builder
 from resolwe.utils import BraceMessage as __
 
-from resolwe_bio.kb.elastic_indexes import FeatureSearchIndex
+from resolwe_bio.kb.bulk import (
+    FEATURE_KEY_FIELDS, create_sync_table, delete_missing, filter_changed_features, get_feature_key, stage_sync_keys,
+    upsert_features,
+)
+from resolwe_bio.kb.caching import invalidate_feature_search
+from resolwe_bio.kb.indexing import remove_documents
 from resolwe_bio.kb.models import Feature
-from .utils import decompress
+from .utils import DEFAULT_BUFFER_SIZE, map_files
 
 
 logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
 
+DEFAULT_CHUNK_SIZE = 10000
 
 SUBTYPE_MAP = {
     'processed_pseudogene': 'pseudo',
@@ -76,6 +83,73 @@ SUBTYPE_MAP = {
 }
 
 
+def parse_row(row):
+    """Convert a row of the features file to feature values."""
+    aliases_text = row['Aliases'].strip()
+    aliases = []
+    if aliases_text and aliases_text != '-':
+        aliases = aliases_text.split(',')
+
+    return {
+        'source': row['Source'],
+        'feature_id': row['ID'],
+        'species': row['Species'],
+        'type': row['Type'],
+        'sub_type': SUBTYPE_MAP.get(row['Gene type'], 'other'),
+        'name': row['Name'],
+        'full_name': row['Full name'],
+        'description': row['Description'],
+        'aliases': aliases,
+    }
+
+
+def iterate_chunks(reader, chunk_size):
+    """Group features into chunks of at most ``chunk_size`` unique features."""
+    chunk = {}
+    for row in reader:
+        feature = parse_row(row)
+        key = get_feature_key(feature)
+
+        # The same feature can not be upserted twice in a single
+        # statement, so repeated features go to the next chunk.
+        if key in chunk or len(chunk) >= chunk_size:
+            yield list(chunk.values())
+            chunk = {}
+
+        chunk[key] = feature
+
+    if chunk:
+        yield list(chunk.values())
+
+
+def import_file(tab_file_name, tab_file, chunk_size, sync=False):
+    """Import features from a tab-separated file.
+
+    If ``sync`` is set, keys of all features are also added to the sync
+    table.
+
+    Return a tuple of inserted feature ids, updated feature ids and the
+    number of unchanged features.
+
+    """
+    logger.info(__("Importing features from \"{}\":", tab_file_name))
+
+    inserted_ids, updated_ids, count_unchanged = [], [], 0
+
+    reader = csv.DictReader(tab_file, delimiter=str('\t'))
+    for chunk in iterate_chunks(reader, chunk_size):
+        # Only new and changed features are written.
+        chunk_inserted_ids, chunk_updated_ids = upsert_features(filter_changed_features(chunk))
+        inserted_ids.extend(chunk_inserted_ids)
+        updated_ids.extend(chunk_updated_ids)
+        count_unchanged += len(chunk) - len(chunk_inserted_ids) - len(chunk_updated_ids)
+
+        if sync:
+            stage_sync_keys(FEATURE_KEY_FIELDS, [get_feature_key(feature) for feature in chunk])
+
+    return inserted_ids, updated_ids, count_unchanged
+
+
 class Command(BaseCommand):
     """Insert knowledge base features."""
 
@@ -84,55 +158,65 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         """Command arguments."""
         parser.add_argument('file_name', type=str, help="Tab-separated file with features (supports tab, gz or zip)")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help="Number of features upserted in a single statement")
+        parser.add_argument('--buffer-size', type=int, default=DEFAULT_BUFFER_SIZE,
+                            help="Size of the read buffer in bytes")
+        parser.add_argument('--jobs', type=int, default=1,
+                            help="Number of processes importing members of zip archive in parallel")
+        parser.add_argument('--sync', action='store_true',
+                            help="Delete features of imported sources and species which are missing from the file")
+
+    def import_features(self, options):
+        """Import features and return a tuple of import results."""
+        count_inserted, count_updated, count_unchanged = 0, 0, 0
+        to_index = []
+
+        results = map_files(
+            functools.partial(import_file, chunk_size=options['chunk_size'], sync=options['sync']),
+            options['file_name'],
+            jobs=options['jobs'],
+            buffer_size=options['buffer_size'],
+            progress=True,
+        )
+        for inserted_ids, updated_ids, file_count_unchanged in results:
+            to_index.extend(inserted_ids)
+            to_index.extend(updated_ids)
+
+            count_inserted += len(inserted_ids)
+            count_updated += len(updated_ids)
+            count_unchanged += file_count_unchanged
+
+        return count_inserted, count_updated, count_unchanged, to_index
 
     def handle(self, *args, **options):
         """Command handle."""
-        count_inserted, count_updated, count_unchanged, count_failed = 0, 0, 0, 0
-
-        for tab_file_name, line_count, tab_file in decompress(options['file_name']):
-            logger.info(__("Importing features from \"{}\":", tab_file_name))
-
-            reader = csv.DictReader(tab_file, delimiter=str('\t'))
-            bar_format = '{desc}{percentage:3.0f}%|{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}]'
-
-            for row in tqdm(reader, total=line_count, bar_format=bar_format):
-                aliases_text = row['Aliases'].strip()
-                aliases = []
-                if aliases_text and aliases_text != '-':
-                    aliases = aliases_text.split(',')
-
-                sub_type = SUBTYPE_MAP.get(row['Gene type'], 'other')
-
-                values = {
-                    'type': row['Type'],
-                    'sub_type': sub_type,
-                    'name': row['Name'],
-                    'full_name': row['Full name'],
-                    'description': row['Description'],
-                    'aliases': aliases,
-                }
-
-                feature, created = Feature.objects.get_or_create(source=row['Source'],
-                                                                 feature_id=row['ID'],
-                                                                 species=row['Species'],
-                                                                 defaults=values)
-                if created:
-                    count_inserted += 1
-                else:
-                    is_update = False
-                    for attr, value in values.items():
-                        if getattr(feature, attr) != value:
-                            setattr(feature, attr, value)
-                            is_update = True
-
-                    if is_update:
-                        feature.save()
-                        count_updated += 1
-                    else:
-                        count_unchanged += 1
-
-        index_builder.push(index=FeatureSearchIndex)
-
+        deleted_ids = []
+
+        if options['sync']:
+            # All keys are staged in a temporary table, so the whole file
+            # must be imported over a single connection.
+            if options['jobs'] > 1:
+                raise CommandError("Option --sync can not be used with multiple jobs.")
+
+            with transaction.atomic():
+                create_sync_table(FEATURE_KEY_FIELDS)
+                count_inserted, count_updated, count_unchanged, to_index = self.import_features(options)
+                deleted_ids = delete_missing(Feature, ('source', 'species'), FEATURE_KEY_FIELDS)
+        else:
+            count_inserted, count_updated, count_unchanged, to_index = self.import_features(options)
+
+        # Only (re)index features that were inserted or updated. Documents of
+        # updated features are overwritten since their ids do not change.
+        if to_index:
+            index_builder.build(queryset=Feature.objects.filter(id__in=to_index))
+        if deleted_ids:
+            remove_documents(Feature, deleted_ids)
+            logger.info("Deleted %d features missing from the file.", len(deleted_ids))
+        if to_index or deleted_ids:
+            invalidate_feature_search()
+
+        count_failed = 0
         count_total = count_inserted + count_updated + count_unchanged + count_failed
         logger.info("Total features: %d. Inserted %d, updated %d, "  # pylint: disable=logging-not-lazy
                     "unchanged %d, failed %d." %
@@ -6,23 +6,151 @@ Insert Knowledge Base Mappings
 
 """
 from __future__ import absolute_import, division, print_function, unicode_literals
+import collections
 import csv
+import functools
 import json
 import logging
 
 from django.core.exceptions import ValidationError
-from django.core.management.base import BaseCommand
-from django.db import connection
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 
 from resolwe.elastic.builder import index_builder
 from resolwe.utils import BraceMessage as __
 
-from resolwe_bio.kb.models import Mapping
-from .utils import decompress
+from resolwe_bio.kb.bulk import MAPPING_FIELDS, create_sync_table, delete_missing, insert_mappings, stage_sync_keys
+from resolwe_bio.kb.indexing import remove_documents
+from resolwe_bio.kb.lookup import mapping_lookup
+from resolwe_bio.kb.models import Mapping, MappingClosure
+from .compute_mapping_closure import DEFAULT_MAX_HOPS
+from .utils import DEFAULT_BUFFER_SIZE, map_files
 
 
 logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
 
+DEFAULT_CHUNK_SIZE = 100000
+
+# Temporary table holding all mappings of the file being imported. Its
+# unique index is used to detect duplicated mappings across chunks.
+STAGING_TABLE = 'resolwe_bio_kb_mapping_staging'
+
+
+def iterate_chunks(reader, chunk_size):
+    """Group mappings into chunks of at most ``chunk_size`` mappings."""
+    relation_type_choices = list(zip(*Mapping.RELATION_TYPE_CHOICES))[0]
+
+    chunk = []
+    for row in reader:
+        if row['relation_type'] not in relation_type_choices:
+            raise ValidationError(
+                "Unknown relation type: {}".format(row['relation_type'])
+            )
+
+        # NOTE: For performance reasons this is a tuple instead of a dict.
+        #       Tuple can be hashed, so it can be counted, and is
+        #       serialized to a JSON list. Make sure that any changes
+        #       also reflect in ``MAPPING_FIELDS``.
+        chunk.append((
+            row['relation_type'],
+            row['source_db'],
+            row['source_id'],
+            row['source_species'],
+            row['target_db'],
+            row['target_id'],
+            row['target_species'],
+        ))
+
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+def stage_chunk(cursor, chunk, tab_file_name):
+    """Add a chunk of mappings to the staging table.
+
+    Raise ``ValidationError`` if any of the mappings is duplicated
+    in the chunk or was already staged from a previous chunk.
+
+    """
+    cursor.execute(
+        """
+        INSERT INTO {staging_table}
+        SELECT
+            value->>0, value->>1, value->>2, value->>3,
+            value->>4, value->>5, value->>6
+        FROM json_array_elements(%s)
+        ON CONFLICT DO NOTHING
+        RETURNING *;
+        """.format(staging_table=STAGING_TABLE),
+        params=[json.dumps(chunk)]
+    )
+
+    duplicates = collections.Counter(chunk) - collections.Counter(cursor.fetchall())
+    if duplicates:
+        duplicate = next(iter(duplicates))
+        raise ValidationError(
+            "Duplicated mapping (relation type: '{}', source db: '{}', source id: "
+            "'{}', source species: {}, target db: '{}', target id: '{}', "
+            "target species: {}) found in '{}'".format(
+                *(duplicate + (tab_file_name,))
+            )
+        )
+
+
+def import_file(tab_file_name, tab_file, chunk_size, sync=False):
+    """Import mappings from a tab-separated file.
+
+    If ``sync`` is set, all mappings are also added to the sync table.
+
+    Return a tuple of the number of mappings in the file and inserted
+    mapping ids.
+
+    """
+    logger.info(__("Importing mappings from \"{}\"...", tab_file_name))
+
+    count_total, inserted_ids = 0, []
+
+    with connection.cursor() as cursor:
+        # Duplicates are only detected within the same file.
+        cursor.execute(
+            """
+            CREATE TEMPORARY TABLE IF NOT EXISTS {staging_table} (
+                relation_type VARCHAR(20),
+                source_db VARCHAR(20),
+                source_id VARCHAR(50),
+                source_species VARCHAR(50),
+                target_db VARCHAR(20),
+                target_id VARCHAR(50),
+                target_species VARCHAR(50),
+                UNIQUE (
+                    relation_type, source_db, source_id, source_species,
+                    target_db, target_id, target_species
+                )
+            );
+            TRUNCATE {staging_table};
+            """.format(staging_table=STAGING_TABLE)
+        )
+
+        try:
+            reader = csv.DictReader(tab_file, delimiter=str('\t'))
+            for chunk in iterate_chunks(reader, chunk_size):
+                with transaction.atomic():
+                    stage_chunk(cursor, chunk, tab_file_name)
+                    inserted_ids.extend(insert_mappings(chunk))
+                    if sync:
+                        stage_sync_keys(MAPPING_FIELDS, chunk)
+
+                count_total += len(chunk)
+        finally:
+            cursor.execute("DROP TABLE IF EXISTS {staging_table};".format(staging_table=STAGING_TABLE))
+
+    return count_total, inserted_ids
+
 
 class Command(BaseCommand):
     """Insert knowledge base mappings."""
@@ -32,92 +160,66 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         """Command arguments."""
         parser.add_argument('file_name', type=str, help="Tab-separated file with mappings (supports tab, gz or zip)")
-
-    def handle(self, *args, **options):
-        """Command handle."""
-        count_total, count_inserted = 0, 0
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help="Number of mappings inserted in a single transaction")
+        parser.add_argument('--buffer-size', type=int, default=DEFAULT_BUFFER_SIZE,
+                            help="Size of the read buffer in bytes")
+        parser.add_argument('--jobs', type=int, default=1,
+                            help="Number of processes importing members of zip archive in parallel")
+        parser.add_argument('--sync', action='store_true',
+                            help="Delete mappings between imported databases and species which are missing "
+                                 "from the file")
+        parser.add_argument('--closure-max-hops', type=int, default=DEFAULT_MAX_HOPS,
+                            help="Maximal number of hops of the mapping closure, which is recomputed if it "
+                                 "was computed before and mappings have changed")
+
+    def import_mappings(self, options):
+        """Import mappings and return a tuple of import results."""
+        count_total = 0
         to_index = []
 
-        relation_type_choices = list(zip(*Mapping.RELATION_TYPE_CHOICES))[0]
-
-        for tab_file_name, _, tab_file in decompress(options['file_name']):
-            logger.info(__("Importing mappings from \"{}\"...", tab_file_name))
-
-            mappings = set()
-            for row in csv.DictReader(tab_file, delimiter=str('\t')):
-                if row['relation_type'] not in relation_type_choices:
-                    raise ValidationError(
-                        "Unknown relation type: {}".format(row['relation_type'])
-                    )
-
-                # NOTE: For performance reasons this is a tuple instead of a dict.
-                #       Tuple can be hashed, so it can be used in `ìn` operation,
-                #       and is serialized to a JSON list.
-                #       Make sure that any changes also reflect in the SQL query
-                #       below.
-                mapping = (
-                    row['relation_type'],
-                    row['source_db'],
-                    row['source_id'],
-                    row['source_species'],
-                    row['target_db'],
-                    row['target_id'],
-                    row['target_species'],
-                )
+        results = map_files(
+            functools.partial(import_file, chunk_size=options['chunk_size'], sync=options['sync']),
+            options['file_name'],
+            jobs=options['jobs'],
+            buffer_size=options['buffer_size'],
+        )
+        for file_count_total, inserted_ids in results:
+            to_index.extend(inserted_ids)
+            count_total += file_count_total
 
-                if mapping in mappings:
-                    raise ValidationError(
-                        "Duplicated mapping (relation type: '{}', source db: '{}', source id: "
-                        "'{}', source species: {}, target db: '{}', target id: '{}', "
-                        "target species: {}) found in '{}'".format(
-                            row['relation_type'], row['source_db'], row['source_id'],
-                            row['source_species'], row['target_db'], row['target_id'],
-                            row['target_species'], tab_file_name
-                        )
-                    )
-
-                mappings.add(mapping)
-
-            with connection.cursor() as cursor:
-                cursor.execute(
-                    """
-                    WITH tmp AS(
-                        INSERT INTO {table_name} (
-                            relation_type, source_db, source_id, source_species,
-                            target_db, target_id, target_species
-                        )
-                        SELECT
-                            value->>0, value->>1, value->>2, value->>3,
-                            value->>4, value->>5, value->>6
-                        FROM json_array_elements(%s)
-                        LEFT JOIN {table_name}
-                            ON value->>0 = {table_name}.relation_type
-                            AND value->>1 = {table_name}.source_db
-                            AND value->>2 = {table_name}.source_id
-                            AND value->>3 = {table_name}.source_species
-                            AND value->>4 = {table_name}.target_db
-                            AND value->>5 = {table_name}.target_id
-                            AND value->>6 = {table_name}.target_species
-                        WHERE {table_name}.relation_type IS NULL
-                        RETURNING id
-                    )
-                    SELECT
-                        COALESCE(array_agg(id), ARRAY[]::INTEGER[]) AS ids,
-                        COUNT(*) AS count_inserted
-                    FROM tmp;
-                    """.format(
-                        table_name=Mapping._meta.db_table,  # pylint: disable=no-member,protected-access
-                    ),
-                    params=[json.dumps(list(mappings))]
-                )
-                result = cursor.fetchone()
+        return count_total, to_index
 
-            to_index.extend(result[0])
+    def handle(self, *args, **options):
+        """Command handle."""
+        deleted_ids = []
+
+        if options['sync']:
+            # All mappings are staged in a temporary table, so the whole
+            # file must be imported over a single connection.
+            if options['jobs'] > 1:
+                raise CommandError("Option --sync can not be used with multiple jobs.")
+
+            with transaction.atomic():
+                create_sync_table(MAPPING_FIELDS)
+                count_total, to_index = self.import_mappings(options)
+                deleted_ids = delete_missing(
+                    Mapping, ('source_db', 'source_species', 'target_db', 'target_species'), MAPPING_FIELDS
+                )
+        else:
+            count_total, to_index = self.import_mappings(options)
 
-            count_total += len(mappings)
-            count_inserted += result[1]
+        count_inserted = len(to_index)
 
         index_builder.build(queryset=Mapping.objects.filter(id__in=to_index))
+        if deleted_ids:
+            remove_documents(Mapping, deleted_ids)
+            logger.info("Deleted %d mappings missing from the file.", len(deleted_ids))
+        mapping_lookup.invalidate()
+
+        # Mapping closure is only maintained once it has been computed.
+        if (to_index or deleted_ids) and MappingClosure.objects.exists():
+            call_command('compute_mapping_closure', max_hops=options['closure_max_hops'])
 
         logger.info(  # pylint: disable=logging-not-lazy
             "Total mappings: %d. Inserted %d, unchanged %d." %
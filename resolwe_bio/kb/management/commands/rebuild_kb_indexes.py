@@ -0,0 +1,47 @@
+""".. Ignore pydocstyle D400.
+
+=================================
+Rebuild Knowledge Base ES Indexes
+=================================
+
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from django.core.management.base import BaseCommand, CommandError
+
+from resolwe_bio.kb.indexing import DEFAULT_CHUNK_SIZE, DEFAULT_THREAD_COUNT, get_indexes, rebuild_index
+from resolwe_bio.kb.models import Feature, Mapping
+
+
+MODELS = {
+    'feature': Feature,
+    'mapping': Mapping,
+}
+
+
+class Command(BaseCommand):
+    """Rebuild knowledge base Elasticsearch indexes."""
+
+    help = "Rebuild knowledge base Elasticsearch indexes into new indexes and switch aliases to them"
+
+    def add_arguments(self, parser):
+        """Command arguments."""
+        parser.add_argument('--index', choices=sorted(MODELS), action='append',
+                            help="Only rebuild indexes of the given objects (default: all)")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help="Number of documents sent in a single bulk request")
+        parser.add_argument('--threads', type=int, default=DEFAULT_THREAD_COUNT,
+                            help="Number of bulk requests sent in parallel")
+        parser.add_argument('--replace-index', action='store_true',
+                            help="Delete live indexes which are not aliases to replace them with aliases "
+                                 "(searches fail until the alias is created)")
+
+    def handle(self, *args, **options):
+        """Command handle."""
+        for name in options['index'] or sorted(MODELS):
+            for index in get_indexes(MODELS[name]):
+                try:
+                    rebuild_index(index, chunk_size=options['chunk_size'], thread_count=options['threads'],
+                                  replace_index=options['replace_index'])
+                except RuntimeError as error:
+                    raise CommandError(str(error))
@@ -7,17 +7,85 @@ Utility Functions for Commands
 """
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import functools
 import gzip
 import io
+import multiprocessing
 import os
 import zipfile
 
+from tqdm import tqdm
 
-def decompress(file_name):
+from django.db import connections
+
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+
+class ProgressReader(io.RawIOBase):
+    """Raw binary stream reporting the number of bytes read.
+
+    Bytes are read from the wrapped file object and the number of read
+    bytes is added to the ``progress`` bar (if set). Wrapping the
+    compressed file reports progress without decompressing it in
+    advance.
+
+    """
+
+    def __init__(self, fileobj):
+        """Initialize reader."""
+        super(ProgressReader, self).__init__()
+        self.fileobj = fileobj
+        self.progress = None
+
+    def readable(self):
+        """Return ``True`` since stream is readable."""
+        return True
+
+    def seekable(self):
+        """Return ``True`` if wrapped file object is seekable."""
+        return self.fileobj.seekable()
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        """Change the stream position of wrapped file object."""
+        return self.fileobj.seek(offset, whence)
+
+    def tell(self):
+        """Return the stream position of wrapped file object."""
+        return self.fileobj.tell()
+
+    def readinto(self, buffer):
+        """Read bytes into a pre-allocated buffer and report progress."""
+        data = self.fileobj.read(len(buffer))
+        size = len(data)
+        buffer[:size] = data
+
+        if self.progress is not None:
+            # Archive headers and read-ahead are also read through this
+            # stream, so make sure progress does not exceed the total.
+            self.progress.update(min(size, self.progress.total - self.progress.n))
+
+        return size
+
+    def close(self):
+        """Close the stream and wrapped file object."""
+        super(ProgressReader, self).close()
+        self.fileobj.close()
+
+
+def is_tab_member(entry):
+    """Check if zip archive entry is a tab-separated file."""
+    return entry.filename.endswith('.tab') and not entry.filename.startswith('__MACOSX')
+
+
+def decompress(file_name, buffer_size=DEFAULT_BUFFER_SIZE, progress=False, members=None):
     """Compression-agnostic iterator.
 
-    Iterate over files on the archive and return a tuple of
-    file name, line count and file descriptor.
+    Iterate over files on the archive and return a tuple of file name
+    and text file descriptor. Each file is read only once, while the
+    progress (if enabled) is reported from the number of consumed
+    compressed bytes. Size of the read buffer is set with
+    ``buffer_size``. If ``members`` is given, only zip archive members
+    with these names are returned.
 
     Supported file formats are .tab, .gz and .zip.
 
@@ -25,34 +93,72 @@ def decompress(file_name):
     if not os.path.isfile(file_name):
         raise ValueError("Can not find file '{}'".format(file_name))
 
-    line_count = -1
     _, ext = os.path.splitext(file_name)
-
-    _open = None
-    if ext == '.tab':
-        _open = open
-    elif ext == '.gz':
-        _open = gzip.open
-
-    if _open:
-        with _open(file_name, 'rt') as tsv_file:
-            line_count = sum(1 for row in tsv_file)
-
-        with _open(file_name, 'rt') as tsv_file:
-            yield (os.path.basename(file_name), line_count, tsv_file)
-    elif ext == '.zip':
-        with zipfile.ZipFile(file_name) as archive:
-            for entry in archive.infolist():
-                if not entry.filename.endswith('.tab'):
-                    continue
-
-                if entry.filename.startswith('__MACOSX'):
-                    continue
-
-                with archive.open(entry) as tsv_file:
-                    line_count = sum(1 for row in tsv_file)
-
-                with archive.open(entry) as tsv_file:
-                    yield (entry.filename, line_count, io.TextIOWrapper(tsv_file))
-    else:
+    if ext not in ('.tab', '.gz', '.zip'):
         raise ValueError("Unsupported file format")
+
+    bar_format = '{desc}{percentage:3.0f}%|{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}]'
+
+    with ProgressReader(io.FileIO(file_name)) as raw_file:
+        compressed_file = io.BufferedReader(raw_file, buffer_size)
+
+        if ext == '.zip':
+            with zipfile.ZipFile(compressed_file) as archive:
+                for entry in archive.infolist():
+                    if not is_tab_member(entry):
+                        continue
+
+                    if members is not None and entry.filename not in members:
+                        continue
+
+                    with tqdm(total=entry.compress_size, unit='B', unit_scale=True,
+                              bar_format=bar_format, disable=not progress) as progress_bar:
+                        # Disabled bars may lack counters, so they are not updated.
+                        raw_file.progress = progress_bar if progress else None
+                        with archive.open(entry) as tsv_file:
+                            yield (entry.filename, io.TextIOWrapper(tsv_file))
+        else:
+            with tqdm(total=os.path.getsize(file_name), unit='B', unit_scale=True,
+                      bar_format=bar_format, disable=not progress) as progress_bar:
+                raw_file.progress = progress_bar if progress else None
+                if ext == '.gz':
+                    compressed_file = gzip.GzipFile(fileobj=compressed_file)
+
+                yield (os.path.basename(file_name), io.TextIOWrapper(compressed_file))
+
+
+def _map_member(function, file_name, buffer_size, member):
+    """Apply ``function`` to a single member of the zip archive."""
+    for tab_file_name, tab_file in decompress(file_name, buffer_size=buffer_size, members=[member]):
+        return function(tab_file_name, tab_file)
+
+
+def map_files(function, file_name, jobs=1, buffer_size=DEFAULT_BUFFER_SIZE, progress=False):
+    """Apply ``function`` to each file on the archive.
+
+    ``function`` is called with the file name and text file descriptor
+    returned by :func:`decompress` and its results are yielded.
+
+    If ``jobs`` is greater than one, members of a zip archive are
+    processed in a pool of ``jobs`` processes, each with its own
+    database connection. In that case, ``function`` and its results must
+    be picklable, members must be independent of each other and results
+    are yielded in the order of completion.
+
+    """
+    if jobs <= 1 or os.path.splitext(file_name)[1] != '.zip':
+        for tab_file_name, tab_file in decompress(file_name, buffer_size=buffer_size, progress=progress):
+            yield function(tab_file_name, tab_file)
+        return
+
+    with zipfile.ZipFile(file_name) as archive:
+        members = [entry.filename for entry in archive.infolist() if is_tab_member(entry)]
+
+    # Database connections must not be shared with forked workers, so
+    # close them and let each worker open its own connection.
+    for connection in connections.all():
+        connection.close()
+
+    with multiprocessing.Pool(jobs) as pool:
+        for result in pool.imap_unordered(functools.partial(_map_member, function, file_name, buffer_size), members):
+            yield result
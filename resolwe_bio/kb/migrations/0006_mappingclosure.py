@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.12 on 2018-04-16 09:12
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resolwe_bio_kb', '0005_species'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MappingClosure',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_db', models.CharField(max_length=20)),
+                ('source_id', models.CharField(max_length=50)),
+                ('source_species', models.CharField(max_length=50)),
+                ('target_db', models.CharField(max_length=20)),
+                ('target_id', models.CharField(max_length=50)),
+                ('target_species', models.CharField(max_length=50)),
+                ('hops', models.PositiveSmallIntegerField()),
+                ('relation_path', django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=20), size=None)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='mappingclosure',
+            unique_together=set([('source_db', 'source_id', 'source_species', 'target_db', 'target_id', 'target_species')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='mappingclosure',
+            index_together=set([('source_db', 'source_id', 'source_species', 'target_db', 'target_species')]),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.12 on 2018-04-17 08:31
+from __future__ import unicode_literals
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resolwe_bio_kb', '0006_mappingclosure'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='feature',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['aliases'], name='kb_feature_aliases_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='feature',
+            index=models.Index(fields=['species', 'name'], name='kb_feature_species_name'),
+        ),
+        migrations.AddIndex(
+            model_name='feature',
+            index=models.Index(fields=['species', 'feature_id'], name='kb_feature_species_feature_id'),
+        ),
+    ]
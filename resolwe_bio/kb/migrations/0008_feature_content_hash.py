@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.12 on 2018-04-18 10:02
+from __future__ import unicode_literals
+
+import hashlib
+import json
+
+from django.db import connection, migrations, models
+
+BATCH_SIZE = 10000
+
+CONTENT_FIELDS = ('type', 'sub_type', 'name', 'full_name', 'description', 'aliases')
+
+
+def compute_content_hashes(apps, schema_editor):
+    """Compute content hashes of existing features."""
+    Feature = apps.get_model('resolwe_bio_kb', 'Feature')
+
+    features = Feature.objects.order_by('id').values_list('id', *CONTENT_FIELDS)
+    last_id = 0
+    while True:
+        batch = list(features.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            break
+
+        hashes = [
+            [row[0], hashlib.md5(json.dumps(list(row[1:]), separators=(',', ':')).encode('utf-8')).hexdigest()]
+            for row in batch
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                UPDATE {table_name} SET content_hash = value->>1
+                FROM json_array_elements(%s)
+                WHERE {table_name}.id = (value->>0)::INTEGER;
+                """.format(table_name=Feature._meta.db_table),
+                params=[json.dumps(hashes)]
+            )
+
+        last_id = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resolwe_bio_kb', '0007_feature_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feature',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=32),
+        ),
+        migrations.RunPython(compute_content_hashes, migrations.RunPython.noop),
+    ]
@@ -7,8 +7,12 @@ Models
 """
 from __future__ import unicode_literals
 
+import hashlib
+import json
+
 from django.db import models
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
 
 
 class Feature(models.Model):
@@ -62,12 +66,45 @@ class Feature(models.Model):
     description = models.TextField(blank=True)
     aliases = ArrayField(models.CharField(max_length=256), default=[], blank=True)
 
+    # Hash of values of ``CONTENT_FIELDS`` used to detect changed features
+    # when importing them. It is updated on ``save``, but not by
+    # ``QuerySet.update``, so bulk updates of content fields must also
+    # set it (see ``compute_content_hash``).
+    content_hash = models.CharField(max_length=32, blank=True, editable=False)
+
+    #: fields whose values are included in the content hash
+    CONTENT_FIELDS = ('type', 'sub_type', 'name', 'full_name', 'description', 'aliases')
+
     class Meta:
         """Feature Meta options."""
 
         unique_together = (
             ('source', 'feature_id', 'species'),
         )
+        # Indexes used for exact lookups of features in the database.
+        indexes = [
+            GinIndex(fields=['aliases'], name='kb_feature_aliases_gin'),
+            models.Index(fields=['species', 'name'], name='kb_feature_species_name'),
+            models.Index(fields=['species', 'feature_id'], name='kb_feature_species_feature_id'),
+        ]
+
+    @classmethod
+    def compute_content_hash(cls, values):
+        """Return content hash of feature values given as a dict."""
+        content = json.dumps([values[field] for field in cls.CONTENT_FIELDS], separators=(',', ':'))
+        return hashlib.md5(content.encode('utf-8')).hexdigest()
+
+    def save(self, *args, **kwargs):
+        """Update content hash and save the feature.
+
+        If ``update_fields`` are given, the content hash is saved with
+        them.
+
+        """
+        self.content_hash = self.compute_content_hash({field: getattr(self, field) for field in self.CONTENT_FIELDS})
+        if kwargs.get('update_fields'):
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {'content_hash'}
+        super(Feature, self).save(*args, **kwargs)
 
     def __str__(self):
         """Represent a feature instance as a string."""
@@ -78,7 +115,7 @@ class Feature(models.Model):
         )
 
 
-# NOTE: Mappings are manually inserted in management command, so take
+# NOTE: Mappings are manually inserted in `resolwe_bio.kb.bulk`, so take
 #       care that it is synced with model definition.
 class Mapping(models.Model):
     """Describes a mapping between features from different sources."""
@@ -123,3 +160,48 @@ class Mapping(models.Model):
             dst_id=self.target_id,
             dst_species=self.target_species,
         )
+
+
+# NOTE: Mapping closure is computed in `compute_mapping_closure` management
+#       command, so take care that it is synced with model definition.
+class MappingClosure(models.Model):
+    """Describes a transitive mapping between features computed from direct mappings.
+
+    Only the shortest chain of mappings between two features is stored.
+
+    """
+
+    source_db = models.CharField(max_length=20)
+    source_id = models.CharField(max_length=50)
+    source_species = models.CharField(max_length=50)
+    target_db = models.CharField(max_length=20)
+    target_id = models.CharField(max_length=50)
+    target_species = models.CharField(max_length=50)
+
+    #: number of direct mappings between the features
+    hops = models.PositiveSmallIntegerField()
+
+    #: relation types of direct mappings between the features
+    relation_path = ArrayField(models.CharField(max_length=20))
+
+    class Meta:
+        """MappingClosure Meta options."""
+
+        unique_together = [
+            ['source_db', 'source_id', 'source_species', 'target_db', 'target_id', 'target_species'],
+        ]
+        index_together = [
+            ['source_db', 'source_id', 'source_species', 'target_db', 'target_species'],
+        ]
+
+    def __str__(self):
+        """Represent a mapping closure instance as a string."""
+        return "{src_db}: {src_id} ({src_species}) -> {dst_db}: {dst_id} ({dst_species}) via {path}".format(
+            src_db=self.source_db,
+            src_id=self.source_id,
+            src_species=self.source_species,
+            dst_db=self.target_db,
+            dst_id=self.target_id,
+            dst_species=self.target_species,
+            path=' -> '.join(self.relation_path),
+        )
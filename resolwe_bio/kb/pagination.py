@@ -0,0 +1,38 @@
+""".. Ignore pydocstyle D400.
+
+==========
+Pagination
+==========
+
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """Cursor pagination of knowledge base objects ordered by their ids.
+
+    Pages are selected by the id of the last object on the previous page
+    instead of an offset, so fetching deep pages is as fast as fetching
+    the first one and objects inserted during pagination are neither
+    skipped nor duplicated.
+
+    Pagination is only used if ``cursor`` or ``page_size`` query
+    parameter is given, so requests without them still return a plain
+    list of all objects.
+
+    """
+
+    ordering = 'id'
+    page_size = 1000
+    page_size_query_param = 'page_size'
+    max_page_size = 10000
+
+    def get_page_size(self, request):
+        """Disable pagination if no pagination parameters are given."""
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+
+        return super(KeysetPagination, self).get_page_size(request)
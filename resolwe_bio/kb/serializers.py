@@ -11,7 +11,7 @@ from rest_framework import serializers
 
 from resolwe.rest.serializers import SelectiveFieldMixin
 
-from .models import Feature, Mapping
+from .models import Feature, Mapping, MappingClosure
 
 
 class FeatureSerializer(SelectiveFieldMixin, serializers.ModelSerializer):
@@ -21,7 +21,7 @@ class FeatureSerializer(SelectiveFieldMixin, serializers.ModelSerializer):
         """Serializer configuration."""
 
         model = Feature
-        fields = '__all__'
+        exclude = ['content_hash']
 
 
 class MappingSerializer(SelectiveFieldMixin, serializers.ModelSerializer):
@@ -32,3 +32,49 @@ class MappingSerializer(SelectiveFieldMixin, serializers.ModelSerializer):
 
         model = Mapping
         fields = '__all__'
+
+
+class MappingClosureSerializer(SelectiveFieldMixin, serializers.ModelSerializer):
+    """Serializer for mapping closure."""
+
+    class Meta:
+        """Serializer configuration."""
+
+        model = MappingClosure
+        fields = '__all__'
+
+
+class FeatureBulkSerializer(FeatureSerializer):
+    """Serializer for bulk feature upserts.
+
+    Existing features are updated, so uniqueness is not validated.
+
+    """
+
+    class Meta(FeatureSerializer.Meta):
+        """Serializer configuration."""
+
+        validators = []
+
+
+class MappingBulkSerializer(MappingSerializer):
+    """Serializer for bulk mapping inserts.
+
+    Existing mappings are skipped, so uniqueness is not validated.
+
+    """
+
+    class Meta(MappingSerializer.Meta):
+        """Serializer configuration."""
+
+        validators = []
+
+
+class MappingTranslateSerializer(serializers.Serializer):  # pylint: disable=abstract-method
+    """Serializer for identifier translation requests."""
+
+    source_db = serializers.CharField()
+    source_species = serializers.CharField()
+    target_db = serializers.CharField()
+    target_species = serializers.CharField(required=False)
+    ids = serializers.ListField(child=serializers.CharField())
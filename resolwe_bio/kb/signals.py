@@ -0,0 +1,27 @@
+""".. Ignore pydocstyle D400.
+
+=======
+Signals
+=======
+
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .caching import invalidate_feature_search
+from .lookup import mapping_lookup
+from .models import Feature, Mapping
+
+
+@receiver([post_save, post_delete], sender=Feature)
+def invalidate_feature_search_cache(sender, **kwargs):
+    """Invalidate cached feature search results when a feature is changed."""
+    invalidate_feature_search()
+
+
+@receiver([post_save, post_delete], sender=Mapping)
+def invalidate_mapping_lookup(sender, **kwargs):
+    """Invalidate mapping lookup tables when a mapping is changed."""
+    mapping_lookup.invalidate()
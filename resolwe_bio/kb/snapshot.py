@@ -0,0 +1,128 @@
+""".. Ignore pydocstyle D400.
+
+=======================
+Knowledge Base Snapshot
+=======================
+
+Writer of memory-mappable knowledge base snapshots. Snapshots are read
+by tools with the ``kb_snapshot`` module in ``resolwe_bio/tools``, where
+the file layout is described.
+
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import json
+import struct
+
+# NOTE: Keep in sync with ``resolwe_bio/tools/kb_snapshot.py``.
+MAGIC = b'RBKBSNP1'
+HEADER = struct.Struct('<8sQQ')
+OFFSET = struct.Struct('<Q')
+
+#: attributes of features stored as JSON in the snapshot
+FEATURE_ATTRIBUTES = ('type', 'sub_type', 'full_name', 'description', 'aliases')
+
+
+class SnapshotWriter(object):
+    """Write a knowledge base snapshot to a binary file object."""
+
+    def __init__(self, handle):
+        """Initialize the writer and write a placeholder header."""
+        self.handle = handle
+        self.features = []
+        self.mappings = []
+
+        self.handle.write(HEADER.pack(MAGIC, 0, 0))
+
+    def align(self):
+        """Pad the file to the next offset aligned to 8 bytes."""
+        position = self.handle.tell()
+        self.handle.write(b'\0' * (-position % OFFSET.size))
+
+    def write_integers(self, values):
+        """Write an array of integers and return its offset."""
+        self.align()
+        offset = self.handle.tell()
+        for value in values:
+            self.handle.write(OFFSET.pack(value))
+
+        return offset
+
+    def write_strings(self, values):
+        """Write an array of strings (given encoded) and return its offset."""
+        positions = [0]
+        for value in values:
+            positions.append(positions[-1] + len(value))
+
+        offset = self.write_integers(positions)
+        for value in values:
+            self.handle.write(value)
+
+        return offset
+
+    def add_features(self, source, species, features):
+        """Add features of ``source`` and ``species``.
+
+        Features are given as dicts with ``feature_id``, ``name`` and
+        all :data:`FEATURE_ATTRIBUTES` keys.
+
+        """
+        features = sorted(features, key=lambda feature: feature['feature_id'].encode('utf-8'))
+
+        self.features.append({
+            'source': source,
+            'species': species,
+            'count': len(features),
+            'feature_ids': self.write_strings([feature['feature_id'].encode('utf-8') for feature in features]),
+            'names': self.write_strings([feature['name'].encode('utf-8') for feature in features]),
+            'attributes': self.write_strings([
+                json.dumps({attribute: feature[attribute] for attribute in FEATURE_ATTRIBUTES}).encode('utf-8')
+                for feature in features
+            ]),
+        })
+
+    def add_mappings(self, source_db, source_species, target_db, target_species, mappings):
+        """Add mappings between the given databases and species.
+
+        Mappings are given as (source id, target id, relation type)
+        tuples.
+
+        """
+        mappings = sorted(
+            (source_id.encode('utf-8'), target_id.encode('utf-8'), relation_type.encode('utf-8'))
+            for source_id, target_id, relation_type in mappings
+        )
+
+        source_ids, starts = [], []
+        for position, (source_id, _, _) in enumerate(mappings):
+            if not source_ids or source_ids[-1] != source_id:
+                source_ids.append(source_id)
+                starts.append(position)
+        starts.append(len(mappings))
+
+        self.mappings.append({
+            'source_db': source_db,
+            'source_species': source_species,
+            'target_db': target_db,
+            'target_species': target_species,
+            'count': len(mappings),
+            'source_count': len(source_ids),
+            'source_ids': self.write_strings(source_ids),
+            'starts': self.write_integers(starts),
+            'target_ids': self.write_strings([target_id for _, target_id, _ in mappings]),
+            'relation_types': self.write_strings([relation_type for _, _, relation_type in mappings]),
+        })
+
+    def close(self):
+        """Write the table of contents and the final header."""
+        toc = json.dumps({
+            'features': self.features,
+            'mappings': self.mappings,
+        }).encode('utf-8')
+
+        self.align()
+        toc_offset = self.handle.tell()
+        self.handle.write(toc)
+
+        self.handle.seek(0)
+        self.handle.write(HEADER.pack(MAGIC, toc_offset, len(toc)))
@@ -1,17 +1,25 @@
 # pylint: disable=missing-docstring,invalid-name,no-member
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import json
 import time
 
+import mock
+
 from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
 from django.core.urlresolvers import reverse
+from django.test import override_settings
 
 from rest_framework import status
 from rest_framework.test import APITestCase
 
 from resolwe.test import ElasticSearchTestCase
 
+from ..autocomplete import feature_prefix_index
+from ..caching import check_cache_backend, get_cache_timeout
 from ..models import Feature
+from ..views import FeatureAutocompleteViewSet, FeatureSearchViewSet, FeatureViewSet
 
 
 class FeatureTestCase(APITestCase, ElasticSearchTestCase):
@@ -138,6 +146,59 @@ class FeatureTestCase(APITestCase, ElasticSearchTestCase):
                                     format='json')
         self.assertEqual(len(response.data), 2)
 
+    @override_settings(KB_SEARCH_CACHE_TIMEOUT=0)
+    def test_feature_search_database(self):
+        FEATURE_SEARCH_URL = reverse('resolwebio-api:kb_feature_search')
+
+        queries = [
+            {'query': ['FOO1', 'FOO2', 'FT-7']},
+            {'query': ['FOO1', 'SHARED', 'FT-7']},
+            {'query': ['BAR1', 'BTMK2', 'MISSING']},
+            {'query': ['FOO1', 'FOO2', 'FT-3'], 'source': 'NCBI'},
+            {'query': ['FOO7', 'FOO8', 'FT-9'], 'source': 'XSRC'},
+            {'query': ['FOO1', 'FOO2', 'FT-7'], 'source': 'FOO'},
+            {'query': ['FOO1', 'SHARED'], 'ordering': '-name'},
+            {'query': ['FOO1', 'SHARED'], 'limit': 3, 'offset': 2},
+            {'feature_id': ['FT-1', 'FT-2'], 'source': 'NCBI'},
+        ]
+
+        # Test that results match the results of Elasticsearch.
+        expected = [self.client.post(FEATURE_SEARCH_URL, query, format='json').data for query in queries]
+        with mock.patch.object(FeatureSearchViewSet, 'exact_lookup_threshold', 2):
+            with mock.patch.object(FeatureSearchViewSet, 'search') as search_mock:
+                for query, data in zip(queries, expected):
+                    response = self.client.post(FEATURE_SEARCH_URL, query, format='json')
+                    self.assertEqual(response.status_code, status.HTTP_200_OK)
+                    self.assertEqual(response.data, data)
+
+                self.assertFalse(search_mock.called)
+
+    def test_rebuild_index(self):
+        FEATURE_SEARCH_URL = reverse('resolwebio-api:kb_feature_search')
+
+        # Live index is only replaced with an alias when requested.
+        with self.assertRaises(CommandError):
+            call_command('rebuild_kb_indexes', index=['feature'])
+
+        response = self.client.get(FEATURE_SEARCH_URL, {'query': 'SHARED'}, format='json')
+        self.assertEqual(len(response.data), len(self.features))
+
+        # Rebuild replaces the live index with an alias and then switches
+        # the alias between versioned indexes.
+        for _ in range(2):
+            call_command('rebuild_kb_indexes', index=['feature'], chunk_size=3, threads=2, replace_index=True)
+
+            response = self.client.get(FEATURE_SEARCH_URL, {'query': 'SHARED'}, format='json')
+            self.assertEqual(len(response.data), len(self.features))
+
+        # Changes are indexed through the alias.
+        self.features[0].name = 'CHANGED'
+        self.features[0].save()
+        time.sleep(2)
+
+        response = self.client.get(FEATURE_SEARCH_URL, {'query': 'CHANGED'}, format='json')
+        self.assertEqual(len(response.data), 1)
+
     def test_feature_autocomplete(self):
         FEATURE_AUTOCOMPLETE_URL = reverse('resolwebio-api:kb_feature_autocomplete')
 
@@ -187,6 +248,104 @@ class FeatureTestCase(APITestCase, ElasticSearchTestCase):
                 self.assertEqual(len(response.data), 1)
                 self.assertFeatureEqual(response.data[0], feature)
 
+    @override_settings(KB_AUTOCOMPLETE_BACKEND='memory', KB_AUTOCOMPLETE_REFRESH_INTERVAL=0,
+                       KB_SEARCH_CACHE_TIMEOUT=0)
+    def test_feature_autocomplete_memory(self):
+        FEATURE_AUTOCOMPLETE_URL = reverse('resolwebio-api:kb_feature_autocomplete')
+
+        # Without the background thread, the index is built in the request thread.
+        feature_prefix_index.snapshot = None
+        response = self.client.get(FEATURE_AUTOCOMPLETE_URL, {'query': ''}, format='json')
+        self.assertEqual(len(response.data), 0)
+
+        response = self.client.get(FEATURE_AUTOCOMPLETE_URL, {'query': 'FOU'}, format='json')
+        self.assertEqual(len(response.data), 0)
+
+        response = self.client.get(FEATURE_AUTOCOMPLETE_URL, {'query': 'fo'}, format='json')
+        self.assertEqual(len(response.data), len(self.features))
+
+        response = self.client.get(FEATURE_AUTOCOMPLETE_URL, {'query': 'SHAR', 'source': 'XSRC'}, format='json')
+        self.assertEqual(len(response.data), 3)
+
+        response = self.client.post(FEATURE_AUTOCOMPLETE_URL, {'query': 'SHAR', 'source': ['NCBI', 'XSRC']},
+                                    format='json')
+        self.assertEqual(len(response.data), len(self.features))
+
+        # Test that exact matches are returned first.
+        response = self.client.get(FEATURE_AUTOCOMPLETE_URL, {'query': 'FOO1'}, format='json')
+        self.assertEqual(len(response.data), 1)
+        self.assertFeatureEqual(response.data[0], self.features[1])
+
+        response = self.client.get(FEATURE_AUTOCOMPLETE_URL, {'query': 'BTMK3'}, format='json')
+        self.assertEqual(len(response.data), 1)
+        self.assertFeatureEqual(response.data[0], self.features[3])
+
+        response = self.client.get(FEATURE_AUTOCOMPLETE_URL, {'query': 'FO', 'limit': 2, 'offset': 1}, format='json')
+        self.assertEqual(response.data['count'], len(self.features))
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertFeatureEqual(response.data['results'][0], self.features[1])
+
+        # Test that changing features rebuilds the index.
+        self.features[0].name = 'QUX'
+        self.features[0].save()
+
+        response = self.client.get(FEATURE_AUTOCOMPLETE_URL, {'query': 'qu'}, format='json')
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]['name'], 'QUX')
+
+    @override_settings(KB_AUTOCOMPLETE_BACKEND='memory', KB_AUTOCOMPLETE_REFRESH_INTERVAL=60,
+                       KB_SEARCH_CACHE_TIMEOUT=300)
+    def test_feature_autocomplete_memory_fallback(self):
+        FEATURE_AUTOCOMPLETE_URL = reverse('resolwebio-api:kb_feature_autocomplete')
+
+        # Elasticsearch is used until the index is built in the background
+        # and its responses are not cached.
+        feature_prefix_index.snapshot = None
+        with mock.patch.object(feature_prefix_index, 'start') as start_mock, \
+                mock.patch('resolwe_bio.kb.caching.cache') as cache_mock:
+            cache_mock.get.return_value = None
+            response = self.client.get(FEATURE_AUTOCOMPLETE_URL, {'query': 'fo'}, format='json')
+            self.assertTrue(start_mock.called)
+            self.assertFalse(cache_mock.set.called)
+        self.assertEqual(len(response.data), len(self.features))
+
+    @override_settings(KB_SEARCH_CACHE_TIMEOUT=300)
+    def test_feature_search_cache(self):
+        FEATURE_AUTOCOMPLETE_URL = reverse('resolwebio-api:kb_feature_autocomplete')
+
+        response = self.client.get(FEATURE_AUTOCOMPLETE_URL, {'query': 'FO', 'source': 'NCBI'}, format='json')
+        self.assertEqual(len(response.data), 7)
+
+        # Test that equivalent queries are served from the cache.
+        with mock.patch.object(FeatureAutocompleteViewSet, 'search') as search_mock:
+            response = self.client.get(FEATURE_AUTOCOMPLETE_URL, {'query': 'fo', 'source': 'NCBI'}, format='json')
+            self.assertFalse(search_mock.called)
+        self.assertEqual(len(response.data), 7)
+
+        # Test that changing features invalidates the cache.
+        self.features[0].source = 'XSRC'
+        self.features[0].save()
+        time.sleep(2)
+
+        response = self.client.get(FEATURE_AUTOCOMPLETE_URL, {'query': 'FO', 'source': 'NCBI'}, format='json')
+        self.assertEqual(len(response.data), 6)
+
+    def test_feature_search_cache_backend(self):
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        memcached = {'default': {'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache'}}
+
+        # Caching is only enabled by default with a shared cache backend.
+        with override_settings(CACHES=locmem):
+            self.assertEqual(get_cache_timeout(), 0)
+            self.assertEqual(check_cache_backend(None), [])
+        with override_settings(CACHES=memcached):
+            self.assertEqual(get_cache_timeout(), 300)
+            self.assertEqual(check_cache_backend(None), [])
+
+        with override_settings(CACHES=locmem, KB_SEARCH_CACHE_TIMEOUT=300):
+            self.assertEqual(get_cache_timeout(), 300)
+            self.assertEqual([warning.id for warning in check_cache_backend(None)], ['resolwe_bio_kb.W001'])
+
     def test_feature_admin(self):
         # Test that only an admin can access the endpoint.
         response = self.client.get(reverse('resolwebio-api:feature-list'), format='json')
@@ -262,3 +421,107 @@ class FeatureTestCase(APITestCase, ElasticSearchTestCase):
             },
         )
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_feature_admin_bulk(self):
+        FEATURE_BULK_URL = reverse('resolwebio-api:feature-bulk')
+
+        # Test that only an admin can access the endpoint.
+        response = self.client.post(FEATURE_BULK_URL, [], format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        admin_user = User.objects.create_superuser('admin', 'admin@genialis.com', 'admin')
+        self.client.force_authenticate(user=admin_user)
+
+        # Test that a list is required.
+        response = self.client.post(FEATURE_BULK_URL, {'source': 'NCBI'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        def feature_data(feature_id, full_name):
+            return {
+                'source': 'NCBI',
+                'feature_id': feature_id,
+                'species': 'Lorem ipsum',
+                'type': Feature.TYPE_GENE,
+                'sub_type': Feature.SUBTYPE_PROTEIN_CODING,
+                'name': 'FOO{}'.format(feature_id[3:]),
+                'full_name': full_name,
+                'aliases': ['BAR{}'.format(feature_id[3:]), 'BTMK{}'.format(feature_id[3:]), 'SHARED'],
+            }
+
+        response = self.client.post(FEATURE_BULK_URL, [
+            feature_data('FT-0', 'Foobarius machinus'),
+            feature_data('FT-1', 'Modified machinus'),
+            feature_data('FT-100', 'New machinus'),
+            feature_data('FT-100', 'Duplicated machinus'),
+            {'source': 'NCBI', 'species': 'Lorem ipsum'},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [result['status'] for result in response.data],
+            ['unchanged', 'updated', 'created', 'error', 'error']
+        )
+        self.assertEqual(response.data[0]['id'], self.features[0].pk)
+        self.assertEqual(response.data[1]['id'], self.features[1].pk)
+        self.assertIn('feature_id', response.data[4]['errors'])
+
+        self.assertEqual(Feature.objects.get(pk=self.features[1].pk).full_name, 'Modified machinus')
+        feature = Feature.objects.get(pk=response.data[2]['id'])
+        self.assertEqual(feature.full_name, 'New machinus')
+        self.assertEqual(feature.description, '')
+
+        # Changed features are indexed.
+        time.sleep(2)
+        response = self.client.get(reverse('resolwebio-api:kb_feature_search'), {'query': 'FOO100'}, format='json')
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]['full_name'], 'New machinus')
+
+    def test_feature_admin_pagination(self):
+        FEATURE_LIST_URL = reverse('resolwebio-api:feature-list')
+
+        admin_user = User.objects.create_superuser('admin', 'admin@genialis.com', 'admin')
+        self.client.force_authenticate(user=admin_user)
+
+        # Test following cursors through all pages.
+        data = []
+        response = self.client.get(FEATURE_LIST_URL, {'page_size': 3}, format='json')
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            data.extend(response.data['results'])
+            if response.data['next'] is None:
+                break
+            response = self.client.get(response.data['next'], format='json')
+
+        self.assertEqual([item['id'] for item in data], [feature.pk for feature in self.features])
+
+        # Test that changes during pagination do not shift the pages.
+        response = self.client.get(FEATURE_LIST_URL, {'page_size': 5}, format='json')
+        self.assertEqual(len(response.data['results']), 5)
+        self.features[0].delete()
+        new_feature = FeatureTestCase.create_feature(100, 'NCBI')
+
+        response = self.client.get(response.data['next'], format='json')
+        self.assertEqual([item['id'] for item in response.data['results']], [item.pk for item in self.features[5:]])
+        response = self.client.get(response.data['next'], format='json')
+        self.assertEqual([item['id'] for item in response.data['results']], [new_feature.pk])
+
+    def test_feature_admin_export(self):
+        FEATURE_EXPORT_URL = reverse('resolwebio-api:feature-export')
+
+        # Test that only an admin can access the endpoint.
+        response = self.client.get(FEATURE_EXPORT_URL)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        admin_user = User.objects.create_superuser('admin', 'admin@genialis.com', 'admin')
+        self.client.force_authenticate(user=admin_user)
+
+        with mock.patch.object(FeatureViewSet, 'export_batch_size', 3):
+            response = self.client.get(FEATURE_EXPORT_URL)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+            lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+
+        self.assertEqual(len(lines), len(self.features))
+        for line, feature in zip(lines, self.features):
+            data = json.loads(line)
+            self.assertEqual(data['id'], feature.pk)
+            self.assertFeatureEqual(data, feature)
@@ -1,13 +1,51 @@
 # pylint: disable=missing-docstring
 import os
+import shutil
+import tempfile
+import zipfile
+
 import mock
 
-from django.core.management import call_command
-from django.test import TestCase
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.test import TestCase, TransactionTestCase
 
+from resolwe_bio.kb.management.commands.utils import decompress
+from resolwe_bio.kb.models import Feature, Mapping, MappingClosure
 from resolwe_bio.utils.test import TEST_FILES_DIR
 
 
+class DecompressTestCase(TestCase):
+
+    def test_decompress(self):
+        for file_name, expected_name, line_count in [
+                ('features.tab', 'features.tab', 4),
+                ('features_update.tab.gz', 'features_update.tab.gz', 5),
+                ('mappings.tab.zip', 'mappings.tab', 6),
+        ]:
+            files = list(
+                (name, len(tab_file.readlines()))
+                for name, tab_file in decompress(os.path.join(TEST_FILES_DIR, file_name), buffer_size=16)
+            )
+            self.assertEqual(files, [(expected_name, line_count)])
+
+    @mock.patch('resolwe_bio.kb.management.commands.utils.tqdm')
+    def test_decompress_progress_disabled(self, mock_tqdm):
+        for file_name in ['features_update.tab.gz', 'mappings.tab.zip']:
+            for _, tab_file in decompress(os.path.join(TEST_FILES_DIR, file_name), buffer_size=16):
+                tab_file.readlines()
+
+        # Disabled progress bars are not updated.
+        self.assertFalse(mock_tqdm.return_value.__enter__.return_value.update.called)
+
+    def test_unsupported(self):
+        with self.assertRaises(ValueError):
+            list(decompress(os.path.join(TEST_FILES_DIR, 'missing.tab')))
+
+        with self.assertRaises(ValueError):
+            list(decompress(os.path.join(TEST_FILES_DIR, 'adapters.fasta')))
+
+
 class ImportKnowledgeBaseTestCase(TestCase):
 
     @mock.patch('resolwe_bio.kb.management.commands.insert_features.logger')
@@ -18,6 +56,120 @@ class ImportKnowledgeBaseTestCase(TestCase):
         call_command('insert_features', os.path.join(TEST_FILES_DIR, 'features_update.tab.gz'))
         mock_logger.info.assert_called_with('Total features: 4. Inserted 1, updated 1, unchanged 2, failed 0.')
 
+    @mock.patch('resolwe_bio.kb.management.commands.insert_features.logger')
+    def test_insert_features_chunked(self, mock_logger):
+        call_command('insert_features', os.path.join(TEST_FILES_DIR, 'features.tab'), chunk_size=2)
+        mock_logger.info.assert_called_with('Total features: 3. Inserted 3, updated 0, unchanged 0, failed 0.')
+
+        call_command('insert_features', os.path.join(TEST_FILES_DIR, 'features_update.tab.gz'), chunk_size=1)
+        mock_logger.info.assert_called_with('Total features: 4. Inserted 1, updated 1, unchanged 2, failed 0.')
+
+        feature = Feature.objects.get(source='NCBI', feature_id='100132673', species='Homo sapiens')
+        self.assertEqual(feature.sub_type, Feature.SUBTYPE_PSEUDO)
+        self.assertEqual(feature.aliases, ['RPS2_13_694'])
+
+        feature = Feature.objects.get(source='NCBI', feature_id='105377420', species='Homo sapiens')
+        self.assertEqual(feature.full_name, 'Uncharacterized LOC105377420')
+
+    @mock.patch('resolwe_bio.kb.management.commands.insert_features.index_builder')
+    def test_insert_features_index(self, mock_index_builder):
+        call_command('insert_features', os.path.join(TEST_FILES_DIR, 'features.tab'))
+        queryset = mock_index_builder.build.call_args[1]['queryset']
+        self.assertEqual(set(queryset), set(Feature.objects.all()))
+
+        mock_index_builder.reset_mock()
+        call_command('insert_features', os.path.join(TEST_FILES_DIR, 'features_update.tab.gz'))
+        queryset = mock_index_builder.build.call_args[1]['queryset']
+        self.assertEqual(
+            set(queryset.values_list('feature_id', flat=True)),
+            {'105377420', '100132673'}
+        )
+
+        # Nothing is indexed when no features change.
+        mock_index_builder.reset_mock()
+        call_command('insert_features', os.path.join(TEST_FILES_DIR, 'features_update.tab.gz'))
+        self.assertFalse(mock_index_builder.build.called)
+
+    @mock.patch('resolwe_bio.kb.management.commands.insert_features.logger')
+    def test_insert_features_content_hash(self, mock_logger):
+        call_command('insert_features', os.path.join(TEST_FILES_DIR, 'features.tab'))
+
+        # Hashes of imported features match hashes of features saved
+        # through the ORM.
+        for feature in Feature.objects.all():
+            content_hash = feature.content_hash
+            feature.save()
+            self.assertEqual(feature.content_hash, content_hash)
+
+        # Unchanged features are not written.
+        with mock.patch('resolwe_bio.kb.management.commands.insert_features.upsert_features',
+                        return_value=([], [])) as mock_upsert:
+            call_command('insert_features', os.path.join(TEST_FILES_DIR, 'features.tab'))
+            mock_upsert.assert_called_once_with([])
+        mock_logger.info.assert_called_with('Total features: 3. Inserted 0, updated 0, unchanged 3, failed 0.')
+
+        # Content hash is saved with the given update fields.
+        feature = Feature.objects.get(source='NCBI', feature_id='105377420', species='Homo sapiens')
+        content_hash = feature.content_hash
+        feature.name = 'Changed'
+        feature.save(update_fields=['name'])
+        self.assertNotEqual(feature.content_hash, content_hash)
+        self.assertEqual(Feature.objects.get(pk=feature.pk).content_hash, feature.content_hash)
+
+        call_command('insert_features', os.path.join(TEST_FILES_DIR, 'features.tab'))
+        mock_logger.info.assert_called_with('Total features: 3. Inserted 0, updated 1, unchanged 2, failed 0.')
+
+        feature = Feature.objects.get(source='NCBI', feature_id='105377420', species='Homo sapiens')
+        feature.full_name = 'Changed'
+        feature.save()
+
+        call_command('insert_features', os.path.join(TEST_FILES_DIR, 'features.tab'))
+        mock_logger.info.assert_called_with('Total features: 3. Inserted 0, updated 1, unchanged 2, failed 0.')
+
+    @mock.patch('resolwe_bio.kb.management.commands.insert_features.remove_documents')
+    def test_insert_features_sync(self, mock_remove_documents):
+        call_command('insert_features', os.path.join(TEST_FILES_DIR, 'features_update.tab.gz'))
+        Feature.objects.create(
+            source='NCBI', feature_id='1', species='Mus musculus', type=Feature.TYPE_GENE,
+            sub_type=Feature.SUBTYPE_PROTEIN_CODING, name='MOUSE1',
+        )
+        removed_feature = Feature.objects.get(feature_id='100132673')
+
+        call_command('insert_features', os.path.join(TEST_FILES_DIR, 'features.tab'), sync=True)
+
+        # Only features of imported sources and species are deleted.
+        self.assertEqual(
+            set(Feature.objects.values_list('feature_id', flat=True)),
+            {'105377420', '5989', '100132677', '1'}
+        )
+        mock_remove_documents.assert_called_once_with(Feature, [removed_feature.pk])
+
+        # Nothing is deleted when all features are in the file.
+        mock_remove_documents.reset_mock()
+        call_command('insert_features', os.path.join(TEST_FILES_DIR, 'features.tab'), sync=True)
+        self.assertFalse(mock_remove_documents.called)
+        self.assertEqual(Feature.objects.count(), 4)
+
+        with self.assertRaises(CommandError):
+            call_command('insert_features', os.path.join(TEST_FILES_DIR, 'features.tab'), sync=True, jobs=2)
+
+    @mock.patch('resolwe_bio.kb.management.commands.insert_mappings.remove_documents')
+    def test_insert_mappings_sync(self, mock_remove_documents):
+        call_command('insert_mappings', os.path.join(TEST_FILES_DIR, 'mappings.tab.zip'))
+        Mapping.objects.create(
+            relation_type='crossdb', source_db='MGI', source_id='MGI:2447322', source_species='Mus musculus',
+            target_db='ENSEMBL', target_id='ENSMUSG00000000001', target_species='Mus musculus',
+        )
+        removed_mapping = Mapping.objects.get(target_id='105246486')
+
+        call_command('insert_mappings', os.path.join(TEST_FILES_DIR, 'mappings_update.tab'), sync=True)
+
+        # Only mappings between imported databases and species are deleted.
+        self.assertEqual(Mapping.objects.count(), 7)
+        self.assertFalse(Mapping.objects.filter(target_id='105246486').exists())
+        self.assertTrue(Mapping.objects.filter(target_db='ENSEMBL').exists())
+        mock_remove_documents.assert_called_once_with(Mapping, [removed_mapping.pk])
+
     @mock.patch('resolwe_bio.kb.management.commands.insert_mappings.logger')
     def test_insert_mappings(self, mock_logger):
         call_command('insert_mappings', os.path.join(TEST_FILES_DIR, 'mappings.tab.zip'))
@@ -25,3 +177,61 @@ class ImportKnowledgeBaseTestCase(TestCase):
 
         call_command('insert_mappings', os.path.join(TEST_FILES_DIR, 'mappings_update.tab'))
         mock_logger.info.assert_called_with('Total mappings: 6. Inserted 2, unchanged 4.')
+
+    @mock.patch('resolwe_bio.kb.management.commands.insert_mappings.logger')
+    def test_insert_mappings_chunked(self, mock_logger):
+        call_command('insert_mappings', os.path.join(TEST_FILES_DIR, 'mappings.tab.zip'), chunk_size=2)
+        mock_logger.info.assert_called_with('Total mappings: 5. Inserted 5, unchanged 0.')
+
+        call_command('insert_mappings', os.path.join(TEST_FILES_DIR, 'mappings_update.tab'), chunk_size=4)
+        mock_logger.info.assert_called_with('Total mappings: 6. Inserted 2, unchanged 4.')
+        self.assertEqual(Mapping.objects.count(), 7)
+
+    def test_insert_mappings_closure(self):
+        # Closure is not computed unless it was computed before.
+        call_command('insert_mappings', os.path.join(TEST_FILES_DIR, 'mappings.tab.zip'))
+        self.assertFalse(MappingClosure.objects.exists())
+
+        call_command('compute_mapping_closure')
+        self.assertEqual(MappingClosure.objects.count(), 5)
+
+        call_command('insert_mappings', os.path.join(TEST_FILES_DIR, 'mappings_update.tab'))
+        self.assertEqual(MappingClosure.objects.count(), 7)
+        self.assertTrue(MappingClosure.objects.filter(source_id='MGI:3639714', target_id='100036169').exists())
+
+    def test_insert_mappings_duplicated(self):
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.tab') as tab_file:
+            with open(os.path.join(TEST_FILES_DIR, 'mappings_update.tab')) as mappings_file:
+                lines = mappings_file.readlines()
+            tab_file.writelines(lines + lines[1:2])
+            tab_file.flush()
+
+            with self.assertRaisesRegex(ValidationError, 'Duplicated mapping'):
+                call_command('insert_mappings', tab_file.name, chunk_size=2)
+
+
+class ParallelImportKnowledgeBaseTestCase(TransactionTestCase):
+
+    def test_insert_mappings(self):
+        call_command('insert_mappings', os.path.join(TEST_FILES_DIR, 'mappings.tab.zip'), jobs=2)
+        self.assertEqual(Mapping.objects.count(), 5)
+
+        call_command('insert_mappings', os.path.join(TEST_FILES_DIR, 'mappings_update.tab'), jobs=2)
+        self.assertEqual(Mapping.objects.count(), 7)
+
+    def test_insert_mappings_overlapping(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(TEST_FILES_DIR, 'mappings_update.tab')) as mappings_file:
+                lines = mappings_file.readlines()
+
+            # Members share a mapping, which is inserted concurrently.
+            zip_file_name = os.path.join(tmp_dir, 'mappings.tab.zip')
+            with zipfile.ZipFile(zip_file_name, 'w') as archive:
+                archive.writestr('first.tab', ''.join(lines[:4]))
+                archive.writestr('second.tab', ''.join(lines[:1] + lines[3:]))
+
+            call_command('insert_mappings', zip_file_name, jobs=2)
+            self.assertEqual(Mapping.objects.count(), 6)
+        finally:
+            shutil.rmtree(tmp_dir)
@@ -1,17 +1,23 @@
 # pylint: disable=missing-docstring,invalid-name,no-member
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import json
 import time
 
+import mock
+
 from django.contrib.auth.models import User
+from django.core.management import call_command
 from django.core.urlresolvers import reverse
+from django.test import override_settings
 
 from rest_framework import status
 from rest_framework.test import APITestCase
 
 from resolwe.test import ElasticSearchTestCase
 
-from ..models import Mapping
+from ..lookup import DEFAULT_TIMEOUT, check_cache_backend
+from ..models import Mapping, MappingClosure
 
 
 class MappingTestCase(APITestCase, ElasticSearchTestCase):
@@ -157,3 +163,253 @@ class MappingTestCase(APITestCase, ElasticSearchTestCase):
             },
         )
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_mapping_admin_bulk(self):
+        MAPPING_BULK_URL = reverse('resolwebio-api:mapping-bulk')
+
+        # Test that only an admin can access the endpoint.
+        response = self.client.post(MAPPING_BULK_URL, [], format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        admin_user = User.objects.create_superuser('admin', 'admin@genialis.com', 'admin')
+        self.client.force_authenticate(user=admin_user)
+
+        def mapping_data(index, relation_type):
+            return {
+                'relation_type': relation_type,
+                'source_db': 'SRC',
+                'source_id': 'FT{}'.format(index),
+                'source_species': 'Mus musculus',
+                'target_db': 'TGT',
+                'target_id': 'ANOTHER{}'.format(index),
+                'target_species': 'Mus musculus',
+            }
+
+        response = self.client.post(MAPPING_BULK_URL, [
+            mapping_data(0, Mapping.RELATION_TYPE_CROSSDB),
+            mapping_data(1, Mapping.RELATION_TYPE_ORTHOLOG),
+            mapping_data(100, Mapping.RELATION_TYPE_CROSSDB),
+            mapping_data(100, Mapping.RELATION_TYPE_ORTHOLOG),
+            mapping_data(100, Mapping.RELATION_TYPE_CROSSDB),
+            mapping_data(101, 'unknown'),
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [result['status'] for result in response.data],
+            ['unchanged', 'created', 'created', 'created', 'error', 'error']
+        )
+        self.assertEqual(response.data[0]['id'], self.mappings[0].pk)
+        self.assertIn('relation_type', response.data[5]['errors'])
+
+        # Mappings differing only in the relation type are separate mappings.
+        self.assertNotEqual(response.data[1]['id'], self.mappings[1].pk)
+        self.assertEqual(Mapping.objects.get(pk=self.mappings[1].pk).relation_type, Mapping.RELATION_TYPE_CROSSDB)
+        self.assertEqual(Mapping.objects.get(pk=response.data[1]['id']).relation_type, Mapping.RELATION_TYPE_ORTHOLOG)
+        self.assertEqual(Mapping.objects.get(pk=response.data[2]['id']).target_id, 'ANOTHER100')
+        self.assertNotEqual(response.data[2]['id'], response.data[3]['id'])
+        self.assertEqual(Mapping.objects.count(), 13)
+
+        # Single mappings are identified by the same fields.
+        ortholog_id = response.data[1]['id']
+        response = self.client.post(
+            reverse('resolwebio-api:mapping-list'), mapping_data(1, Mapping.RELATION_TYPE_ORTHOLOG), format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['id'], ortholog_id)
+        self.assertEqual(Mapping.objects.count(), 13)
+
+    def test_mapping_admin_export(self):
+        admin_user = User.objects.create_superuser('admin', 'admin@genialis.com', 'admin')
+        self.client.force_authenticate(user=admin_user)
+
+        self.mappings[3].target_db = 'XTGT'
+        self.mappings[3].save()
+
+        response = self.client.get(reverse('resolwebio-api:mapping-export'), {'target_db': 'TGT'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = [json.loads(line) for line in b''.join(response.streaming_content).decode('utf-8').splitlines()]
+        self.assertEqual([item['id'] for item in data], [item.pk for i, item in enumerate(self.mappings) if i != 3])
+
+        # Test cursor pagination.
+        response = self.client.get(reverse('resolwebio-api:mapping-list'), {'page_size': 4}, format='json')
+        self.assertEqual([item['id'] for item in response.data['results']], [item.pk for item in self.mappings[:4]])
+        response = self.client.get(response.data['next'], format='json')
+        self.assertEqual([item['id'] for item in response.data['results']], [item.pk for item in self.mappings[4:8]])
+
+    def test_translate(self):
+        MAPPING_TRANSLATE_URL = reverse('resolwebio-api:kb_mapping_translate-list')
+
+        request = {
+            'source_db': 'SRC',
+            'source_species': 'Mus musculus',
+            'target_db': 'TGT',
+            'ids': ['FT0', 'FT1', 'FT100'],
+        }
+        response = self.client.post(MAPPING_TRANSLATE_URL, request, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'FT0': ['ANOTHER0'], 'FT1': ['ANOTHER1'], 'FT100': []})
+
+        # Test that lookup tables are invalidated when mappings change.
+        Mapping.objects.create(
+            relation_type='crossdb',
+            source_db='SRC',
+            source_id='FT0',
+            source_species='Mus musculus',
+            target_db='TGT',
+            target_id='YETANOTHER0',
+            target_species='Mus musculus',
+        )
+        response = self.client.post(MAPPING_TRANSLATE_URL, request, format='json')
+        self.assertEqual(response.data['FT0'], ['ANOTHER0', 'YETANOTHER0'])
+
+        # Test other species.
+        request['target_species'] = 'Homo sapiens'
+        response = self.client.post(MAPPING_TRANSLATE_URL, request, format='json')
+        self.assertEqual(response.data, {'FT0': [], 'FT1': [], 'FT100': []})
+
+        # Test missing parameters.
+        response = self.client.post(MAPPING_TRANSLATE_URL, {'source_db': 'SRC'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @mock.patch('resolwe_bio.kb.lookup.time')
+    def test_translate_per_process_cache(self, time_mock):
+        MAPPING_TRANSLATE_URL = reverse('resolwebio-api:kb_mapping_translate-list')
+        time_mock.time.return_value = 0
+
+        request = {
+            'source_db': 'SRC',
+            'source_species': 'Mus musculus',
+            'target_db': 'TGT',
+            'ids': ['FT0'],
+        }
+        response = self.client.post(MAPPING_TRANSLATE_URL, request, format='json')
+        self.assertEqual(response.data, {'FT0': ['ANOTHER0']})
+
+        # Mappings inserted by other processes do not change the version
+        # in a per-process cache, but are detected by their ids.
+        with mock.patch('resolwe_bio.kb.signals.mapping_lookup'):
+            Mapping.objects.create(
+                relation_type='crossdb',
+                source_db='SRC',
+                source_id='FT0',
+                source_species='Mus musculus',
+                target_db='TGT',
+                target_id='YETANOTHER0',
+                target_species='Mus musculus',
+            )
+        response = self.client.post(MAPPING_TRANSLATE_URL, request, format='json')
+        self.assertEqual(response.data, {'FT0': ['ANOTHER0', 'YETANOTHER0']})
+
+        # Other changes are detected when lookup tables expire.
+        with mock.patch('resolwe_bio.kb.signals.mapping_lookup'):
+            Mapping.objects.filter(target_id='ANOTHER0').delete()
+        response = self.client.post(MAPPING_TRANSLATE_URL, request, format='json')
+        self.assertEqual(response.data, {'FT0': ['ANOTHER0', 'YETANOTHER0']})
+
+        time_mock.time.return_value = DEFAULT_TIMEOUT
+        response = self.client.post(MAPPING_TRANSLATE_URL, request, format='json')
+        self.assertEqual(response.data, {'FT0': ['YETANOTHER0']})
+
+        self.assertEqual([warning.id for warning in check_cache_backend(None)], ['resolwe_bio_kb.W002'])
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache'}}):
+            self.assertEqual(check_cache_backend(None), [])
+
+    def test_closure(self):
+        MAPPING_URL = reverse('resolwebio-api:kb_mapping_search')
+
+        Mapping.objects.create(
+            relation_type='ortholog',
+            source_db='TGT',
+            source_id='ANOTHER0',
+            source_species='Mus musculus',
+            target_db='TGT',
+            target_id='HUMAN0',
+            target_species='Homo sapiens',
+        )
+        Mapping.objects.create(
+            relation_type='crossdb',
+            source_db='TGT',
+            source_id='HUMAN0',
+            source_species='Homo sapiens',
+            target_db='THIRD',
+            target_id='THIRD0',
+            target_species='Homo sapiens',
+        )
+        # Cycles are not followed.
+        Mapping.objects.create(
+            relation_type='crossdb',
+            source_db='THIRD',
+            source_id='THIRD0',
+            source_species='Homo sapiens',
+            target_db='SRC',
+            target_id='FT0',
+            target_species='Mus musculus',
+        )
+
+        call_command('compute_mapping_closure', max_hops=2)
+        self.assertFalse(MappingClosure.objects.filter(hops__gt=2).exists())
+        self.assertFalse(MappingClosure.objects.filter(
+            source_db='SRC', source_id='FT0', target_db='THIRD', target_id='THIRD0'
+        ).exists())
+
+        call_command('compute_mapping_closure')
+        closure = MappingClosure.objects.get(source_db='SRC', source_id='FT0', target_db='THIRD')
+        self.assertEqual(closure.target_id, 'THIRD0')
+        self.assertEqual(closure.hops, 3)
+        self.assertEqual(closure.relation_path, ['crossdb', 'ortholog', 'crossdb'])
+        self.assertFalse(MappingClosure.objects.filter(
+            source_db='SRC', source_id='FT0', target_db='SRC', target_id='FT0'
+        ).exists())
+
+        # Chains of equal length are chosen deterministically.
+        for relation_type, intermediate_id in [('ortholog', 'TIE1'), ('crossdb', 'TIE2')]:
+            Mapping.objects.create(
+                relation_type=relation_type,
+                source_db='TIE',
+                source_id='TIE0',
+                source_species='Homo sapiens',
+                target_db='TIE',
+                target_id=intermediate_id,
+                target_species='Homo sapiens',
+            )
+            Mapping.objects.create(
+                relation_type='crossdb',
+                source_db='TIE',
+                source_id=intermediate_id,
+                source_species='Homo sapiens',
+                target_db='TIE',
+                target_id='TIE3',
+                target_species='Homo sapiens',
+            )
+
+        call_command('compute_mapping_closure')
+        closure = MappingClosure.objects.get(source_db='TIE', source_id='TIE0', target_id='TIE3')
+        self.assertEqual(closure.hops, 2)
+        self.assertEqual(closure.relation_path, ['crossdb', 'crossdb'])
+
+        response = self.client.get(MAPPING_URL, {
+            'source_db': 'SRC',
+            'source_id': 'FT0',
+            'source_species': 'Mus musculus',
+            'target_db': 'THIRD',
+            'target_species': 'Homo sapiens',
+            'max_hops': 3,
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]['target_id'], 'THIRD0')
+        self.assertEqual(response.data[0]['relation_path'], ['crossdb', 'ortholog', 'crossdb'])
+
+        response = self.client.get(MAPPING_URL, {
+            'source_db': 'SRC',
+            'source_id': 'FT0',
+            'target_db': 'THIRD',
+            'max_hops': 2,
+        }, format='json')
+        self.assertEqual(len(response.data), 0)
+
+        response = self.client.get(MAPPING_URL, {'source_db': 'SRC', 'max_hops': 'many'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(MAPPING_URL, {'source_db': 'SRC', 'max_hops': [1, 2]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,109 @@
+# pylint: disable=missing-docstring
+import os
+import shutil
+import sys
+import tempfile
+
+from django.core.management import call_command
+from django.test import TestCase
+
+import resolwe_bio
+from resolwe_bio.kb.models import Feature, Mapping
+
+# Snapshots are read by tools, which are not a part of the package.
+sys.path.insert(0, os.path.join(os.path.dirname(resolwe_bio.__file__), 'tools'))
+from kb_snapshot import KnowledgeBaseSnapshot  # pylint: disable=import-error,wrong-import-position
+
+
+class SnapshotTestCase(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.snapshot_file = os.path.join(self.tmp_dir, 'kb.snapshot')
+
+        for i in range(10):
+            Feature.objects.create(
+                source='ENSEMBL',
+                feature_id='ENSG{}'.format(i),
+                species='Homo sapiens',
+                type=Feature.TYPE_GENE,
+                sub_type=Feature.SUBTYPE_PROTEIN_CODING,
+                name='GENE{}'.format(i),
+                full_name='Gene {}'.format(i),
+                aliases=['ALIAS{}'.format(i)],
+            )
+
+            for target_id in ('TGT{}'.format(i), 'OTHER{}'.format(i)):
+                Mapping.objects.create(
+                    relation_type='crossdb',
+                    source_db='ENSEMBL',
+                    source_id='ENSG{}'.format(i),
+                    source_species='Homo sapiens',
+                    target_db='UCSC',
+                    target_id=target_id,
+                    target_species='Homo sapiens',
+                )
+
+        Feature.objects.create(
+            source='ENSEMBL',
+            feature_id='ENSMUSG0',
+            species='Mus musculus',
+            type=Feature.TYPE_GENE,
+            sub_type=Feature.SUBTYPE_PROTEIN_CODING,
+            name='Gene0',
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_export_snapshot(self):
+        call_command('export_kb_snapshot', self.snapshot_file)
+
+        with KnowledgeBaseSnapshot(self.snapshot_file) as snapshot:
+            features = snapshot.get_features('ENSEMBL', 'Homo sapiens')
+            self.assertEqual(len(features), 10)
+            self.assertIn('ENSG3', features)
+            self.assertNotIn('ENSMUSG0', features)
+            self.assertEqual(features.get('ENSG3'), {
+                'source': 'ENSEMBL',
+                'feature_id': 'ENSG3',
+                'species': 'Homo sapiens',
+                'type': Feature.TYPE_GENE,
+                'sub_type': Feature.SUBTYPE_PROTEIN_CODING,
+                'name': 'GENE3',
+                'full_name': 'Gene 3',
+                'description': '',
+                'aliases': ['ALIAS3'],
+            })
+            self.assertIsNone(features.get('MISSING'))
+            self.assertEqual([feature['name'] for feature in features.filter(['ENSG1', 'X', 'ENSG2'])],
+                             ['GENE1', 'GENE2'])
+
+            self.assertIn('ENSMUSG0', snapshot.get_features('ENSEMBL', 'Mus musculus'))
+
+            mappings = snapshot.get_mappings('ENSEMBL', 'Homo sapiens', 'UCSC', 'Homo sapiens')
+            self.assertEqual(len(mappings), 20)
+            self.assertEqual(mappings.get('ENSG5'), [('OTHER5', 'crossdb'), ('TGT5', 'crossdb')])
+            self.assertEqual(mappings.translate(['ENSG1', 'MISSING']), {
+                'ENSG1': ['OTHER1', 'TGT1'],
+                'MISSING': [],
+            })
+
+            with self.assertRaises(KeyError):
+                snapshot.get_mappings('UCSC', 'Homo sapiens', 'ENSEMBL', 'Homo sapiens')
+
+    def test_export_species(self):
+        call_command('export_kb_snapshot', self.snapshot_file, species=['Mus musculus'])
+
+        with KnowledgeBaseSnapshot(self.snapshot_file) as snapshot:
+            self.assertEqual(len(snapshot.get_features('ENSEMBL', 'Mus musculus')), 1)
+
+            with self.assertRaises(KeyError):
+                snapshot.get_features('ENSEMBL', 'Homo sapiens')
+
+    def test_invalid_snapshot(self):
+        with open(self.snapshot_file, 'wb') as handle:
+            handle.write(b'\0' * 64)
+
+        with self.assertRaises(ValueError):
+            KnowledgeBaseSnapshot(self.snapshot_file)
@@ -7,19 +7,90 @@ Views
 """
 from elasticsearch_dsl.query import Q
 
-from rest_framework import viewsets, mixins, permissions
+from django.db import transaction
+from django.db.models import Q as DbQ
+from django.http import StreamingHttpResponse
+
+from rest_framework import viewsets, mixins, permissions, status
+from rest_framework.decorators import list_route
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
 from rest_framework_filters.backends import DjangoFilterBackend
 
-from resolwe.elastic.viewsets import ElasticSearchBaseViewSet
-
-from .models import Feature, Mapping
-from .serializers import FeatureSerializer, MappingSerializer
+from resolwe.elastic.builder import index_builder
+from resolwe.elastic.viewsets import ELASTICSEARCH_SIZE, ElasticSearchBaseViewSet, TooManyResults
+
+from .autocomplete import BACKEND_MEMORY, feature_prefix_index, get_autocomplete_backend
+from .bulk import (
+    FEATURE_KEY_FIELDS, FEATURE_VALUE_FIELDS, MAPPING_FIELDS, MAPPING_KEY_FIELDS, get_feature_ids, get_mapping_ids,
+    insert_mappings, upsert_features,
+)
+from .caching import CachedSearchMixin, invalidate_feature_search
+from .lookup import mapping_lookup
+from .models import Feature, Mapping, MappingClosure
+from .pagination import KeysetPagination
+from .serializers import (
+    FeatureBulkSerializer, FeatureSerializer, MappingBulkSerializer, MappingClosureSerializer, MappingSerializer,
+    MappingTranslateSerializer,
+)
 from .filters import MappingFilter
 
 from .elastic_indexes import FeatureSearchDocument, MappingSearchDocument
 
 
-class FeatureSearchViewSet(ElasticSearchBaseViewSet):
+class ExactFeatureLookupMixin(object):
+    """Mixin resolving large exact feature queries in the database.
+
+    Queries with many terms are slow in Elasticsearch and are limited by
+    its maximal number of clauses, so queries with at least
+    ``exact_lookup_threshold`` terms are resolved with indexed exact
+    lookups in the database instead.
+
+    """
+
+    #: minimal number of query terms resolved in the database
+    exact_lookup_threshold = 500
+
+    def is_exact_lookup_request(self):
+        """Check if the current request should be resolved in the database."""
+        for param in ('query', 'feature_id'):
+            value = self.get_query_param(param, None)
+            if isinstance(value, list) and len(value) >= self.exact_lookup_threshold:
+                return True
+
+        return False
+
+    def list_with_post(self, request):
+        """Look up features in the database for large exact queries."""
+        if not self.is_exact_lookup_request():
+            return super(ExactFeatureLookupMixin, self).list_with_post(request)
+
+        queryset = Feature.objects.all()
+        for field in self.filtering_fields:
+            value = self.get_query_param(field, None)
+            if not value:
+                continue
+            if not isinstance(value, list):
+                value = [value]
+
+            queryset = queryset.filter(**{'{}__in'.format(field): value})
+
+        query = self.get_query_param('query', None)
+        if query:
+            if not isinstance(query, list):
+                query = [query]
+
+            queryset = queryset.filter(DbQ(feature_id__in=query) | DbQ(name__in=query) | DbQ(aliases__overlap=query))
+
+        ordering = self.get_query_param('ordering', self.ordering)
+        if ordering.lstrip('-') not in self.ordering_fields:
+            raise KeyError('Ordering by `{}` is not supported.'.format(ordering))
+
+        return self.paginate_response(queryset.order_by(ordering, 'id'))
+
+
+class FeatureSearchViewSet(CachedSearchMixin, ExactFeatureLookupMixin, ElasticSearchBaseViewSet):
     """
     Endpoint used for feature search.
 
@@ -29,6 +100,9 @@ class FeatureSearchViewSet(ElasticSearchBaseViewSet):
 
     Response:
      - a list of matching features
+
+    Queries with many terms are resolved in the database instead of
+    Elasticsearch.
     """
 
     document_class = FeatureSearchDocument
@@ -38,6 +112,13 @@ class FeatureSearchViewSet(ElasticSearchBaseViewSet):
     ordering_fields = ('name',)
     ordering = 'name'
 
+    def normalize_query(self, query):
+        """Ignore order and duplicates of exact query terms."""
+        if isinstance(query, list):
+            return sorted(set(query))
+
+        return query
+
     def custom_filter_feature_id(self, value, search):
         """Support exact feature_id queries."""
         if not isinstance(value, list):
@@ -68,14 +149,65 @@ class FeatureSearchViewSet(ElasticSearchBaseViewSet):
         return search
 
 
-class FeatureAutocompleteViewSet(ElasticSearchBaseViewSet):
-    """Endpoint used for feature autocompletion."""
+class PrefixAutocompleteMixin(object):
+    """Mixin serving autocompletion from the in-memory prefix index.
+
+    The index is only used if ``KB_AUTOCOMPLETE_BACKEND`` setting is
+    set to ``'memory'`` and once it has been built.
+
+    """
+
+    def list_with_post(self, request):
+        """Search the prefix index and return matching features."""
+        if get_autocomplete_backend() != BACKEND_MEMORY:
+            return super(PrefixAutocompleteMixin, self).list_with_post(request)
+
+        filters = {}
+        for field, param in (('sources', 'source'), ('species', 'species')):
+            value = self.get_query_param(param, None)
+            if value:
+                filters[field] = value if isinstance(value, list) else [value]
+
+        ids = feature_prefix_index.search(self.get_query_param('query', ''), **filters)
+        if ids is None:
+            # Elasticsearch results are not cached, so they are replaced
+            # by results from the index as soon as it is built.
+            self.cache_response = False
+            return super(PrefixAutocompleteMixin, self).list_with_post(request)
+
+        page = self.paginate_queryset(ids)
+        if page is None:
+            if len(ids) > ELASTICSEARCH_SIZE:
+                raise TooManyResults()
+            page_ids = ids
+        else:
+            page_ids = page
+
+        features = Feature.objects.in_bulk(page_ids)
+        serializer = self.get_serializer([features[pk] for pk in page_ids if pk in features], many=True)
+
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+
+        return Response(serializer.data)
+
+
+class FeatureAutocompleteViewSet(CachedSearchMixin, PrefixAutocompleteMixin, ElasticSearchBaseViewSet):
+    """Endpoint used for feature autocompletion.
+
+    Autocompletion is served from Elasticsearch or from the in-memory
+    prefix index, depending on ``KB_AUTOCOMPLETE_BACKEND`` setting.
+    """
 
     document_class = FeatureSearchDocument
     serializer_class = FeatureSerializer
 
     filtering_fields = ('source', 'species')
 
+    def normalize_query(self, query):
+        """Autocomplete queries are matched in lowercase."""
+        return (query or '').lower()
+
     def custom_filter(self, search):
         """Support autocomplete query using the 'query' attribute."""
         return search.query(
@@ -94,7 +226,143 @@ class FeatureAutocompleteViewSet(ElasticSearchBaseViewSet):
         return search
 
 
-class FeatureViewSet(mixins.ListModelMixin,
+class BulkUpsertMixin(object):
+    """Mixin adding a ``bulk`` endpoint for inserting or updating objects.
+
+    The endpoint accepts a list of objects, upserts them in a single
+    transaction and reindexes all changed objects at once. The response
+    contains a status (``created``, ``updated``, ``unchanged`` or
+    ``error``) for each of the given objects.
+
+    Objects are written with ``bulk_upsert`` if it is set and with
+    ``bulk_insert`` otherwise, in which case existing objects are never
+    updated.
+
+    """
+
+    #: serializer used to validate each of the objects
+    bulk_serializer_class = None
+
+    #: fields identifying an object, in the order of keys passed to
+    #: ``bulk_get_ids``
+    bulk_key_fields = ()
+
+    #: all fields of an object written to the database, missing ones are
+    #: set to their defaults
+    bulk_fields = ()
+
+    #: function upserting dicts of ``bulk_fields`` values and returning
+    #: a tuple of lists of inserted and updated ids
+    bulk_upsert = None
+
+    #: function inserting tuples of ``bulk_fields`` values, which do not
+    #: exist yet, and returning a list of inserted ids
+    bulk_insert = None
+
+    #: function returning a dict of object ids by their keys
+    bulk_get_ids = None
+
+    #: function invalidating cached data after objects are changed
+    bulk_invalidate = None
+
+    @list_route(methods=['post'])
+    def bulk(self, request, *args, **kwargs):
+        """Insert or update a list of objects."""
+        if not isinstance(request.data, list):
+            return Response({'error': "A list of objects is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        model = self.get_queryset().model
+        results = []
+        values = {}
+        for item in request.data:
+            serializer = self.bulk_serializer_class(data=item)  # pylint: disable=not-callable
+            if not serializer.is_valid():
+                results.append({'status': 'error', 'errors': serializer.errors})
+                continue
+
+            data = serializer.validated_data
+            key = tuple(data[field] for field in self.bulk_key_fields)
+            if key in values:
+                results.append({'status': 'error', 'errors': {'non_field_errors': ["Duplicated object."]}})
+                continue
+
+            values[key] = {
+                field: data.get(field, model._meta.get_field(field).get_default())  # pylint: disable=protected-access
+                for field in self.bulk_fields
+            }
+            results.append({'key': key})
+
+        with transaction.atomic():
+            if self.bulk_upsert is not None:
+                inserted_ids, updated_ids = self.bulk_upsert(values.values())  # pylint: disable=not-callable
+            else:
+                inserted_ids = self.bulk_insert(  # pylint: disable=not-callable
+                    tuple(value[field] for field in self.bulk_fields) for value in values.values()
+                )
+                updated_ids = []
+            ids = self.bulk_get_ids(values.keys())  # pylint: disable=not-callable
+
+        changed_ids = inserted_ids + updated_ids
+        if changed_ids:
+            self.bulk_invalidate()  # pylint: disable=not-callable
+            index_builder.build(queryset=self.get_queryset().filter(id__in=changed_ids))
+
+        inserted_ids, updated_ids = set(inserted_ids), set(updated_ids)
+        for result in results:
+            if 'key' not in result:
+                continue
+
+            result['id'] = ids[result.pop('key')]
+            if result['id'] in inserted_ids:
+                result['status'] = 'created'
+            elif result['id'] in updated_ids:
+                result['status'] = 'updated'
+            else:
+                result['status'] = 'unchanged'
+
+        return Response(results)
+
+
+class ExportMixin(object):
+    """Mixin adding an ``export`` endpoint streaming all objects.
+
+    Objects are streamed as newline-delimited JSON ordered by their ids.
+    They are fetched in batches selected by the id of the last object of
+    the previous batch, so the server memory usage does not depend on
+    the number of exported objects.
+
+    """
+
+    #: number of objects fetched from the database at once
+    export_batch_size = 1000
+
+    def iterate_export(self, queryset):
+        """Serialize objects in ``queryset`` to lines of JSON."""
+        renderer = JSONRenderer()
+        last_id = None
+        while True:
+            batch = queryset.order_by('id')
+            if last_id is not None:
+                batch = batch.filter(id__gt=last_id)
+            batch = list(batch[:self.export_batch_size])
+            if not batch:
+                break
+
+            for item in self.get_serializer(batch, many=True).data:
+                yield renderer.render(item) + b'\n'
+
+            last_id = batch[-1].id
+
+    @list_route(methods=['get'])
+    def export(self, request, *args, **kwargs):
+        """Stream all (filtered) objects as newline-delimited JSON."""
+        queryset = self.filter_queryset(self.get_queryset())
+        return StreamingHttpResponse(self.iterate_export(queryset), content_type='application/x-ndjson')
+
+
+class FeatureViewSet(BulkUpsertMixin,
+                     ExportMixin,
+                     mixins.ListModelMixin,
                      mixins.RetrieveModelMixin,
                      mixins.CreateModelMixin,
                      mixins.UpdateModelMixin,
@@ -103,8 +371,15 @@ class FeatureViewSet(mixins.ListModelMixin,
     """API view for :class:`Feature` objects."""
 
     serializer_class = FeatureSerializer
+    bulk_serializer_class = FeatureBulkSerializer
+    bulk_key_fields = FEATURE_KEY_FIELDS
+    bulk_fields = FEATURE_KEY_FIELDS + FEATURE_VALUE_FIELDS
+    bulk_upsert = staticmethod(upsert_features)
+    bulk_get_ids = staticmethod(get_feature_ids)
+    bulk_invalidate = staticmethod(invalidate_feature_search)
     permission_classes = [permissions.IsAdminUser]
     filter_backends = [DjangoFilterBackend]
+    pagination_class = KeysetPagination
     queryset = Feature.objects.all()
 
     def create(self, request, *args, **kwargs):
@@ -132,9 +407,18 @@ class MappingSearchViewSet(ElasticSearchBaseViewSet):
      - target_db
      - target_species
      - relation_type
+     - max_hops
 
     Response:
      - a list of matching mappings
+
+    If ``max_hops`` is given, chains of at most ``max_hops`` mappings
+    are searched in the precomputed mapping closure instead, and a list
+    of matching mapping closure entries is returned. The closure is
+    computed by ``compute_mapping_closure`` django-admin command and
+    refreshed by ``insert_mappings`` django-admin command. Mappings
+    changed through the API are only reflected in the closure after it
+    is computed again.
     """
 
     document_class = MappingSearchDocument
@@ -166,8 +450,81 @@ class MappingSearchViewSet(ElasticSearchBaseViewSet):
         """Filter permissions since Mapping objects have no permissions."""
         return search
 
+    def is_closure_request(self):
+        """Check if current request is a multi-hop search request."""
+        return self.get_query_param('max_hops', None) is not None
 
-class MappingViewSet(mixins.ListModelMixin,
+    def get_serializer_class(self):
+        """Use mapping closure serializer for multi-hop search requests."""
+        if self.is_closure_request():
+            return MappingClosureSerializer
+
+        return super(MappingSearchViewSet, self).get_serializer_class()
+
+    def list_with_post(self, request):
+        """Search mapping closure in the database for multi-hop search requests."""
+        if not self.is_closure_request():
+            return super(MappingSearchViewSet, self).list_with_post(request)
+
+        try:
+            max_hops = int(self.get_query_param('max_hops'))
+        except (TypeError, ValueError):
+            raise ValidationError({'max_hops': ["A valid integer is required."]})
+
+        queryset = MappingClosure.objects.filter(hops__lte=max_hops)
+        for field in ('source_db', 'source_id', 'source_species', 'target_db', 'target_id', 'target_species'):
+            value = self.get_query_param(field, None)
+            if not value:
+                continue
+            if not isinstance(value, list):
+                value = [value]
+
+            queryset = queryset.filter(**{'{}__in'.format(field): value})
+
+        ordering = self.get_query_param('ordering', self.ordering)
+        if ordering.lstrip('-') not in self.ordering_fields:
+            raise KeyError('Ordering by `{}` is not supported.'.format(ordering))
+
+        return self.paginate_response(queryset.order_by(ordering, 'id'))
+
+
+class MappingTranslateViewSet(viewsets.ViewSet):
+    """
+    Endpoint used for translating feature identifiers.
+
+    Identifiers are translated using in-memory lookup tables built
+    from mappings, so large lists of identifiers can be translated
+    in a single request.
+
+    Request:
+     - source_db
+     - source_species
+     - target_db
+     - target_species (defaults to ``source_species``)
+     - ids
+
+    Response:
+     - a dict of lists of target identifiers by source identifiers
+    """
+
+    def create(self, request, *args, **kwargs):
+        """Translate the given identifiers."""
+        serializer = MappingTranslateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        return Response(mapping_lookup.translate(
+            source_db=data['source_db'],
+            source_species=data['source_species'],
+            target_db=data['target_db'],
+            target_species=data.get('target_species', data['source_species']),
+            ids=data['ids'],
+        ))
+
+
+class MappingViewSet(BulkUpsertMixin,
+                     ExportMixin,
+                     mixins.ListModelMixin,
                      mixins.RetrieveModelMixin,
                      mixins.CreateModelMixin,
                      mixins.UpdateModelMixin,
@@ -176,22 +533,22 @@ class MappingViewSet(mixins.ListModelMixin,
     """API view for :class:`Mapping` objects."""
 
     serializer_class = MappingSerializer
+    bulk_serializer_class = MappingBulkSerializer
+    bulk_key_fields = MAPPING_KEY_FIELDS
+    bulk_fields = MAPPING_FIELDS
+    bulk_insert = staticmethod(insert_mappings)
+    bulk_get_ids = staticmethod(get_mapping_ids)
+    bulk_invalidate = staticmethod(mapping_lookup.invalidate)
     permission_classes = [permissions.IsAdminUser]
     filter_backends = [DjangoFilterBackend]
     filter_class = MappingFilter
+    pagination_class = KeysetPagination
     queryset = Mapping.objects.all()
 
     def create(self, request, *args, **kwargs):
         """Instead of failing, update existing mappings using a custom create."""
         try:
-            mapping = Mapping.objects.get(
-                source_db=request.data['source_db'],
-                source_id=request.data['source_id'],
-                source_species=request.data['source_species'],
-                target_db=request.data['target_db'],
-                target_id=request.data['target_id'],
-                target_species=request.data['target_species'],
-            )
+            mapping = Mapping.objects.get(**{field: request.data[field] for field in MAPPING_KEY_FIELDS})
             self.kwargs[self.lookup_field] = mapping.pk
             return super(MappingViewSet, self).update(request, *args, **kwargs)  # pylint: disable=no-member
         except (Mapping.DoesNotExist, KeyError):  # pylint: disable=no-member
@@ -171,6 +171,10 @@ class ExpressionProcessorTestCase(BioProcessTestCase):
         etc = self.run_process('etc-bcm', inputs)
         self.assertJSON(etc, etc.output['etc'], '', 'etc.json.gz')
 
+        inputs['build_index'] = True
+        etc = self.run_process('etc-bcm', inputs)
+        self.assertFileExists(etc, 'etcindex')
+
     @tag_process('htseq-count')
     def test_expression_htseq(self):
         with self.preparation_stage():
@@ -29,8 +29,7 @@ class ExpressionAggregatorTestCase(BioProcessTestCase):
         }
         expression_aggregator = self.run_process('expression-aggregator', inputs)
 
-        saved_matrix, test_matrix = self.get_json('exp_matrix.json.gz', expression_aggregator.output['exp_matrix'])
-        self.assertEqual(saved_matrix, test_matrix)
+        self.assertFile(expression_aggregator, 'exp_matrix', 'exp_matrix.bin')
         self.assertJSON(
             expression_aggregator, expression_aggregator.output['box_plot'], '', 'box_plot.json.gz'
         )
@@ -105,6 +105,7 @@ class UploadProcessorTestCase(BioProcessTestCase):
         self.assertFile(exp_5, 'exp', 'exp_1_tpm.tab.gz')
         self.assertFile(exp_5, 'rc', 'exp_1_rc.tab.gz')
         self.assertJSON(exp_5, exp_5.output['exp_json'], '', 'exp_1_norm.json.gz')
+        self.assertFile(exp_5, 'exp_bin', 'exp_1_tpm.bin')
 
         inputs = {
             'rc': 'exp_mac_line_ending.txt.gz',
@@ -0,0 +1,15 @@
+"""Unit tests.
+
+Tools are scripts, which are not a part of the package, so their
+directory is added to the module search path once for all unit tests
+importing them.
+
+"""
+import os
+import sys
+
+import resolwe_bio
+
+TOOLS_DIR = os.path.join(os.path.dirname(resolwe_bio.__file__), 'tools')
+if TOOLS_DIR not in sys.path:
+    sys.path.insert(0, TOOLS_DIR)
@@ -0,0 +1,61 @@
+# pylint: disable=missing-docstring
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+
+from aggregator_matrix import AggregatorMatrix, append, create  # pylint: disable=import-error
+
+
+class AggregatorMatrixTestCase(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.tmp_dir, 'exp_matrix.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_append(self):
+        create(self.file_name, 'ENSEMBL', 'TPM', 'sample.organism')
+        append(self.file_name, [{'B': 1.0, 'A': 2.0}, {'A': 3.0}], ['Homo sapiens', 'Homo sapiens'])
+        size = os.path.getsize(self.file_name)
+
+        append(self.file_name, [{'C': 4.0, 'A': 5.0}], ['Mus musculus'])
+
+        matrix = AggregatorMatrix(self.file_name)
+        self.assertEqual(matrix.source, 'ENSEMBL')
+        self.assertEqual(matrix.expression_type, 'TPM')
+        self.assertEqual(matrix.group_by, 'sample.organism')
+        self.assertEqual(matrix.genes, ['A', 'B', 'C'])
+        self.assertEqual(matrix.descriptors, ['Homo sapiens', 'Homo sapiens', 'Mus musculus'])
+        # Only the new block and table of contents are written after
+        # the existing samples.
+        self.assertEqual(matrix.blocks[0]['genes'], 2)
+        self.assertGreater(matrix.blocks[1]['offset'], matrix.blocks[0]['offset'])
+        self.assertLess(matrix.blocks[1]['offset'], size)
+
+        values = matrix.get_values()
+        self.assertEqual(values.dtype, np.float32)
+        np.testing.assert_array_equal(values, [
+            [2.0, 1.0, np.nan],
+            [3.0, np.nan, np.nan],
+            [5.0, np.nan, 4.0],
+        ])
+
+    def test_empty(self):
+        create(self.file_name, 'ENSEMBL', 'TPM', 'sample.organism')
+        append(self.file_name, [{}], ['Homo sapiens'])
+        append(self.file_name, [{'A': 1.0}], ['Homo sapiens'])
+
+        values = AggregatorMatrix(self.file_name).get_values()
+        np.testing.assert_array_equal(values, [[np.nan], [1.0]])
+
+    def test_invalid_file(self):
+        with open(self.file_name, 'wb') as handle:
+            handle.write(b'{"descriptors": []}' * 4)
+
+        with self.assertRaises(ValueError):
+            AggregatorMatrix(self.file_name)
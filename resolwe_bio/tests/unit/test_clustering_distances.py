@@ -0,0 +1,92 @@
+# pylint: disable=missing-docstring
+import os
+import shutil
+import tempfile
+import warnings
+from unittest import TestCase
+
+import numpy as np
+from scipy.spatial.distance import pdist, squareform
+from scipy.stats import pearsonr, spearmanr
+
+import clustering_distances  # pylint: disable=import-error
+
+
+def pairwise(matrix, correlation):
+    """Compute correlation distances by calling ``correlation`` for each pair."""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return pdist(matrix, lambda x, y: 0.0 if (x == y).all() else 1.0 - correlation(x, y)[0])
+
+
+class ClusteringDistancesTestCase(TestCase):
+
+    def setUp(self):
+        random_state = np.random.RandomState(0)
+        self.matrix = random_state.randint(0, 5, size=(30, 6)).astype(np.float64)
+        self.matrix[:10] += random_state.rand(10, 6)
+        self.matrix[10] = self.matrix[11]
+        self.matrix[12] = 3.0
+        self.matrix[13] = 3.0
+        self.matrix[14, 2] = np.nan
+
+    def assertDistances(self, distances, expected):  # pylint: disable=invalid-name
+        self.assertEqual(distances.shape, expected.shape)
+        np.testing.assert_array_equal(np.isnan(distances), np.isnan(expected))
+        np.testing.assert_allclose(distances, expected, atol=1e-12)
+
+    def test_pearson(self):
+        expected = pairwise(self.matrix, pearsonr)
+        for block_size in [1, 7, 1024]:
+            distances = clustering_distances.correlation_distances(self.matrix, 'pearson', block_size)
+            self.assertDistances(distances, expected)
+
+        square = squareform(clustering_distances.get_distances(self.matrix, 'pearson'), checks=False)
+        self.assertEqual(square[10, 11], 0.0)
+        self.assertEqual(square[12, 13], 0.0)
+        self.assertTrue(np.isnan(square[12, 0]))
+        self.assertTrue(np.isnan(square[14, 0]))
+
+    def test_spearman(self):
+        expected = pairwise(self.matrix, spearmanr)
+        for block_size in [1, 7, 1024]:
+            distances = clustering_distances.correlation_distances(self.matrix, 'spearman', block_size)
+            self.assertDistances(distances, expected)
+
+    def test_other_metrics(self):
+        for metric in ['euclidean', 'cityblock']:
+            for block_size in [1, 7, 1024]:
+                np.testing.assert_array_equal(
+                    clustering_distances.get_distances(self.matrix[:10], metric, block_size),
+                    pdist(self.matrix[:10], metric),
+                )
+
+    def test_memmap(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            out = clustering_distances.get_buffer(len(self.matrix), 'memmap', tmp_dir)
+            self.assertIsInstance(out, np.memmap)
+            self.assertEqual(out.dtype, np.float64)
+            # The file is removed as soon as it is mapped.
+            self.assertEqual(os.listdir(tmp_dir), [])
+
+            distances = clustering_distances.get_distances(self.matrix, 'pearson', block_size=7, out=out)
+            self.assertIs(distances, out)
+            self.assertDistances(distances, pairwise(self.matrix, pearsonr))
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_choose_strategy(self):
+        memory = clustering_distances.estimate_memory(20000, 10, 'memory')
+        memmap = clustering_distances.estimate_memory(20000, 10, 'memmap')
+        # Distances kept in memory take 1.6 GB in addition to the copy made by linkage.
+        self.assertEqual(memory - memmap, 20000 * 19999 // 2 * 8)
+
+        self.assertEqual(clustering_distances.choose_strategy(20000, 10, memory), ('memory', memory))
+        self.assertEqual(clustering_distances.choose_strategy(20000, 10, memory - 1), ('memmap', memmap))
+        with self.assertRaises(MemoryError):
+            clustering_distances.choose_strategy(20000, 10, memmap - 1)
+
+    def test_small(self):
+        self.assertEqual(clustering_distances.correlation_distances(np.zeros((1, 3))).shape, (0,))
+        self.assertEqual(clustering_distances.correlation_distances(np.zeros((0, 3))).shape, (0,))
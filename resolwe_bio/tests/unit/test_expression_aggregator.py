@@ -0,0 +1,204 @@
+# pylint: disable=missing-docstring
+import gzip
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+
+import expression_aggregator  # pylint: disable=import-error
+from aggregator_matrix import AggregatorMatrix  # pylint: disable=import-error
+
+
+def per_gene_statistics(raw_expressions, descriptors, expression_type):
+    """Compute box plot statistics gene by gene, as before vectorisation."""
+    statistics = {}
+    for gene in {gene for expression in raw_expressions for gene in expression}:
+        statistics[gene] = []
+        for descriptor in set(descriptors):
+            values = [
+                expression[gene] for expression, expression_descriptor in zip(raw_expressions, descriptors)
+                if expression_descriptor == descriptor and gene in expression
+            ]
+            if not values:
+                continue
+
+            q1 = np.percentile(values, 25.0)
+            q3 = np.percentile(values, 75.0)
+            iqr = q3 - q1
+            statistics[gene].append({
+                'attribute': descriptor,
+                'gene': gene,
+                'exp_types': [expression_type],
+                'min': min(values),
+                'max': max(values),
+                'median': np.percentile(values, 50.0),
+                'q1': q1,
+                'q3': q3,
+                'lowerwhisker': max(min(values), q1 - 1.5 * iqr),
+                'upperwhisker': min(max(values), q3 + 1.5 * iqr),
+                'data_count': len(values),
+            })
+    return statistics
+
+
+class ExpressionStatisticsTestCase(TestCase):
+
+    def setUp(self):
+        random_state = np.random.RandomState(0)
+        self.descriptors = ['A', 'B', 'A', 'C', 'B', 'A']
+        self.raw_expressions = [
+            {gene: float(value) for gene, value in zip(['G1', 'G2', 'G3', 'G4'], random_state.rand(4) * 100)}
+            for _ in self.descriptors
+        ]
+        # G2 is missing in one of the samples of group A.
+        del self.raw_expressions[2]['G2']
+        # G3 is only expressed in the single sample of group C.
+        for i in [0, 1, 2, 4, 5]:
+            del self.raw_expressions[i]['G3']
+        # G4 is missing in all samples of group B.
+        for i in [1, 4]:
+            del self.raw_expressions[i]['G4']
+
+        self.genes = ['G1', 'G2', 'G3', 'G4']
+        self.matrix = np.array([
+            [expression.get(gene, np.nan) for expression in self.raw_expressions]
+            for gene in self.genes
+        ])
+
+    def assertStatisticsEqual(self, statistics, expected):  # pylint: disable=invalid-name
+        self.assertEqual(sorted(statistics), sorted(expected))
+        for gene in expected:
+            by_attribute = {item['attribute']: item for item in statistics[gene]}
+            expected_by_attribute = {item['attribute']: item for item in expected[gene]}
+            self.assertEqual(by_attribute, expected_by_attribute)
+            for item in statistics[gene]:
+                self.assertIsInstance(item['data_count'], int)
+
+    def test_statistics(self):
+        statistics = expression_aggregator.get_statistics(self.matrix, self.genes, self.descriptors, 'TPM')
+        expected = per_gene_statistics(self.raw_expressions, self.descriptors, 'TPM')
+        self.assertStatisticsEqual(statistics, expected)
+
+        self.assertEqual([item['attribute'] for item in statistics['G3']], ['C'])
+        self.assertEqual(statistics['G3'][0]['data_count'], 1)
+        self.assertEqual(sorted(item['attribute'] for item in statistics['G4']), ['A', 'C'])
+        self.assertEqual({item['attribute']: item['data_count'] for item in statistics['G2']}, {'A': 2, 'B': 2, 'C': 1})
+
+    def test_log_statistics(self):
+        log_matrix = expression_aggregator.get_log_matrix(self.matrix)
+        statistics = expression_aggregator.get_statistics(log_matrix, self.genes, self.descriptors, 'TPM')
+        log_expressions = [
+            {gene: math.log(value + 1.0, 2.0) for gene, value in expression.items()}
+            for expression in self.raw_expressions
+        ]
+        expected = per_gene_statistics(log_expressions, self.descriptors, 'TPM')
+        self.assertStatisticsEqual(statistics, expected)
+
+    def test_single_sample(self):
+        statistics = expression_aggregator.get_statistics(self.matrix[:, 3:4], self.genes, ['C'], 'TPM')
+        expected = per_gene_statistics(self.raw_expressions[3:4], ['C'], 'TPM')
+        self.assertStatisticsEqual(statistics, expected)
+        self.assertEqual(statistics['G1'][0]['lowerwhisker'], statistics['G1'][0]['max'])
+
+
+class ExpressionAggregatorTestCase(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.expressions = [
+            self.write_expression('exp_1.tab.gz', b'Gene\tExpression\nA\t1\nB\t2\n'),
+            self.write_expression('exp_2.tab.gz', b'Gene\tExpression\nA\t5\nB\t4\n'),
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write_expression(self, name, content):
+        file_name = os.path.join(self.tmp_dir, name)
+        with gzip.open(file_name, 'wb') as handle:
+            handle.write(content)
+        return file_name
+
+    def write_legacy_aggregator(self, raw_expressions):
+        file_name = os.path.join(self.tmp_dir, 'legacy.json.gz')
+        with gzip.open(file_name, 'wb') as handle:
+            handle.write(json.dumps({
+                'raw_expressions': raw_expressions,
+                'descriptors': ['Mus musculus'] * len(raw_expressions),
+                'source': 'ENSEMBL',
+                'expression_type': 'TPM',
+                'group_by': 'sample.organism',
+            }).encode('utf-8'))
+        return file_name
+
+    def run_aggregator(self, aggregator=None):
+        output = os.path.join(self.tmp_dir, 'exp_matrix.bin')
+        box_plot = os.path.join(self.tmp_dir, 'box_plot.json')
+        argv = [
+            'expression_aggregator.py',
+            '--expressions', self.expressions[0], self.expressions[1],
+            '--descriptors', 'Homo sapiens', 'Homo sapiens',
+            '--source', 'ENSEMBL',
+            '--expression-type', 'TPM',
+            '--group-by', 'sample.organism',
+            '--box-plot-output', box_plot,
+            '--expressions-output', output,
+        ]
+        if aggregator:
+            argv.extend(['--aggregator', aggregator])
+
+        original_argv = sys.argv
+        try:
+            sys.argv = argv
+            expression_aggregator.main()
+        finally:
+            sys.argv = original_argv
+
+        with open(box_plot) as handle:
+            return AggregatorMatrix(output), json.load(handle)
+
+    def test_legacy_aggregator(self):
+        legacy = self.write_legacy_aggregator([{'A': 3.0, 'C': 7.0}, {'A': 4.5}])
+        matrix, box_plot = self.run_aggregator(legacy)
+
+        self.assertEqual(matrix.source, 'ENSEMBL')
+        self.assertEqual(matrix.genes, ['A', 'C', 'B'])
+        self.assertEqual(matrix.descriptors, ['Mus musculus', 'Mus musculus', 'Homo sapiens', 'Homo sapiens'])
+        np.testing.assert_array_equal(matrix.get_values(), [
+            [3.0, 7.0, np.nan],
+            [4.5, np.nan, np.nan],
+            [1.0, np.nan, 2.0],
+            [5.0, np.nan, 4.0],
+        ])
+
+        statistics = {(item['gene'], item['attribute']): item for items in box_plot.values() for item in items}
+        self.assertEqual(sorted(statistics), [
+            ('A', 'Homo sapiens'), ('A', 'Mus musculus'), ('B', 'Homo sapiens'), ('C', 'Mus musculus'),
+        ])
+        self.assertEqual(statistics['A', 'Mus musculus']['min'], 3.0)
+        self.assertEqual(statistics['A', 'Mus musculus']['max'], 4.5)
+        self.assertEqual(statistics['A', 'Homo sapiens']['median'], 3.0)
+        self.assertEqual(statistics['C', 'Mus musculus']['data_count'], 1)
+
+        # Samples of the converted aggregator are kept when it is chained.
+        previous = os.path.join(self.tmp_dir, 'previous.bin')
+        shutil.copyfile(os.path.join(self.tmp_dir, 'exp_matrix.bin'), previous)
+        chained, _ = self.run_aggregator(previous)
+        self.assertEqual(chained.descriptors, matrix.descriptors + ['Homo sapiens', 'Homo sapiens'])
+        np.testing.assert_array_equal(chained.get_values()[:4], matrix.get_values())
+
+    def test_legacy_aggregator_invalid(self):
+        for value in [float('nan'), 'x', None]:
+            legacy = self.write_legacy_aggregator([{'A': 3.0, 'B': value}])
+            with self.assertRaises(ValueError):
+                self.run_aggregator(legacy)
+
+    def test_invalid_expression(self):
+        self.expressions[1] = self.write_expression('exp_3.tab.gz', b'Gene\tExpression\nA\t5\nB\tNA\n')
+        with self.assertRaises(ValueError):
+            self.run_aggregator()
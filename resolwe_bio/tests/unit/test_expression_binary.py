@@ -0,0 +1,46 @@
+# pylint: disable=missing-docstring
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+
+from expression_binary import BinaryExpression, write_expression  # pylint: disable=import-error
+
+
+class BinaryExpressionTestCase(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.tmp_dir, 'exp.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_write_read(self):
+        write_expression(self.file_name, {'GENE2': 2.5, 'GENE10': 0.1, 'GENE1': 0.0})
+
+        expression = BinaryExpression(self.file_name)
+        self.assertEqual(len(expression), 3)
+        self.assertEqual(expression.genes, ['GENE1', 'GENE10', 'GENE2'])
+        self.assertEqual(expression.values.dtype, np.float32)
+        np.testing.assert_array_equal(expression.values, np.array([0.0, 0.1, 2.5], dtype=np.float32))
+
+        self.assertEqual(expression.get('GENE2'), 2.5)
+        self.assertIsNone(expression.get('GENE3'))
+        self.assertEqual(expression.as_dict()['GENE1'], 0.0)
+
+    def test_empty(self):
+        write_expression(self.file_name, {})
+
+        expression = BinaryExpression(self.file_name)
+        self.assertEqual(expression.genes, [])
+        self.assertIsNone(expression.get('GENE1'))
+
+    def test_invalid_file(self):
+        with open(self.file_name, 'wb') as handle:
+            handle.write(b'Gene\tExpression\nGENE1\t1.0\n')
+
+        with self.assertRaises(ValueError):
+            BinaryExpression(self.file_name)
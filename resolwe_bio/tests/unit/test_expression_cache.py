@@ -0,0 +1,90 @@
+# pylint: disable=missing-docstring
+import gzip
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+
+import expression_cache  # pylint: disable=import-error
+
+
+class ExpressionCacheTestCase(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.tmp_dir, 'cache')
+        os.environ[expression_cache.CACHE_DIR_VARIABLE] = self.cache_dir
+
+        self.file_name = os.path.join(self.tmp_dir, 'expressions.tab.gz')
+        with gzip.open(self.file_name, 'wb') as handle:
+            handle.write(b'Gene\tExpression\nA\t1.5\nB\t0\nC\tNA\n')
+
+    def tearDown(self):
+        del os.environ[expression_cache.CACHE_DIR_VARIABLE]
+        shutil.rmtree(self.tmp_dir)
+
+    def assertExpression(self, expression):  # pylint: disable=invalid-name
+        self.assertEqual(expression.header, ['Gene', 'Expression'])
+        self.assertEqual(expression.genes, ['A', 'B', 'C'])
+        self.assertEqual(expression.texts, [['1.5'], ['0'], ['NA']])
+        np.testing.assert_array_equal(expression.values, [1.5, 0.0, np.nan])
+
+    def test_load_expression(self):
+        expression = expression_cache.load_expression(self.file_name)
+        self.assertExpression(expression)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+        # The second load reads the cache entry instead of the file.
+        original_parse = expression_cache.Expression.parse
+        try:
+            expression_cache.Expression.parse = None
+            expression = expression_cache.load_expression(self.file_name)
+        finally:
+            expression_cache.Expression.parse = original_parse
+
+        self.assertIsInstance(expression.values, np.memmap)
+        self.assertExpression(expression)
+        self.assertEqual(expression.as_dict()['A'], 1.5)
+
+    def test_content_addressed(self):
+        expression_cache.load_expression(self.file_name)
+
+        copy_name = os.path.join(self.tmp_dir, 'copy.tab.gz')
+        shutil.copyfile(self.file_name, copy_name)
+        self.assertExpression(expression_cache.load_expression(copy_name))
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+        with gzip.open(self.file_name, 'wb') as handle:
+            handle.write(b'Gene\tExpression\nA\t2\n')
+        self.assertEqual(expression_cache.load_expression(self.file_name).genes, ['A'])
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+    def test_uncompressed(self):
+        file_name = os.path.join(self.tmp_dir, 'expressions.csv')
+        with open(file_name, 'wb') as handle:
+            handle.write(b'Gene;S1;S2\nA;1;2\n')
+
+        expression = expression_cache.load_expression(file_name, ';')
+        self.assertEqual(expression.header, ['Gene', 'S1', 'S2'])
+        self.assertEqual(expression.texts, [['1', '2']])
+
+        expression = expression_cache.load_expression(file_name, ';')
+        self.assertEqual(expression.texts, [['1', '2']])
+        np.testing.assert_array_equal(expression.values, [1.0])
+
+    def test_unwritable_cache(self):
+        with open(self.cache_dir, 'w'):
+            pass
+
+        self.assertExpression(expression_cache.load_expression(self.file_name))
+
+    def test_disabled(self):
+        del os.environ[expression_cache.CACHE_DIR_VARIABLE]
+        try:
+            self.assertExpression(expression_cache.load_expression(self.file_name))
+        finally:
+            os.environ[expression_cache.CACHE_DIR_VARIABLE] = self.cache_dir
+
+        self.assertFalse(os.path.exists(self.cache_dir))
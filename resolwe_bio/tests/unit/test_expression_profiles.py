@@ -0,0 +1,28 @@
+# pylint: disable=missing-docstring
+from unittest import TestCase
+
+import numpy as np
+from scipy.stats import rankdata
+
+import expression_profiles  # pylint: disable=import-error
+
+
+class ExpressionProfilesTestCase(TestCase):
+
+    def test_ranks(self):
+        matrix = np.random.RandomState(0).randint(0, 4, size=(20, 7)).astype(np.float64)
+        np.testing.assert_array_equal(
+            expression_profiles.get_ranks(matrix),
+            [rankdata(row) for row in matrix],
+        )
+
+    def test_standardize(self):
+        matrix = np.array([[1.0, 2.0, 4.0], [3.0, 3.0, 3.0], [1.0, np.nan, 2.0]])
+        standardized = expression_profiles.standardize(matrix)
+        np.testing.assert_allclose(standardized[0].dot(standardized[0]), 1.0)
+        np.testing.assert_allclose(standardized[0].sum(), 0.0, atol=1e-15)
+        self.assertTrue(np.isnan(standardized[1:]).all())
+
+        ranks = expression_profiles.standardize_ranks(matrix)
+        np.testing.assert_allclose(ranks[0], expression_profiles.standardize(np.array([[1.0, 2.0, 3.0]]))[0])
+        self.assertTrue(np.isnan(ranks[1:]).all())
@@ -0,0 +1,114 @@
+# pylint: disable=missing-docstring
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+
+import find_similar  # pylint: disable=import-error
+from lsh_index import LSHIndex  # pylint: disable=import-error
+
+
+class FindSimilarTestCase(TestCase):
+
+    def setUp(self):
+        self.genes = ['G1', 'G2', 'G3', 'G4', 'G5']
+        self.matrix = np.array([
+            [1.0, 2.0, 3.0, 4.0],
+            [2.0, 4.0, 6.0, 8.0],
+            [4.0, 3.0, 2.0, 1.0],
+            [5.0, 5.0, 5.0, 5.0],
+            [1.0, 3.0, 2.0, 10.0],
+        ])
+
+    def test_ranks(self):
+        ranks = find_similar.get_ranks(np.array([[3.0, 1.0, 3.0, 2.0], [1.0, 1.0, 1.0, 0.0]]))
+        np.testing.assert_array_equal(ranks, [[3.5, 1.0, 3.5, 2.0], [3.0, 3.0, 3.0, 1.0]])
+
+    def test_pearson(self):
+        scores = find_similar.pearson(self.matrix, self.matrix[0])
+        np.testing.assert_allclose(scores[:3], [1.0, 1.0, -1.0])
+        self.assertTrue(np.isnan(scores[3]))
+        np.testing.assert_allclose(scores[4], np.corrcoef(self.matrix[0], self.matrix[4])[0, 1])
+
+    def test_find_similar(self):
+        result = find_similar.find_similar(self.genes, self.matrix, 'G1', 'spearman')
+        self.assertEqual(result['search gene'], 'G1')
+        # Constant expressions are skipped.
+        self.assertEqual([gene['gene'] for gene in result['similar genes']], ['G2', 'G5', 'G3'])
+        self.assertAlmostEqual(result['similar genes'][1]['distance'], 0.8)
+
+        result = find_similar.find_similar(self.genes, self.matrix, 'G1', 'euclidean', top=2)
+        # G2 and G4 are equally distant and ordered by their positions.
+        self.assertEqual([gene['gene'] for gene in result['similar genes']], ['G3', 'G2'])
+        self.assertAlmostEqual(result['similar genes'][0]['distance'], np.sqrt(20.0))
+
+    def test_top_ties(self):
+        scores = np.array([0.5, 0.9, np.nan, 0.5, 0.5, 0.1])
+        np.testing.assert_array_equal(find_similar.get_order(scores, True, top=3), [1, 0, 3])
+        np.testing.assert_array_equal(find_similar.get_order(scores, True), [1, 0, 3, 4, 5])
+        np.testing.assert_array_equal(find_similar.get_order(scores, False, top=2), [5, 0])
+
+    def test_find_similar_batch(self):
+        for dstfunc in ['pearson', 'spearman', 'euclidean']:
+            result = find_similar.find_similar_batch(self.genes, self.matrix, ['G1', 'G9', 'G5'], dstfunc, top=3)
+            self.assertEqual(result['search genes'], ['G1', 'G5'])
+            self.assertEqual(result['missing genes'], ['G9'])
+
+            for gene, gene_result in zip(['G1', 'G5'], result['results']):
+                expected = find_similar.find_similar(self.genes, self.matrix, gene, dstfunc, top=3)
+                self.assertEqual(gene_result['search gene'], gene)
+                self.assertEqual(
+                    [similar['gene'] for similar in gene_result['similar genes']],
+                    [similar['gene'] for similar in expected['similar genes']],
+                )
+                for similar, expected_similar in zip(gene_result['similar genes'], expected['similar genes']):
+                    self.assertAlmostEqual(similar['distance'], expected_similar['distance'])
+
+    def test_index(self):
+        random_state = np.random.RandomState(0)
+        matrix = np.repeat(random_state.randn(10, 8), 20, axis=0) + 0.1 * random_state.randn(200, 8)
+        genes = ['G{}'.format(i) for i in range(200)]
+
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            file_name = os.path.join(tmp_dir, 'etc_index.npz')
+            find_similar.build_index(genes, matrix, tables=4, bits=8).save(file_name)
+            index = LSHIndex.load(file_name)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+        self.assertEqual(index.genes, genes)
+        self.assertEqual(index.metrics, ['pearson', 'spearman'])
+
+        for dstfunc in ['pearson', 'spearman', 'euclidean']:
+            exact = find_similar.find_similar(genes, matrix, 'G0', dstfunc, top=10)
+            approximate = find_similar.find_similar(genes, matrix, 'G0', dstfunc, top=10, index=index)
+            exact_distances = {similar['gene']: similar['distance'] for similar in exact['similar genes']}
+            # Found genes are scored exactly.
+            for similar in approximate['similar genes']:
+                self.assertAlmostEqual(similar['distance'], exact_distances[similar['gene']])
+            if dstfunc == 'euclidean':
+                self.assertEqual(approximate, exact)
+
+            batch = find_similar.find_similar_batch(genes, matrix, ['G0'], dstfunc, top=10, index=index)
+            self.assertEqual(
+                [similar['gene'] for similar in batch['results'][0]['similar genes']],
+                [similar['gene'] for similar in approximate['similar genes']],
+            )
+
+    def test_index_all_candidates(self):
+        # With a single bit and probing radius of one, all genes are
+        # candidates, so the search is exact.
+        index = find_similar.build_index(self.genes, self.matrix, tables=1, bits=1)
+        for dstfunc in ['pearson', 'spearman']:
+            self.assertEqual(
+                find_similar.find_similar(self.genes, self.matrix, 'G1', dstfunc, index=index, radius=1),
+                find_similar.find_similar(self.genes, self.matrix, 'G1', dstfunc),
+            )
+
+    def test_index_mismatch(self):
+        index = find_similar.build_index(self.genes[:4], self.matrix[:4], tables=2, bits=4)
+        with self.assertRaises(ValueError):
+            find_similar.find_similar(self.genes, self.matrix, 'G1', index=index)
@@ -0,0 +1,148 @@
+"""Read and write expression aggregator matrices.
+
+Aggregator matrix file layout (all integers are little-endian unsigned
+64-bit):
+
+- header: magic bytes, offset and length of the table of contents
+- blocks of expressions, each starting at an offset aligned to 8 bytes
+- table of contents: a JSON object with the source, expression type and
+  group by field of the aggregator, the gene index, metadata of samples
+  and the list of blocks
+
+Each block is a samples x genes matrix of little-endian float32
+expressions of samples appended together. Genes are only appended to the
+gene index, so a block covers the genes known when it was written.
+Expressions of genes missing in a sample are NaN.
+
+Samples are appended by writing a new block over the table of contents
+and writing the updated table of contents after it, so existing samples
+are never rewritten.
+
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import json
+import struct
+
+import numpy as np
+
+MAGIC = b'RBEXPAG1'
+HEADER = struct.Struct('<8sQQ')
+ALIGNMENT = 8
+DTYPE = np.dtype('<f4')
+
+
+def is_aggregator_matrix(file_name):
+    """Check if ``file_name`` is an aggregator matrix."""
+    with open(file_name, 'rb') as handle:
+        return handle.read(len(MAGIC)) == MAGIC
+
+
+def write_toc(handle, toc):
+    """Write the table of contents at the current position and the header."""
+    handle.write(b'\0' * (-handle.tell() % ALIGNMENT))
+    toc_offset = handle.tell()
+    toc = json.dumps(toc, sort_keys=True).encode('utf-8')
+    handle.write(toc)
+    handle.truncate()
+
+    handle.seek(0)
+    handle.write(HEADER.pack(MAGIC, toc_offset, len(toc)))
+
+
+def create(file_name, source, expression_type, group_by):
+    """Create an empty aggregator matrix."""
+    with open(file_name, 'wb') as handle:
+        handle.write(HEADER.pack(MAGIC, 0, 0))
+        write_toc(handle, {
+            'source': source,
+            'expression_type': expression_type,
+            'group_by': group_by,
+            'genes': [],
+            'samples': [],
+            'blocks': [],
+        })
+
+
+def append(file_name, expressions, descriptors):
+    """Append samples to an aggregator matrix.
+
+    Samples are given as a list of dicts of expressions by genes and a
+    list of their descriptors. Genes missing in the gene index are added
+    to its end in sorted order.
+
+    """
+    matrix = AggregatorMatrix(file_name)
+
+    genes = list(matrix.genes)
+    gene_index = {gene: i for i, gene in enumerate(genes)}
+    for gene in sorted({gene for expression in expressions for gene in expression} - set(gene_index)):
+        gene_index[gene] = len(genes)
+        genes.append(gene)
+
+    values = np.full((len(expressions), len(genes)), np.nan, dtype=DTYPE)
+    for i, expression in enumerate(expressions):
+        values[i, [gene_index[gene] for gene in expression]] = list(expression.values())
+
+    with open(file_name, 'r+b') as handle:
+        handle.seek(matrix.toc_offset)
+        blocks = list(matrix.blocks)
+        if expressions:
+            blocks.append({
+                'offset': handle.tell(),
+                'samples': values.shape[0],
+                'genes': values.shape[1],
+            })
+            handle.write(values.tobytes())
+
+        write_toc(handle, {
+            'source': matrix.source,
+            'expression_type': matrix.expression_type,
+            'group_by': matrix.group_by,
+            'genes': genes,
+            'samples': matrix.samples + [{'descriptor': descriptor} for descriptor in descriptors],
+            'blocks': blocks,
+        })
+
+
+class AggregatorMatrix(object):
+    """Expression aggregator matrix stored in a file."""
+
+    def __init__(self, file_name):
+        """Read the table of contents of aggregator matrix ``file_name``."""
+        self.file_name = file_name
+
+        with open(file_name, 'rb') as handle:
+            magic, toc_offset, toc_length = HEADER.unpack(handle.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError("File '{}' is not an aggregator matrix.".format(file_name))
+
+            handle.seek(toc_offset)
+            toc = json.loads(handle.read(toc_length).decode('utf-8'))
+
+        self.toc_offset = toc_offset
+        self.source = toc['source']
+        self.expression_type = toc['expression_type']
+        self.group_by = toc['group_by']
+        self.genes = toc['genes']
+        self.samples = toc['samples']
+        self.blocks = toc['blocks']
+
+    @property
+    def descriptors(self):
+        """Return descriptors of samples."""
+        return [sample['descriptor'] for sample in self.samples]
+
+    def get_values(self):
+        """Return a samples x genes float32 matrix of expressions."""
+        values = np.full((len(self.samples), len(self.genes)), np.nan, dtype=DTYPE)
+
+        start = 0
+        for block in self.blocks:
+            if block['genes']:
+                block_values = np.memmap(self.file_name, dtype=DTYPE, mode='r', offset=block['offset'],
+                                         shape=(block['samples'], block['genes']))
+                values[start:start + block['samples'], :block['genes']] = block_values
+            start += block['samples']
+
+        return values
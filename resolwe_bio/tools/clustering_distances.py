@@ -0,0 +1,216 @@
+"""Compute distances between expression profiles for hierarchical clustering.
+
+Condensed distance matrices are filled in blocks of rows, so only one
+block of distances is held in temporary memory at a time. Correlation
+distances are computed as products of blocks of standardized profiles
+(ranked profiles for Spearman's correlation) instead of calling a
+correlation function for each pair of profiles.
+
+The condensed distance matrix can be kept in memory or in a temporary
+memory-mapped file. :func:`scipy.cluster.hierarchy.linkage` works on its
+own float64 copy of distances (and first converts any other dtype to
+float64), so distances are always stored as float64: keeping them on
+disk halves the memory needed by clustering, while storing them with a
+smaller dtype would increase it.
+
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import os
+import tempfile
+
+import numpy as np
+from scipy.spatial.distance import cdist
+
+from expression_profiles import profile_map
+
+CORRELATION_METHODS = ['pearson', 'spearman']
+BLOCK_SIZE = 1024
+
+STRATEGIES = ['memory', 'memmap']
+DTYPE = np.dtype(np.float64)
+
+# Part of available memory used for clustering, the rest is left for
+# expressions and the interpreter.
+MEMORY_FRACTION = 0.8
+CGROUP_MEMORY_LIMIT_FILES = [
+    '/sys/fs/cgroup/memory.max',
+    '/sys/fs/cgroup/memory/memory.limit_in_bytes',
+]
+
+
+def get_row_labels(matrix):
+    """Return labels of rows of the matrix, which are equal for identical rows.
+
+    Rows with NaN values are never identical.
+
+    """
+    labels = np.zeros(len(matrix), dtype=np.int64)
+    if len(matrix):
+        order = np.lexsort(matrix.T[::-1])
+        sorted_matrix = matrix[order]
+        is_new = np.ones(len(matrix), dtype=bool)
+        is_new[1:] = (sorted_matrix[1:] != sorted_matrix[:-1]).any(axis=1)
+        labels[order] = np.cumsum(is_new)
+    return labels
+
+
+def get_condensed_size(n_rows):
+    """Return the number of distances between ``n_rows`` rows."""
+    return n_rows * (n_rows - 1) // 2
+
+
+def fill_condensed(distances, n_rows, start, block):
+    """Copy distances of rows from ``start`` on to the condensed matrix.
+
+    ``block`` holds distances of the block of rows to all rows from
+    ``start`` on, of which only the part above the diagonal is copied.
+
+    """
+    for row in range(start, start + len(block)):
+        offset = row * n_rows - row * (row + 1) // 2
+        distances[offset:offset + n_rows - row - 1] = block[row - start, row - start + 1:]
+
+
+def correlation_distances(matrix, method='pearson', block_size=BLOCK_SIZE, out=None):
+    """Return condensed correlation distances between rows of the matrix.
+
+    Distances are one minus Pearson's or Spearman's correlations, as
+    returned by :func:`scipy.spatial.distance.pdist`. Distances between
+    identical rows are zero. Other distances of rows with undefined
+    correlations (constant rows or rows with NaN values) are NaN.
+
+    Distances are written to ``out`` if it is given.
+
+    """
+    if method not in CORRELATION_METHODS:
+        raise ValueError("Unknown correlation method {}.".format(method))
+
+    matrix = np.asarray(matrix, dtype=np.float64)
+    profiles = profile_map[method](matrix)
+    labels = get_row_labels(matrix)
+
+    n_rows = len(matrix)
+    distances = np.empty(get_condensed_size(n_rows), dtype=DTYPE) if out is None else out
+    for start in range(0, n_rows, block_size):
+        stop = min(start + block_size, n_rows)
+        block = 1.0 - profiles[start:stop].dot(profiles[start:].T)
+        np.clip(block, 0.0, 2.0, out=block)
+        block[labels[start:stop, np.newaxis] == labels[start:]] = 0.0
+        fill_condensed(distances, n_rows, start, block)
+
+    return distances
+
+
+def get_distances(matrix, metric='euclidean', block_size=BLOCK_SIZE, out=None):
+    """Return condensed distances between rows of the matrix.
+
+    Correlation distances (``pearson`` and ``spearman``) are computed
+    with :func:`correlation_distances` and other metrics with
+    :func:`scipy.spatial.distance.cdist` on blocks of rows, which gives
+    the same distances as :func:`scipy.spatial.distance.pdist`.
+
+    Distances are written to ``out`` if it is given.
+
+    """
+    if metric in CORRELATION_METHODS:
+        return correlation_distances(matrix, metric, block_size, out)
+
+    matrix = np.asarray(matrix, dtype=np.float64)
+    n_rows = len(matrix)
+    distances = np.empty(get_condensed_size(n_rows), dtype=DTYPE) if out is None else out
+    for start in range(0, n_rows, block_size):
+        stop = min(start + block_size, n_rows)
+        fill_condensed(distances, n_rows, start, cdist(matrix[start:stop], matrix[start:], metric=metric))
+
+    return distances
+
+
+def get_memory_limit():
+    """Return memory available to the process in bytes.
+
+    This is the smaller of the memory limit of the process' control
+    group and physical memory, or None if neither is known.
+
+    """
+    limits = []
+    for file_name in CGROUP_MEMORY_LIMIT_FILES:
+        try:
+            with open(file_name) as handle:
+                value = handle.read().strip()
+        except (IOError, OSError):
+            continue
+        if value.isdigit():
+            limits.append(int(value))
+
+    try:
+        limits.append(os.sysconf(str('SC_PAGE_SIZE')) * os.sysconf(str('SC_PHYS_PAGES')))
+    except (AttributeError, ValueError, OSError):
+        pass
+
+    return min(limits) if limits else None
+
+
+def estimate_memory(n_rows, n_cols, strategy, block_size=BLOCK_SIZE):
+    """Estimate memory in bytes needed for clustering of rows with ``strategy``.
+
+    The estimate includes the condensed distance matrix (unless it is
+    memory-mapped), the copy of it made by linkage and temporary blocks
+    of distances and profiles.
+
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError("Unknown strategy {}.".format(strategy))
+
+    condensed = get_condensed_size(n_rows) * DTYPE.itemsize
+    profiles = 2 * n_rows * n_cols * DTYPE.itemsize
+    blocks = 2 * min(block_size, n_rows) * n_rows * DTYPE.itemsize
+    return (condensed if strategy == 'memory' else 0) + condensed + profiles + blocks
+
+
+def choose_strategy(n_rows, n_cols, memory_limit=None, block_size=BLOCK_SIZE):
+    """Choose where to keep distances between rows and estimate memory use.
+
+    Return a pair of the strategy and its estimated memory in bytes.
+    Distances are kept in memory if they fit in ``memory_limit`` (by
+    default, a part of memory available to the process) and in a
+    memory-mapped file otherwise. Raise :class:`MemoryError` if
+    clustering does not fit in the limit even with memory-mapped
+    distances.
+
+    """
+    if memory_limit is None:
+        available = get_memory_limit()
+        memory_limit = int(available * MEMORY_FRACTION) if available else None
+
+    for strategy in STRATEGIES:
+        estimate = estimate_memory(n_rows, n_cols, strategy, block_size)
+        if memory_limit is None or estimate <= memory_limit:
+            return strategy, estimate
+
+    raise MemoryError(
+        "Clustering of {} rows needs an estimated {:.1f} GB of memory, but only {:.1f} GB is available.".format(
+            n_rows, estimate / 1024 ** 3, memory_limit / 1024 ** 3)
+    )
+
+
+def get_buffer(n_rows, strategy='memory', tmp_dir=None):
+    """Return an empty condensed distance matrix of ``n_rows`` rows.
+
+    With ``memmap`` strategy, the matrix is memory-mapped to a temporary
+    file in ``tmp_dir``. The file is removed right away, so its space is
+    freed when the matrix is no longer used.
+
+    """
+    size = get_condensed_size(n_rows)
+    if strategy == 'memory' or size == 0:
+        return np.empty(size, dtype=DTYPE)
+    if strategy != 'memmap':
+        raise ValueError("Unknown strategy {}.".format(strategy))
+
+    handle, file_name = tempfile.mkstemp(dir=tmp_dir, prefix='.distances-')
+    try:
+        os.close(handle)
+        return np.memmap(file_name, dtype=DTYPE, mode='w+', shape=(size,))
+    finally:
+        os.remove(file_name)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python2
+# pylint: disable=invalid-name
+"""Build an LSH index of an ETC or benchmark its recall."""
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import time
+
+import numpy as np  # pylint: disable=import-error
+
+from find_similar import block_distance_map, build_index, distance_map, get_approximate_scores, get_order, load_etc
+from lsh_index import DEFAULT_BITS, DEFAULT_TABLES
+
+
+def parse_args():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description='Build an LSH index of an ETC or benchmark its recall.')
+    subparsers = parser.add_subparsers(dest='command')
+
+    build = subparsers.add_parser('build', help='build an index')
+    build.add_argument('etc_file', help='gene expression file')
+    build.add_argument('-o', '--output', required=True, help='index file')
+    build.add_argument('--tables', type=int, default=DEFAULT_TABLES, help='number of hash tables')
+    build.add_argument('--bits', type=int, default=DEFAULT_BITS, help='number of signature bits')
+    build.add_argument('--seed', type=int, default=0, help='seed of random hyperplanes')
+
+    benchmark = subparsers.add_parser('benchmark', help='report recall of approximate search against exact search')
+    benchmark.add_argument('etc_file', help='gene expression file')
+    benchmark.add_argument('--tables', type=int, nargs='+', default=[4, 8, 16], help='numbers of hash tables')
+    benchmark.add_argument('--bits', type=int, nargs='+', default=[8, 12, 16], help='numbers of signature bits')
+    benchmark.add_argument('--radius', type=int, nargs='+', default=[0, 1], help='probing radii')
+    benchmark.add_argument('-d', '--dstfunc', default='pearson', choices=['pearson', 'spearman'],
+                           help='distance function')
+    benchmark.add_argument('-t', '--top', type=int, default=50, help='number of most similar genes')
+    benchmark.add_argument('--queries', type=int, default=100, help='number of random query genes')
+    benchmark.add_argument('--seed', type=int, default=0, help='seed of random hyperplanes and query genes')
+    return parser.parse_args()
+
+
+def get_top(block, indices, reverse, top):
+    """Return sets of indices of ``top`` best scores in rows of the block."""
+    block[np.arange(len(indices)), indices] = np.nan
+    return [set(get_order(scores, reverse, top).tolist()) for scores in block]
+
+
+def benchmark_index(genes, matrix, args):
+    """Print recall of approximate search for each combination of parameters."""
+    _, reverse = distance_map[args.dstfunc]
+    random_state = np.random.RandomState(args.seed)
+    indices = np.sort(random_state.choice(len(genes), min(args.queries, len(genes)), replace=False))
+
+    start = time.time()
+    exact = get_top(block_distance_map[args.dstfunc](matrix, indices), indices, reverse, args.top)
+    exact_time = time.time() - start
+
+    print('\t'.join(['tables', 'bits', 'radius', 'recall', 'candidates', 'build time', 'query time', 'exact time']))
+    for tables in args.tables:
+        for bits in args.bits:
+            start = time.time()
+            index = build_index(genes, matrix, tables, bits, args.seed)
+            build_time = time.time() - start
+
+            for radius in args.radius:
+                start = time.time()
+                block = get_approximate_scores(index, genes, matrix, indices, args.dstfunc, radius)
+                query_time = time.time() - start
+
+                candidates = np.mean((~np.isnan(block)).sum(axis=1)) / len(genes)
+                approximate = get_top(block, indices, reverse, args.top)
+                found = sum(len(exact_top & approximate_top) for exact_top, approximate_top in zip(exact, approximate))
+                recall = found / max(sum(len(exact_top) for exact_top in exact), 1)
+
+                print('{}\t{}\t{}\t{:.4f}\t{:.4f}\t{:.3f}\t{:.3f}\t{:.3f}'.format(
+                    tables, bits, radius, recall, candidates, build_time, query_time, exact_time))
+
+
+def main():
+    """Build an LSH index of an ETC or benchmark its recall."""
+    args = parse_args()
+    genes, matrix = load_etc(args.etc_file)
+
+    if args.command == 'build':
+        build_index(genes, matrix, args.tables, args.bits, args.seed).save(args.output)
+    else:
+        benchmark_index(genes, matrix, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -12,6 +12,7 @@ import utils
 parser = argparse.ArgumentParser(description='Parses expressions for storage.')
 parser.add_argument('input', help='Input expression file')
 parser.add_argument('--output', help='Output JSON file')
+parser.add_argument('--binary-output', help='Output binary expression file')
 args = parser.parse_args()
 
 if not args.input:
@@ -40,6 +41,12 @@ with utils.gzopen(args.input) as f:
                      gene_exp in (l.split('\t') for l in f) if
                      len(gene_exp) == 2 and isfloat(gene_exp[1])}}
 
+if args.binary_output:
+    # Binary expressions are written with numpy, which is imported only
+    # when they are requested, so the JSON output works without it.
+    from expression_binary import write_expression
+    write_expression(args.binary_output, exp['genes'])
+
 if args.output:
     with open(args.output, 'w') as f:
         json.dump(exp, f)
@@ -3,13 +3,17 @@
 """Expression aggregator."""
 
 import argparse
-import csv
 import gzip
 import json
 import math
+import numbers
+import shutil
 
 import numpy as np
 
+from aggregator_matrix import AggregatorMatrix, append, create, is_aggregator_matrix
+from expression_cache import load_expression as load_cached_expression
+
 
 def get_args():
     """Parse command-line arguments."""
@@ -22,69 +26,125 @@ def get_args():
     parser.add_argument('-a', '--aggregator', help='Aggregator')
     parser.add_argument('-b', '--box-plot-output', help='Box plot output file name')
     parser.add_argument('-l', '--log-box-plot-output', help='Log box plot output file name')
-    parser.add_argument('-x', '--expressions-output', help='Expressions output file name')
+    parser.add_argument('-x', '--expressions-output', help='Expressions output file name', required=True)
     return parser.parse_args()
 
 
+def check_expression(expression, source):
+    """Check that all expressions in a dict of expressions are numbers.
+
+    Missing expressions are stored as NaN in aggregator matrices, so NaN
+    and non-numeric expressions are rejected instead of being dropped.
+
+    """
+    for gene, value in expression.items():
+        if isinstance(value, bool) or not isinstance(value, numbers.Real) or math.isnan(value):
+            raise ValueError('Expression {!r} of gene {} in {} is not a number.'.format(value, gene, source))
+
+
 def load_expression(fn=None, sep='\t'):
     """Read expressions from file."""
-    with gzip.open(fn, 'rt') as f:
-        reader = csv.DictReader(f, delimiter=sep)
-        return {row['Gene']: float(row['Expression']) for row in reader}
-
-
-def get_indices(descriptors, descriptor):
-    """Return positions of my_element in my_list."""
-    return {i for i, x in enumerate(descriptors) if x == descriptor}
-
-
-def get_values(expressions, descriptors, gene, descriptor):
-    """Return expressions of a gene with matching descriptor."""
-    indices = get_indices(descriptors, descriptor)
-    return [expression[gene] for i, expression in enumerate(expressions) if i in indices and gene in expression]
-
-
-def load_expressions(aggregator, expression_fns=[], sep='\t', descriptors=[]):
-    """Read expressions from files."""
-    raw_expressions = [load_expression(expression_fn, sep) for expression_fn in expression_fns]
-    if aggregator:
-        raw_expressions.extend(aggregator['raw_expressions'])
-        descriptors.extend(aggregator['descriptors'])
-    genes = {key for raw_expression in raw_expressions for key in raw_expression.keys()}
-    grouped_expressions = {
-        gene: {
-            descriptor: get_values(raw_expressions, descriptors, gene, descriptor)
-            for descriptor in set(descriptors)
-            if get_values(raw_expressions, descriptors, gene, descriptor)
-        }
-        for gene in genes
-    }
-    return raw_expressions, descriptors, grouped_expressions
+    expression = load_cached_expression(fn, sep).as_dict()
+    check_expression(expression, fn)
+    return expression
+
+
+def load_aggregator(aggregator_fn, expressions_fn):
+    """Copy expressions of aggregator to a new aggregator matrix.
+
+    Aggregator matrices are copied without reading expressions. Legacy
+    JSON aggregators are converted to an aggregator matrix.
+
+    """
+    if is_aggregator_matrix(aggregator_fn):
+        shutil.copyfile(aggregator_fn, expressions_fn)
+    else:
+        aggregator = load_json(aggregator_fn)
+        for expression in aggregator['raw_expressions']:
+            check_expression(expression, aggregator_fn)
+        create(expressions_fn, aggregator['source'], aggregator['expression_type'], aggregator['group_by'])
+        append(expressions_fn, aggregator['raw_expressions'], aggregator['descriptors'])
+
+    return AggregatorMatrix(expressions_fn)
+
+
+def get_matrix(matrix, expressions):
+    """Return a genes x samples matrix of expressions in aggregator ``matrix``.
+
+    Samples appended last are also given as dicts of ``expressions`` by
+    genes, so their expressions are used with full precision instead of
+    the stored float32 values. Genes missing in a sample have NaN
+    expressions.
+
+    """
+    values = matrix.get_values().T.astype(np.float64)
+    gene_index = {gene: i for i, gene in enumerate(matrix.genes)}
+    first = values.shape[1] - len(expressions)
+    for j, expression in enumerate(expressions, first):
+        values[[gene_index[gene] for gene in expression], j] = list(expression.values())
+    return values
 
 
-def get_log_expressions(grouped_expressions):
+def get_log_matrix(matrix):
     """Get log(expression + 1) for all expressions."""
-    log_expressions = {
-        gene: {
-            descriptor: [math.log(expression + 1.0, 2.0) for expression in grouped_expressions[gene][descriptor]]
-            for descriptor in grouped_expressions[gene]
-        }
-        for gene in grouped_expressions
+    log_matrix = np.full(matrix.shape, np.nan)
+    present = ~np.isnan(matrix)
+    # Logarithms are computed with ``math.log``, since ``np.log`` may
+    # differ from it in the last digit of some values.
+    log_matrix[present] = [math.log(expression + 1.0, 2.0) for expression in matrix[present].tolist()]
+    return log_matrix
+
+
+def get_group_statistics(values):
+    """Get box plot statistics of each row of a genes x samples matrix.
+
+    Return a dict of arrays of statistics. Missing (NaN) expressions
+    are ignored.
+
+    """
+    present = ~np.isnan(values)
+    counts = present.sum(axis=1)
+    complete = counts == values.shape[1]
+
+    statistics = {
+        'min': np.full(values.shape[0], np.nan),
+        'max': np.full(values.shape[0], np.nan),
+        'q1': np.full(values.shape[0], np.nan),
+        'median': np.full(values.shape[0], np.nan),
+        'q3': np.full(values.shape[0], np.nan),
+        'data_count': counts,
     }
-    return log_expressions
 
+    # Rows without missing expressions are processed at once.
+    if complete.any() and values.shape[1]:
+        complete_values = values[complete]
+        statistics['min'][complete] = complete_values.min(axis=1)
+        statistics['max'][complete] = complete_values.max(axis=1)
+        q1, median, q3 = np.percentile(complete_values, [25.0, 50.0, 75.0], axis=1)
+        statistics['q1'][complete] = q1
+        statistics['median'][complete] = median
+        statistics['q3'][complete] = q3
 
-def generate_statistic(expression, gene, attribute, expression_type):
+    for i in np.flatnonzero(~complete & (counts > 0)):
+        row = values[i, present[i]]
+        statistics['min'][i] = row.min()
+        statistics['max'][i] = row.max()
+        statistics['q1'][i], statistics['median'][i], statistics['q3'][i] = np.percentile(row, [25.0, 50.0, 75.0])
+
+    return statistics
+
+
+def generate_statistic(statistics, index, gene, attribute, expression_type):
     """Get box plot statistic for expressions of a single gene and attribute."""
-    min_val = min(expression)
-    max_val = max(expression)
-    median = np.percentile(expression, 50.0)
-    q1 = np.percentile(expression, 25.0)
-    q3 = np.percentile(expression, 75.0)
+    min_val = float(statistics['min'][index])
+    max_val = float(statistics['max'][index])
+    median = statistics['median'][index]
+    q1 = statistics['q1'][index]
+    q3 = statistics['q3'][index]
     iqr = q3 - q1
     lowerwhisker = max(min_val, q1 - 1.5 * iqr)
     upperwhisker = min(max_val, q3 + 1.5 * iqr)
-    data_count = len(expression)
+    data_count = int(statistics['data_count'][index])
     return {
         'attribute': attribute,
         'gene': gene,
@@ -100,25 +160,31 @@ def generate_statistic(expression, gene, attribute, expression_type):
     }
 
 
-def get_statistics(expressions, expression_type):
-    """Get box plot statistics for expressions of all genes and attributes."""
-    return {
-        gene: [
-            generate_statistic(exp, gene, descriptor, expression_type)
-            for descriptor, exp in expression.items()
+def get_statistics(matrix, genes, descriptors, expression_type):
+    """Get box plot statistics for expressions of all genes and attributes.
+
+    Statistics are computed for each group of samples with the same
+    descriptor from the genes x samples ``matrix``.
+
+    """
+    groups = list(set(descriptors))
+    group_index = np.array([groups.index(descriptor) for descriptor in descriptors], dtype=int)
+    group_statistics = [get_group_statistics(matrix[:, group_index == i]) for i in range(len(groups))]
+
+    statistics = {}
+    for index, gene in enumerate(genes):
+        statistics[gene] = [
+            generate_statistic(group, index, gene, descriptor, expression_type)
+            for descriptor, group in zip(groups, group_statistics)
+            if group['data_count'][index]
         ]
-        for gene, expression in expressions.items()
-    }
+    return statistics
 
 
-def output_json(statistics, fname=None, compressed=False):
+def output_json(statistics, fname=None):
     """Write json to file."""
-    if not compressed:
-        with open(fname, 'w') as f:
-            json.dump(statistics, f)
-    else:
-        with gzip.open(fname, 'w') as f:
-            json.dump(statistics, f)
+    with open(fname, 'w') as f:
+        json.dump(statistics, f)
 
 
 def load_json(fname):
@@ -129,45 +195,36 @@ def load_json(fname):
 
 def check_aggregator(aggregator, source, expression_type, group_by):
     """Check aggregator fields."""
-    if aggregator['source'] != source:
+    if aggregator.source != source:
         raise ValueError('All expressions must be annotated by the same genome database (NCBI, UCSC, ENSEMBLE,...).')
-    if aggregator['expression_type'] != expression_type:
+    if aggregator.expression_type != expression_type:
         raise ValueError('All expressions must be of the same type.')
-    if aggregator['group_by'] != group_by:
+    if aggregator.group_by != group_by:
         raise ValueError('Group by field must be the same.')
 
 
-def get_expressions_out(raw_expressions, descriptors, source, expression_type, group_by):
-    """Return expressions output."""
-    return {
-        'raw_expressions': raw_expressions,
-        'descriptors': descriptors,
-        'source': source,
-        'expression_type': expression_type,
-        'group_by': group_by
-    }
-
-
 def main():
     """Compute expression statistics."""
     args = get_args()
-    aggregator = None
     if args.aggregator:
-        aggregator = load_json(args.aggregator)
+        aggregator = load_aggregator(args.aggregator, args.expressions_output)
         check_aggregator(aggregator, args.source, args.expression_type, args.group_by)
-    raw_expressions, descriptors, expressions = load_expressions(aggregator, args.expressions, '\t', args.descriptors)
-    log_expressions = get_log_expressions(expressions)
+    else:
+        create(args.expressions_output, args.source, args.expression_type, args.group_by)
+
+    expressions = [load_expression(expression_fn, '\t') for expression_fn in args.expressions]
+    append(args.expressions_output, expressions, args.descriptors)
+
+    aggregator = AggregatorMatrix(args.expressions_output)
+    matrix = get_matrix(aggregator, expressions)
 
     if args.box_plot_output:
-        statistics = get_statistics(expressions, args.expression_type)
+        statistics = get_statistics(matrix, aggregator.genes, aggregator.descriptors, args.expression_type)
         output_json(statistics, args.box_plot_output)
     if args.log_box_plot_output:
-        log_statistics = get_statistics(log_expressions, args.expression_type)
+        log_statistics = get_statistics(get_log_matrix(matrix), aggregator.genes, aggregator.descriptors,
+                                        args.expression_type)
         output_json(log_statistics, args.log_box_plot_output)
-    if args.expressions_output:
-        expressions_out = get_expressions_out(raw_expressions, descriptors, args.source,
-                                              args.expression_type, args.group_by)
-        output_json(expressions_out, args.expressions_output, True)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,71 @@
+"""Read and write binary expression files.
+
+Binary expression files are saved by expression processes next to the
+gzipped expression files, so tools can memory-map expressions instead
+of decompressing and parsing text.
+
+Binary expression file layout (all integers are little-endian unsigned
+64-bit):
+
+- header: magic bytes, number of genes and length of the genes block
+- expressions as little-endian float32 values in the order of genes
+- genes: newline-separated UTF-8 encoded gene ids in sorted order
+
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import bisect
+import struct
+
+import numpy as np
+
+MAGIC = b'RBEXPBN1'
+HEADER = struct.Struct('<8sQQ')
+DTYPE = np.dtype('<f4')
+
+
+def write_expression(file_name, expressions):
+    """Write a dict of expressions by gene ids to binary expression file."""
+    genes = sorted(expressions)
+    values = np.array([expressions[gene] for gene in genes], dtype=DTYPE)
+    genes_block = '\n'.join(genes).encode('utf-8')
+
+    with open(file_name, 'wb') as handle:
+        handle.write(HEADER.pack(MAGIC, len(genes), len(genes_block)))
+        handle.write(values.tobytes())
+        handle.write(genes_block)
+
+
+class BinaryExpression(object):
+    """Binary expression file with memory-mapped expressions."""
+
+    def __init__(self, file_name):
+        """Read binary expression file ``file_name``."""
+        with open(file_name, 'rb') as handle:
+            magic, count, genes_length = HEADER.unpack(handle.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError("File '{}' is not a binary expression file.".format(file_name))
+
+            handle.seek(HEADER.size + count * DTYPE.itemsize)
+            genes = handle.read(genes_length).decode('utf-8')
+
+        self.genes = genes.split('\n') if count else []
+        if count:
+            self.values = np.memmap(file_name, dtype=DTYPE, mode='r', offset=HEADER.size, shape=(count,))
+        else:
+            self.values = np.zeros(0, dtype=DTYPE)
+
+    def __len__(self):
+        """Return the number of genes."""
+        return len(self.genes)
+
+    def get(self, gene, default=None):
+        """Return expression of ``gene`` or ``default`` if it is missing."""
+        index = bisect.bisect_left(self.genes, gene)
+        if index < len(self.genes) and self.genes[index] == gene:
+            return float(self.values[index])
+        return default
+
+    def as_dict(self):
+        """Return a dict of expressions by gene ids."""
+        return dict(zip(self.genes, self.values.tolist()))
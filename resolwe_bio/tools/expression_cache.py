@@ -0,0 +1,209 @@
+"""Load expression files through a cache of parsed expressions.
+
+Parsed expression files are stored in a content-addressed cache, so
+tools reading the same expression files again skip decompressing and
+parsing text. Cache entries are named by the MD5 checksum of the
+expression file and its delimiter and are stored in the directory given
+by ``RESOLWE_BIO_EXPRESSION_CACHE`` environment variable.
+
+The cache is opt-in: processes run in throwaway containers, so it is
+only useful if the directory is on a volume shared by process runs. If
+the variable is not set or the cache directory cannot be written,
+expression files are parsed on every load.
+
+Cache entry layout (all integers are little-endian unsigned 64-bit):
+
+- header: magic bytes, number of genes and lengths of header, genes
+  and texts blocks
+- expressions of genes as little-endian float64 values
+- header: tab-separated column names of the expression file
+- genes: newline-separated gene ids
+- texts: newline-separated texts of values of genes (multiple value
+  columns are tab-separated), from which expression files can be
+  reproduced exactly
+
+The first value column is parsed as expressions. Values which are not
+numbers are NaN.
+
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import gzip
+import hashlib
+import io
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+MAGIC = b'RBEXPCH1'
+HEADER = struct.Struct('<8sQQQQ')
+DTYPE = np.dtype('<f8')
+
+CACHE_DIR_VARIABLE = 'RESOLWE_BIO_EXPRESSION_CACHE'
+
+GZIP_MAGIC = b'\x1f\x8b'
+CHUNK_SIZE = 1024 * 1024
+
+
+def get_cache_dir():
+    """Return the cache directory or None if the cache is not enabled."""
+    cache_dir = os.environ.get(CACHE_DIR_VARIABLE)
+    return os.path.expanduser(cache_dir) if cache_dir else None
+
+
+def read_file(file_name):
+    """Return a pair of MD5 checksum and contents of file ``file_name``.
+
+    The file is read only once: the checksum is computed from the same
+    chunks which are returned as contents.
+
+    """
+    checksum = hashlib.md5()
+    chunks = []
+    with open(file_name, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(CHUNK_SIZE), b''):
+            checksum.update(chunk)
+            chunks.append(chunk)
+    return checksum.hexdigest(), b''.join(chunks)
+
+
+def get_lines(data):
+    """Return lines of (possibly gzipped) text file contents."""
+    if data.startswith(GZIP_MAGIC):
+        with gzip.GzipFile(fileobj=io.BytesIO(data), mode='rb') as handle:
+            data = handle.read()
+    return data.decode('utf-8').splitlines()
+
+
+def parse_value(text):
+    """Parse expression value or return NaN if it is not a number."""
+    try:
+        return float(text)
+    except ValueError:
+        return float('nan')
+
+
+class Expression(object):
+    """Parsed expression file."""
+
+    def __init__(self, header, genes, values, texts):
+        """Initialize the expression.
+
+        :param list header: column names
+        :param list genes: gene ids
+        :param values: array of expressions of genes
+        :param list texts: lists of texts of values of genes
+
+        """
+        self.header = header
+        self.genes = genes
+        self.values = values
+        self.texts = texts
+
+    @classmethod
+    def parse(cls, data, delimiter='\t'):
+        """Parse contents of a (possibly gzipped) expression file."""
+        lines = get_lines(data)
+        header = lines[0].split(delimiter) if lines else []
+
+        genes, texts = [], []
+        for line in lines[1:]:
+            if not line:
+                continue
+            row = line.split(delimiter)
+            genes.append(row[0])
+            texts.append(row[1:] or [''])
+
+        values = np.array([parse_value(text[0]) for text in texts], dtype=DTYPE)
+        return cls(header, genes, values, texts)
+
+    @classmethod
+    def read(cls, file_name):
+        """Read cache entry ``file_name`` with memory-mapped expressions."""
+        with open(file_name, 'rb') as handle:
+            magic, count, header_length, genes_length, texts_length = HEADER.unpack(handle.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError("File '{}' is not an expression cache entry.".format(file_name))
+
+            handle.seek(HEADER.size + count * DTYPE.itemsize)
+            header = handle.read(header_length).decode('utf-8')
+            genes = handle.read(genes_length).decode('utf-8')
+            texts = handle.read(texts_length).decode('utf-8')
+
+        if count:
+            values = np.memmap(file_name, dtype=DTYPE, mode='r', offset=HEADER.size, shape=(count,))
+        else:
+            values = np.zeros(0, dtype=DTYPE)
+
+        return cls(
+            header.split('\t') if header else [],
+            genes.split('\n') if count else [],
+            values,
+            [text.split('\t') for text in texts.split('\n')] if count else [],
+        )
+
+    def write(self, handle):
+        """Write the expression as a cache entry to a binary file object."""
+        header = '\t'.join(self.header).encode('utf-8')
+        genes = '\n'.join(self.genes).encode('utf-8')
+        texts = '\n'.join('\t'.join(text) for text in self.texts).encode('utf-8')
+
+        handle.write(HEADER.pack(MAGIC, len(self.genes), len(header), len(genes), len(texts)))
+        handle.write(np.asarray(self.values, dtype=DTYPE).tobytes())
+        handle.write(header)
+        handle.write(genes)
+        handle.write(texts)
+
+    def as_dict(self):
+        """Return a dict of expressions by genes."""
+        return dict(zip(self.genes, self.values.tolist()))
+
+
+def load_expression(file_name, delimiter='\t'):
+    """Load expression file ``file_name`` through the cache.
+
+    Return :class:`Expression` read from the cache entry of the file if
+    it exists. Otherwise, parse the file and store it to the cache. If
+    the cache is not enabled, parse the file.
+
+    """
+    cache_dir = get_cache_dir()
+    if cache_dir is None:
+        with open(file_name, 'rb') as handle:
+            return Expression.parse(handle.read(), delimiter)
+
+    checksum, data = read_file(file_name)
+    key = '{}-{}'.format(checksum, ord(delimiter))
+    entry_name = os.path.join(cache_dir, key)
+
+    if os.path.isfile(entry_name):
+        try:
+            return Expression.read(entry_name)
+        except (IOError, OSError, ValueError, struct.error):
+            # Broken entries are replaced.
+            pass
+
+    expression = Expression.parse(data, delimiter)
+
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+        # Entries are written to temporary files and renamed, so
+        # concurrent readers never see partially written entries.
+        handle, temp_name = tempfile.mkstemp(dir=cache_dir, prefix='.{}-'.format(key))
+        with os.fdopen(handle, 'wb') as temp_handle:
+            expression.write(temp_handle)
+        os.chmod(temp_name, 0o644)
+        os.rename(temp_name, entry_name)
+    except (IOError, OSError):
+        pass
+
+    return expression
+
+
+def load_expressions(file_names, delimiter='\t'):
+    """Load a list of expression files through the cache."""
+    return [load_expression(file_name, delimiter) for file_name in file_names]
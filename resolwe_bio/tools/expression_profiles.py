@@ -0,0 +1,70 @@
+"""Prepare expression profiles for computing correlations.
+
+Correlations of standardized profiles (rows centered and scaled to unit
+norm) are their dot products, so correlations of many profiles can be
+computed as matrix products. Pearson's correlation is computed from
+standardized expressions and Spearman's correlation from standardized
+ranks of expressions.
+
+"""
+from __future__ import absolute_import, division, print_function
+
+import numpy as np
+
+
+def get_ranks(matrix):
+    """Return ranks of values in each row of the matrix.
+
+    Tied values get the average of their ranks, as in
+    :func:`scipy.stats.rankdata`.
+
+    """
+    n_rows, n_cols = matrix.shape
+    rows = np.arange(n_rows)[:, np.newaxis]
+    columns = np.arange(n_cols)
+
+    order = np.argsort(matrix, axis=1, kind='mergesort')
+    sorted_values = matrix[rows, order]
+
+    # Positions of the first and the last value of each group of ties.
+    is_first = np.ones(matrix.shape, dtype=bool)
+    is_first[:, 1:] = sorted_values[:, 1:] != sorted_values[:, :-1]
+    is_last = np.ones(matrix.shape, dtype=bool)
+    is_last[:, :-1] = is_first[:, 1:]
+    first = np.maximum.accumulate(np.where(is_first, columns, 0), axis=1)
+    last = np.minimum.accumulate(np.where(is_last, columns, n_cols)[:, ::-1], axis=1)[:, ::-1]
+
+    ranks = np.empty(matrix.shape)
+    ranks[rows, order] = (first + last) / 2.0 + 1.0
+    return ranks
+
+
+def standardize(matrix):
+    """Center rows of the matrix and scale them to unit norm.
+
+    Constant rows are NaN.
+
+    """
+    centered = matrix - matrix.mean(axis=1)[:, np.newaxis]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        standardized = centered / np.sqrt((centered ** 2).sum(axis=1))[:, np.newaxis]
+    standardized[(matrix == matrix[:, :1]).all(axis=1)] = np.nan
+    return standardized
+
+
+def standardize_ranks(matrix):
+    """Standardize ranks of values in rows of the matrix.
+
+    Rows with NaN values are NaN.
+
+    """
+    ranks = get_ranks(matrix)
+    ranks[np.isnan(matrix).any(axis=1)] = np.nan
+    return standardize(ranks)
+
+
+# Standardized profiles, whose dot products are correlations
+profile_map = {
+    'pearson': standardize,
+    'spearman': standardize_ranks,
+}
@@ -10,7 +10,7 @@ import sys
 
 from itertools import chain
 
-import utils
+from expression_cache import load_expression
 
 
 parser = argparse.ArgumentParser(description='Merge columns of multiple experiments by gene id.')
@@ -40,13 +40,12 @@ for f in args.files:
     base, ext = os.path.splitext(f)
     delimiter = ';' if ext == '.csv' else '\t'
 
-    with utils.gzopen(f) as csvfile:
-        reader = csv.reader(csvfile, delimiter=delimiter)
-        header = reader.next()[1:]
-        headers.append(args.experiments[offset:offset + len(header)] if args.experiments else header)
-        offset += len(headers[-1])
-        expressions.append(dict((r[0], r[1:]) for r in reader))
-        genes = set(expressions[-1].keys()) if args.intersection and not genes else op(genes, expressions[-1].keys())
+    expression = load_expression(f, delimiter)
+    header = expression.header[1:]
+    headers.append(args.experiments[offset:offset + len(header)] if args.experiments else header)
+    offset += len(headers[-1])
+    expressions.append(dict(zip(expression.genes, expression.texts)))
+    genes = set(expressions[-1].keys()) if args.intersection and not genes else op(genes, expressions[-1].keys())
 
 if args.genes:
     genes = genes.intersection(args.genes)
@@ -1,67 +1,243 @@
 #!/usr/bin/env python2
-# pylint: disable=missing-docstring,invalid-name
-# XXX: Refactor to a comand line tool and remove pylint disable
+# pylint: disable=invalid-name
 """Finding genes with simmilar expressions."""
 from __future__ import absolute_import, division, print_function
 
 import argparse
 import json
-import math
 
 import numpy as np  # pylint: disable=import-error
-from scipy.stats import spearmanr  # pylint: disable=import-error
-from scipy.stats.stats import pearsonr  # pylint: disable=import-error
 
 import utils
+from expression_profiles import get_ranks, profile_map, standardize, standardize_ranks
+from lsh_index import DEFAULT_RADIUS, LSHIndex
 
 
-parser = argparse.ArgumentParser(description='Finding genes with simmilar expressions.')
+def parse_args():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description='Finding genes with simmilar expressions.')
+    genes = parser.add_mutually_exclusive_group(required=True)
+    genes.add_argument('-g', '--gene', help='gene ID')
+    genes.add_argument('--genes', nargs='+', help='gene IDs of a batch of queries')
+    parser.add_argument('-d', '--dstfunc', default='pearson', help='distance function')
+    parser.add_argument('-t', '--top', type=int, help='number of most similar genes to report')
+    parser.add_argument('--index', help='LSH index of the ETC for approximate search with correlations')
+    parser.add_argument('--radius', type=int, default=DEFAULT_RADIUS,
+                        help='also search LSH index buckets with signatures differing in up to this many bits')
+    parser.add_argument('etc_file', help='gene expression file')
+    return parser.parse_args()
 
-parser.add_argument('-g', '--gene', help='gene ID')
-parser.add_argument('-d', '--dstfunc', default='pearson', help='distance function')
-parser.add_argument('etc_file', help='gene expression file')
 
-args = parser.parse_args()
+def load_etc(fname):
+    """Return a list of genes and a genes x time points matrix of expressions."""
+    file_handler = utils.gzopen(fname)
+    expressions = json.load(file_handler)['etc']['genes']
+    file_handler.close()
 
+    genes = list(expressions)
+    matrix = np.array([expressions[gene] for gene in genes], dtype=np.float64)
+    return genes, matrix.reshape(len(genes), -1)
 
-def euclidian(x, y):
-    """Compute eucludean distance."""
-    return np.linalg.norm(np.array(x) - np.array(y))
 
+def pearson(matrix, vector):
+    """Compute Pearson's correlation of each row of the matrix with the vector.
 
-def pearson(x, y):
-    """Compute Pearson's correlation."""
-    return pearsonr(x, y)[0]
+    Correlations with constant rows or vector are NaN.
 
+    """
+    centered = matrix - matrix.mean(axis=1)[:, np.newaxis]
+    centered_vector = vector - vector.mean()
 
-def spearman(x, y):
-    """Compute Spearman's rank."""
-    return spearmanr(x, y)[0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = centered.dot(centered_vector) / (
+            np.sqrt((centered ** 2).sum(axis=1)) * np.sqrt((centered_vector ** 2).sum())
+        )
+
+    scores = np.clip(scores, -1.0, 1.0)
+    scores[(matrix == matrix[:, :1]).all(axis=1)] = np.nan
+    if (vector == vector[0]).all():
+        scores[:] = np.nan
+    return scores
+
+
+def spearman(matrix, vector):
+    """Compute Spearman's correlation of each row of the matrix with the vector."""
+    scores = pearson(get_ranks(matrix), get_ranks(vector[np.newaxis, :])[0])
+    scores[np.isnan(matrix).any(axis=1)] = np.nan
+    if np.isnan(vector).any():
+        scores[:] = np.nan
+    return scores
+
+
+def euclidean(matrix, vector):
+    """Compute Euclidean distance of each row of the matrix to the vector."""
+    return np.sqrt(((matrix - vector) ** 2).sum(axis=1))
+
+
+def pearson_block(matrix, indices):
+    """Compute Pearson's correlations of rows at ``indices`` with all rows."""
+    standardized = standardize(matrix)
+    return np.clip(standardized[indices].dot(standardized.T), -1.0, 1.0)
+
+
+def spearman_block(matrix, indices):
+    """Compute Spearman's correlations of rows at ``indices`` with all rows."""
+    standardized = standardize_ranks(matrix)
+    return np.clip(standardized[indices].dot(standardized.T), -1.0, 1.0)
+
+
+def euclidean_block(matrix, indices):
+    """Compute Euclidean distances of rows at ``indices`` to all rows."""
+    squared_norms = (matrix ** 2).sum(axis=1)
+    squared = squared_norms[indices][:, np.newaxis] + squared_norms - 2.0 * matrix[indices].dot(matrix.T)
+    return np.sqrt(np.maximum(squared, 0.0))
 
 
 # 2nd argument: True if higher value means better score
 distance_map = {
-    'euclidean': [euclidian, False],
+    'euclidean': [euclidean, False],
     'pearson': [pearson, True],
     'spearman': [spearman, True]
 }
 
-search_gene = args.gene
-file_handler = utils.gzopen(args.etc_file)
-expressions = json.load(file_handler)
-file_handler.close()
-search_f, rev_sort = distance_map[args.dstfunc]
+block_distance_map = {
+    'euclidean': euclidean_block,
+    'pearson': pearson_block,
+    'spearman': spearman_block,
+}
+
+
+def get_order(scores, reverse, top=None):
+    """Return indices of best scores in sorted order.
+
+    NaN scores are skipped. Equal scores are ordered by their indices.
+    Only ``top`` best scores are selected with a partial sort if given.
+
+    """
+    valid = np.flatnonzero(~np.isnan(scores))
+    keys = -scores[valid] if reverse else scores[valid]
+
+    if top is not None and top < len(valid):
+        if top <= 0:
+            return valid[:0]
+        # All scores tied with the worst selected score are candidates,
+        # so the selection is the same as with a full sort.
+        threshold = np.partition(keys, top - 1)[top - 1]
+        candidates = np.flatnonzero(keys <= threshold)
+        order = candidates[np.lexsort((candidates, keys[candidates]))][:top]
+    else:
+        order = np.argsort(keys, kind='mergesort')
+
+    return valid[order]
+
+
+def build_index(genes, matrix, tables, bits, seed=0):
+    """Build an LSH index of profiles of correlation scoring functions."""
+    profiles = {dstfunc: profile_f(matrix) for dstfunc, profile_f in profile_map.items()}
+    return LSHIndex.build(genes, profiles, tables, bits, seed)
+
+
+def get_candidates(index, genes, matrix, indices, dstfunc, radius=DEFAULT_RADIUS):
+    """Return indices of candidate similar genes of genes at ``indices``."""
+    gene_index = {gene: i for i, gene in enumerate(genes)}
+    if len(index.genes) != len(genes) or any(gene not in gene_index for gene in index.genes):
+        raise ValueError("Index does not match genes of the ETC.")
+    positions = np.array([gene_index[gene] for gene in index.genes], dtype=int)
+
+    profiles = profile_map[dstfunc](matrix[indices])
+    return [positions[index.query(dstfunc, profile, radius)] for profile in profiles]
+
+
+def get_approximate_scores(index, genes, matrix, indices, dstfunc, radius=DEFAULT_RADIUS):
+    """Return a block of scores of candidates of genes at ``indices``.
+
+    Scores of genes which are not candidates are NaN.
+
+    """
+    search_f, _ = distance_map[dstfunc]
+    candidates = get_candidates(index, genes, matrix, indices, dstfunc, radius)
+    block = np.full((len(indices), len(genes)), np.nan)
+    for row, (i, row_candidates) in enumerate(zip(indices, candidates)):
+        block[row, row_candidates] = search_f(matrix[row_candidates], matrix[i])
+    return block
+
+
+def find_similar(genes, matrix, search_gene, dstfunc='pearson', top=None, index=None, radius=DEFAULT_RADIUS):
+    """Return genes with expressions most similar to ``search_gene``.
+
+    If LSH ``index`` is given and it indexes ``dstfunc``, only
+    candidate genes found in the index are scored, so the result is
+    approximate.
+
+    """
+    if dstfunc not in distance_map:
+        raise ValueError("Invalid distance function {}".format(dstfunc))
+    search_f, rev_sort = distance_map[dstfunc]
+
+    position = genes.index(search_gene)
+    if index is not None and dstfunc in index.metrics:
+        scores = get_approximate_scores(index, genes, matrix, [position], dstfunc, radius)[0]
+    else:
+        scores = search_f(matrix, matrix[position])
+    scores[position] = np.nan
+
+    return get_similarity(genes, search_gene, scores, rev_sort, top)
+
+
+def get_similarity(genes, search_gene, scores, reverse, top=None):
+    """Return genes ranked by their scores of similarity to ``search_gene``."""
+    order = get_order(scores, reverse, top)
+    similarity = [{'gene': genes[i], 'distance': distance} for i, distance in zip(order, scores[order].tolist())]
+    return {'search gene': search_gene, 'similar genes': similarity}
+
+
+def find_similar_batch(genes, matrix, search_genes, dstfunc='pearson', top=None, index=None, radius=DEFAULT_RADIUS):
+    """Return genes with expressions most similar to each of ``search_genes``.
 
-if args.dstfunc not in distance_map:
-    raise ValueError("Invalid distance function {}".format(args.dstfunc))
+    Scores of all search genes are computed as a single search genes x
+    genes block. Search genes missing in the ETC are reported separately.
+    With LSH ``index``, only candidate genes found in the index are
+    scored, as in :func:`find_similar`.
 
-search_gene_expression = expressions['etc']['genes'][search_gene]
+    """
+    if dstfunc not in block_distance_map:
+        raise ValueError("Invalid distance function {}".format(dstfunc))
+    _, rev_sort = distance_map[dstfunc]
 
-similarity = [{'gene': gene, 'distance': search_f(expressions['etc']['genes'][gene], search_gene_expression)}
-              for gene in expressions['etc']['genes'] if gene != search_gene]
+    gene_index = {gene: i for i, gene in enumerate(genes)}
+    found_genes = [gene for gene in search_genes if gene in gene_index]
+    indices = np.array([gene_index[gene] for gene in found_genes], dtype=int)
+
+    results = []
+    if found_genes:
+        if index is not None and dstfunc in index.metrics:
+            block = get_approximate_scores(index, genes, matrix, indices, dstfunc, radius)
+        else:
+            block = block_distance_map[dstfunc](matrix, indices)
+        block[np.arange(len(indices)), indices] = np.nan
+        results = [
+            get_similarity(genes, search_gene, scores, rev_sort, top)
+            for search_gene, scores in zip(found_genes, block)
+        ]
+
+    return {
+        'search genes': found_genes,
+        'missing genes': [gene for gene in search_genes if gene not in gene_index],
+        'results': results,
+    }
 
 
-similarity = [value for value in similarity if not math.isnan(value['distance'])]
-similarity = sorted(similarity, key=lambda x: x['distance'], reverse=rev_sort)
-similarity = {'search gene': search_gene, 'similar genes': similarity}
-print(json.dumps({'simgenes': similarity}, separators=(',', ':')))
+def main():
+    """Find genes with similar expressions."""
+    args = parse_args()
+    genes, matrix = load_etc(args.etc_file)
+    index = LSHIndex.load(args.index) if args.index else None
+    if args.genes:
+        similarity = find_similar_batch(genes, matrix, args.genes, args.dstfunc, args.top, index, args.radius)
+    else:
+        similarity = find_similar(genes, matrix, args.gene, args.dstfunc, args.top, index, args.radius)
+    print(json.dumps({'simgenes': similarity}, separators=(',', ':')))
+
+
+if __name__ == '__main__':
+    main()
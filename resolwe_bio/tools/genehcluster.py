@@ -9,13 +9,14 @@ import sys
 
 import numpy as np
 import pandas as pd
-from scipy.stats import spearmanr, zscore
+from scipy.stats import zscore
 from scipy.cluster.hierarchy import dendrogram, linkage
-from scipy.spatial.distance import pdist
 
-from resolwe_runtime_utils import error, warning
+from resolwe_runtime_utils import error, info, warning
 
+from clustering_distances import STRATEGIES, choose_strategy, estimate_memory, get_buffer, get_distances
 from clustering_leaf_ordering import knn, optimal, simulated_annealing
+from expression_cache import load_expression
 
 
 def parse_args():
@@ -32,13 +33,19 @@ def parse_args():
                         type=int)
     parser.add_argument('-t', '--log2', action='store_true', help='Log2 transformation')
     parser.add_argument('-n', '--normalization', default=None, help='Normalization')
+    parser.add_argument('--distance_strategy', default='auto', choices=['auto'] + STRATEGIES,
+                        help='Keep distances in memory or in a memory-mapped file')
+    parser.add_argument('--memory_limit', help='Memory available for clustering in MB', type=int)
+    parser.add_argument('--tmp_dir', default='.', help='Directory of memory-mapped distances')
     parser.add_argument('--output', help='Output JSON filename')
     return parser.parse_args()
 
 
 def get_expression(fname, sep='\t', gene_set=[]):
     """Read expressions from file and return only expressions of genes in gene_set."""
-    df = pd.read_csv(fname, sep=sep, header=0, index_col=0, compression='gzip')
+    expression = load_expression(fname, sep)
+    index = pd.Index(expression.genes, name=expression.header[0])
+    df = pd.DataFrame(np.array(expression.values), index=index, columns=expression.header[1:2])
     df.index = df.index.map(str)
     if not gene_set:
         return df
@@ -91,10 +98,8 @@ def transform(expressions, log2=False, const=1.0, normalization=None, ddof=1):
 
 def get_distance_metric(distance_metric):
     """Get distance metric."""
-    if distance_metric == 'spearman':
-        return lambda x, y: 0.0 if x == y else 1.0 - spearmanr(x, y).correlation
-    elif distance_metric in ['pearson', 'correlation']:
-        return lambda x, y: 0.0 if x == y else 1.0 - pearsonr(x, y)[0]
+    if distance_metric == 'correlation':
+        return 'pearson'
     return distance_metric
 
 
@@ -128,12 +133,40 @@ def get_clustering(expressions,
                    linkage_method='average',
                    ordering_method=None,
                    n_keep=None,
-                   n_trials=1000):
-    """Compute linkage, order, and produce a dendrogram."""
+                   n_trials=1000,
+                   distance_strategy='auto',
+                   memory_limit=None,
+                   tmp_dir=None):
+    """Compute linkage, order, and produce a dendrogram.
+
+    Distances between genes are kept in memory or in a memory-mapped
+    file in ``tmp_dir`` depending on ``distance_strategy``. With 'auto'
+    strategy, they are memory-mapped if they do not fit in
+    ``memory_limit`` bytes.
+
+    """
     if len(expressions.index) < 2:
         return np.array([]), {'leaves': list(expressions.index)}
+    n_genes, n_samples = expressions.shape
+    if distance_strategy == 'auto':
+        try:
+            distance_strategy, estimate = choose_strategy(n_genes, n_samples, memory_limit)
+        except MemoryError as exc:
+            print(error(str(exc)))
+            raise ValueError(str(exc))
+    else:
+        estimate = estimate_memory(n_genes, n_samples, distance_strategy)
+    msg = 'Estimated memory for clustering of {} genes is {:.1f} MB.'.format(n_genes, estimate / 1024 ** 2)
+    if distance_strategy == 'memmap':
+        print(warning('{} Distances between genes are kept in a memory-mapped file.'.format(msg)))
+    else:
+        print(info(msg))
     try:
-        distances = pdist(np.array(expressions), metric=distance_metric)
+        distances = get_distances(
+            np.array(expressions),
+            metric=distance_metric,
+            out=get_buffer(n_genes, distance_strategy, tmp_dir),
+        )
         if np.isnan(distances).any():
             distances = np.nan_to_num(distances, copy=False)
             warning('Distances between some genes were undefined and were set to zero.')
@@ -189,7 +222,10 @@ def main():
         linkage_method=args.linkage,
         ordering_method=args.ordering,
         n_keep=args.n_keep,
-        n_trials=args.n_trials
+        n_trials=args.n_trials,
+        distance_strategy=args.distance_strategy,
+        memory_limit=args.memory_limit * 1024 ** 2 if args.memory_limit else None,
+        tmp_dir=args.tmp_dir
     )
     result = {
         'linkage': linkage.tolist(),
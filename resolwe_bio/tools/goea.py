@@ -8,6 +8,8 @@ import resdk
 
 from resolwe_runtime_utils import error, warning  # pylint: disable=import-error
 
+from kb_snapshot import KnowledgeBaseSnapshot
+
 
 def parse_arguments():
     """Parse command line arguments."""
@@ -20,18 +22,14 @@ def parse_arguments():
     parser.add_argument('gaf', help="GAF annotation file")
     parser.add_argument('--pval', type=float, default=0.1, help="P-value threshold")
     parser.add_argument('--min_genes', type=int, default=1, help="Minimum number of genes on a GO term.")
+    parser.add_argument('--kb_snapshot', help="Knowledge base snapshot used instead of the knowledge base server.")
     return parser.parse_args()
 
 
-def main():
-    """Invoke when run directly as a program."""
-    args = parse_arguments()
-
+def map_features_server(args, genes):
+    """Map features to the target database using the knowledge base server."""
     res = resdk.Resolwe()
 
-    with open(args.feature_ids) as gene_file:
-        genes = [gene.strip() for gene in gene_file]
-
     org_features = res.feature.filter(source=args.source_db, species=args.species, feature_id=genes)
 
     if len(org_features) == 0:
@@ -39,32 +37,85 @@ def main():
         exit(1)
 
     if args.source_db == args.target_db:
-        target_ids = genes
-    else:
-        mapping_res = res.mapping.filter(
-            source_db=args.source_db,
-            source_species=args.species,
-            target_db=args.target_db,
-            target_species=args.species,
-            source_id=genes,
-        )
-
-        if len(mapping_res) == 0:
+        return genes
+
+    mapping_res = res.mapping.filter(
+        source_db=args.source_db,
+        source_species=args.species,
+        target_db=args.target_db,
+        target_species=args.species,
+        source_id=genes,
+    )
+
+    if len(mapping_res) == 0:
+        print(error("Failed to map features."))
+        exit(1)
+
+    mappings = {}
+    for m in mapping_res:
+        if m.source_id in genes:
+            if m.source_id not in mappings:
+                mappings[m.source_id] = m.target_id
+            else:
+                print(warning("Mapping {} returned multiple times.".format(m)))
+
+    if len(genes) > len(mappings):
+        print(warning("Not all features could be mapped."))
+
+    return mappings.values()
+
+
+def map_features_snapshot(args, genes):
+    """Map features to the target database using a knowledge base snapshot."""
+    with KnowledgeBaseSnapshot(args.kb_snapshot) as snapshot:
+        try:
+            features = snapshot.get_features(args.source_db, args.species)
+        except KeyError:
+            features = []
+
+        if not any(gene in features for gene in genes):
+            print(error("No genes were fetched from the knowledge base."))
+            exit(1)
+
+        if args.source_db == args.target_db:
+            return genes
+
+        try:
+            mapping_table = snapshot.get_mappings(args.source_db, args.species, args.target_db, args.species)
+        except KeyError:
             print(error("Failed to map features."))
             exit(1)
 
         mappings = {}
-        for m in mapping_res:
-            if m.source_id in genes:
-                if m.source_id not in mappings:
-                    mappings[m.source_id] = m.target_id
-                else:
-                    print(warning("Mapping {} returned multiple times.".format(m)))
+        for gene, target_ids in mapping_table.translate(genes).items():
+            if not target_ids:
+                continue
+
+            mappings[gene] = target_ids[0]
+            if len(target_ids) > 1:
+                print(warning("Feature {} is mapped to multiple features.".format(gene)))
+
+    if not mappings:
+        print(error("Failed to map features."))
+        exit(1)
+
+    if len(genes) > len(mappings):
+        print(warning("Not all features could be mapped."))
+
+    return mappings.values()
 
-        if len(genes) > len(mappings):
-            print(warning("Not all features could be mapped."))
 
-        target_ids = mappings.values()
+def main():
+    """Invoke when run directly as a program."""
+    args = parse_arguments()
+
+    with open(args.feature_ids) as gene_file:
+        genes = [gene.strip() for gene in gene_file]
+
+    if args.kb_snapshot:
+        target_ids = map_features_snapshot(args, genes)
+    else:
+        target_ids = map_features_server(args, genes)
 
     with tempfile.NamedTemporaryFile() as input_genes:
         input_genes.write(' '.join(target_ids).encode("UTF-8"))
@@ -0,0 +1,225 @@
+"""Read knowledge base snapshots.
+
+Snapshots are created with the ``export_kb_snapshot`` django-admin
+command and allow tools to look up features and mappings without
+querying the knowledge base server.
+
+Snapshot file layout (all integers are little-endian unsigned 64-bit):
+
+- header: magic bytes, offset and length of the table of contents
+- data blocks, each starting at an offset aligned to 8 bytes
+- table of contents: a JSON object describing the feature tables
+  (one per source and species) and mapping tables (one per source
+  database, source species, target database and target species)
+
+Strings are stored in string arrays: ``count + 1`` offsets followed by
+concatenated UTF-8 encoded strings. Feature ids and mapping source ids
+are sorted by their encoded value, so they are found with a binary
+search directly in the memory-mapped file.
+
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import json
+import mmap
+import struct
+
+# NOTE: Keep in sync with ``resolwe_bio.kb.snapshot``.
+MAGIC = b'RBKBSNP1'
+HEADER = struct.Struct('<8sQQ')
+OFFSET = struct.Struct('<Q')
+
+
+class IntegerArray(object):
+    """Array of integers stored in a memory-mapped snapshot."""
+
+    def __init__(self, mapped, offset, count):
+        """Initialize the array."""
+        self.mapped = mapped
+        self.offset = offset
+        self.count = count
+
+    def __len__(self):
+        """Return the number of integers."""
+        return self.count
+
+    def __getitem__(self, index):
+        """Return integer at ``index``."""
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+
+        return OFFSET.unpack_from(self.mapped, self.offset + index * OFFSET.size)[0]
+
+
+class StringArray(object):
+    """Array of strings stored in a memory-mapped snapshot."""
+
+    def __init__(self, mapped, offset, count):
+        """Initialize the array."""
+        self.mapped = mapped
+        self.count = count
+        self.offsets = IntegerArray(mapped, offset, count + 1)
+        self.data_offset = offset + (count + 1) * OFFSET.size
+
+    def __len__(self):
+        """Return the number of strings."""
+        return self.count
+
+    def get_bytes(self, index):
+        """Return encoded string at ``index``."""
+        start = self.data_offset + self.offsets[index]
+        end = self.data_offset + self.offsets[index + 1]
+        return self.mapped[start:end]
+
+    def __getitem__(self, index):
+        """Return string at ``index``."""
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+
+        return self.get_bytes(index).decode('utf-8')
+
+    def __iter__(self):
+        """Iterate over all strings."""
+        for index in range(self.count):
+            yield self[index]
+
+    def find(self, value):
+        """Return index of ``value`` in a sorted array or ``None`` if missing."""
+        value = value.encode('utf-8')
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.get_bytes(middle) < value:
+                low = middle + 1
+            else:
+                high = middle
+
+        if low < self.count and self.get_bytes(low) == value:
+            return low
+
+        return None
+
+
+class FeatureTable(object):
+    """Features of a single source and species."""
+
+    def __init__(self, mapped, entry):
+        """Initialize the table from its table of contents entry."""
+        self.source = entry['source']
+        self.species = entry['species']
+        self.feature_ids = StringArray(mapped, entry['feature_ids'], entry['count'])
+        self.names = StringArray(mapped, entry['names'], entry['count'])
+        self.attributes = StringArray(mapped, entry['attributes'], entry['count'])
+
+    def __len__(self):
+        """Return the number of features."""
+        return len(self.feature_ids)
+
+    def __contains__(self, feature_id):
+        """Check if feature with ``feature_id`` exists."""
+        return self.feature_ids.find(feature_id) is not None
+
+    def get(self, feature_id):
+        """Return feature with ``feature_id`` as a dict or ``None`` if missing."""
+        index = self.feature_ids.find(feature_id)
+        if index is None:
+            return None
+
+        feature = json.loads(self.attributes[index])
+        feature.update({
+            'source': self.source,
+            'species': self.species,
+            'feature_id': feature_id,
+            'name': self.names[index],
+        })
+        return feature
+
+    def filter(self, feature_ids):
+        """Return a list of existing features with the given ids."""
+        features = (self.get(feature_id) for feature_id in feature_ids)
+        return [feature for feature in features if feature is not None]
+
+
+class MappingTable(object):
+    """Mappings between two databases and species."""
+
+    def __init__(self, mapped, entry):
+        """Initialize the table from its table of contents entry."""
+        self.source_ids = StringArray(mapped, entry['source_ids'], entry['source_count'])
+        self.starts = IntegerArray(mapped, entry['starts'], entry['source_count'] + 1)
+        self.target_ids = StringArray(mapped, entry['target_ids'], entry['count'])
+        self.relation_types = StringArray(mapped, entry['relation_types'], entry['count'])
+
+    def __len__(self):
+        """Return the number of mappings."""
+        return len(self.target_ids)
+
+    def get(self, source_id):
+        """Return a list of (target id, relation type) tuples of ``source_id``."""
+        index = self.source_ids.find(source_id)
+        if index is None:
+            return []
+
+        return [
+            (self.target_ids[position], self.relation_types[position])
+            for position in range(self.starts[index], self.starts[index + 1])
+        ]
+
+    def translate(self, source_ids):
+        """Return a dict of lists of target ids by the given source ids."""
+        return {
+            source_id: [target_id for target_id, _ in self.get(source_id)]
+            for source_id in source_ids
+        }
+
+
+class KnowledgeBaseSnapshot(object):
+    """Memory-mapped knowledge base snapshot."""
+
+    def __init__(self, file_name):
+        """Open snapshot ``file_name``."""
+        with open(file_name, 'rb') as handle:
+            self.mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, toc_offset, toc_length = HEADER.unpack_from(self.mapped, 0)
+        if magic != MAGIC:
+            raise ValueError("File '{}' is not a knowledge base snapshot.".format(file_name))
+
+        toc = json.loads(self.mapped[toc_offset:toc_offset + toc_length].decode('utf-8'))
+
+        self.features = {
+            (entry['source'], entry['species']): entry
+            for entry in toc['features']
+        }
+        self.mappings = {
+            (entry['source_db'], entry['source_species'], entry['target_db'], entry['target_species']): entry
+            for entry in toc['mappings']
+        }
+
+    def close(self):
+        """Close the snapshot."""
+        self.mapped.close()
+
+    def __enter__(self):
+        """Enter the context."""
+        return self
+
+    def __exit__(self, *args):
+        """Close the snapshot when leaving the context."""
+        self.close()
+
+    def get_features(self, source, species):
+        """Return :class:`FeatureTable` of ``source`` and ``species``.
+
+        Raise ``KeyError`` if the snapshot has no such features.
+
+        """
+        return FeatureTable(self.mapped, self.features[(source, species)])
+
+    def get_mappings(self, source_db, source_species, target_db, target_species):
+        """Return :class:`MappingTable` of the given databases and species.
+
+        Raise ``KeyError`` if the snapshot has no such mappings.
+
+        """
+        return MappingTable(self.mapped, self.mappings[(source_db, source_species, target_db, target_species)])
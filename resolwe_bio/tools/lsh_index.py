@@ -0,0 +1,151 @@
+"""Approximate nearest neighbour index of expression profiles.
+
+Profiles are hashed with random hyperplane locality-sensitive hashing:
+in each of the index tables, a signature of a profile holds signs of its
+projections on a set of random hyperplanes. Profiles with a small angle
+between them are likely to have the same signature in at least one of
+the tables, so neighbours of a query profile are searched for only
+among profiles sharing a signature with it (or, with a probing radius,
+differing from it in at most that many bits).
+
+Correlations of standardized profiles (rows centered and scaled to unit
+norm) are their cosine similarities, so the index finds candidates for
+correlation-based scoring, which are then scored exactly.
+
+The index is saved as a NumPy ``.npz`` archive with arrays:
+
+- ``genes``: gene ids in the order of indexed profiles
+- ``planes``: tables x bits x time points random hyperplanes
+- ``<metric>_order``: for each table, indices of profiles sorted by
+  their signatures
+- ``<metric>_signatures``: for each table, sorted signatures
+
+"""
+from __future__ import absolute_import, division, print_function
+
+import itertools
+
+import numpy as np
+
+DEFAULT_TABLES = 8
+DEFAULT_BITS = 12
+DEFAULT_RADIUS = 1
+
+
+def get_signatures(profiles, planes):
+    """Return tables x profiles signatures of profiles.
+
+    Profiles with NaN values get an all-zero signature.
+
+    """
+    powers = 1 << np.arange(planes.shape[1], dtype=np.int64)
+    signatures = np.empty((planes.shape[0], len(profiles)), dtype=np.int64)
+    with np.errstate(invalid='ignore'):
+        for table, table_planes in enumerate(planes):
+            signatures[table] = (profiles.dot(table_planes.T) > 0).dot(powers)
+    return signatures
+
+
+class LSHIndex(object):
+    """Random hyperplane LSH index of expression profiles."""
+
+    def __init__(self, genes, planes, tables):
+        """Initialize the index.
+
+        :param list genes: gene ids in the order of indexed profiles
+        :param planes: tables x bits x time points array of hyperplanes
+        :param dict tables: pairs of profile indices sorted by
+            signatures and sorted signatures by metrics
+
+        """
+        self.genes = genes
+        self.planes = planes
+        self.tables = tables
+
+    @property
+    def metrics(self):
+        """Return a sorted list of indexed metrics."""
+        return sorted(self.tables)
+
+    @classmethod
+    def build(cls, genes, profiles, tables=DEFAULT_TABLES, bits=DEFAULT_BITS, seed=0):
+        """Build an index of profiles.
+
+        :param list genes: gene ids of profiles
+        :param dict profiles: genes x time points matrices of
+            standardized profiles by metrics
+        :param int tables: number of hash tables
+        :param int bits: number of hyperplanes (signature bits) of
+            each table
+        :param int seed: seed of random hyperplanes
+
+        """
+        if not 0 < bits < 63:
+            raise ValueError("Number of bits must be between 1 and 62.")
+
+        n_cols = next(iter(profiles.values())).shape[1] if profiles else 0
+        planes = np.random.RandomState(seed).standard_normal((tables, bits, n_cols))
+
+        hash_tables = {}
+        for metric, metric_profiles in profiles.items():
+            signatures = get_signatures(metric_profiles, planes)
+            order = np.argsort(signatures, axis=1, kind='mergesort')
+            hash_tables[metric] = (order, signatures[np.arange(tables)[:, np.newaxis], order])
+
+        return cls(list(genes), planes, hash_tables)
+
+    @classmethod
+    def load(cls, file_name):
+        """Load the index from file ``file_name``."""
+        with np.load(file_name) as archive:
+            genes = archive['genes'].tolist()
+            planes = archive['planes']
+            metrics = [name[:-len('_order')] for name in archive.files if name.endswith('_order')]
+            tables = {
+                metric: (archive['{}_order'.format(metric)], archive['{}_signatures'.format(metric)])
+                for metric in metrics
+            }
+        return cls(genes, planes, tables)
+
+    def save(self, file_name):
+        """Save the index to file ``file_name``."""
+        arrays = {'genes': np.array(self.genes), 'planes': self.planes}
+        for metric, (order, signatures) in self.tables.items():
+            arrays['{}_order'.format(metric)] = order
+            arrays['{}_signatures'.format(metric)] = signatures
+
+        # Archive is written to an open file, so NumPy does not append
+        # ``.npz`` extension to the file name.
+        with open(file_name, 'wb') as handle:
+            np.savez(handle, **arrays)
+
+    def query(self, metric, profile, radius=DEFAULT_RADIUS):
+        """Return sorted indices of candidate neighbours of ``profile``.
+
+        Candidates share a signature with the standardized ``profile``
+        in at least one table or differ from it in at most ``radius``
+        bits.
+
+        """
+        if metric not in self.tables:
+            raise ValueError("Metric {} is not indexed.".format(metric))
+        order, signatures = self.tables[metric]
+
+        bits = self.planes.shape[1]
+        masks = [0]
+        for distance in range(1, radius + 1):
+            for flipped in itertools.combinations(range(bits), distance):
+                masks.append(sum(1 << bit for bit in flipped))
+        masks = np.array(masks, dtype=np.int64)
+
+        query_signatures = get_signatures(profile[np.newaxis, :], self.planes)[:, 0]
+        candidates = []
+        for table, signature in enumerate(query_signatures):
+            probes = signature ^ masks
+            starts = np.searchsorted(signatures[table], probes, side='left')
+            ends = np.searchsorted(signatures[table], probes, side='right')
+            candidates.extend(order[table][start:end] for start, end in zip(starts, ends) if start < end)
+
+        if not candidates:
+            return np.zeros(0, dtype=int)
+        return np.unique(np.concatenate(candidates))
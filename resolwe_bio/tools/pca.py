@@ -10,6 +10,8 @@ from sklearn.decomposition import PCA  # pylint: disable=import-error
 
 from resolwe_runtime_utils import warning
 
+from expression_cache import load_expression  # pylint: disable=import-error
+
 
 def get_args():
     """Parse command-line arguments."""
@@ -91,12 +93,9 @@ def save_pca(result={}, sample_ids=[], output_fn=None, max_size=10):
 
 def read_csv(fname):
     """Read CSV file and return Pandas DataFrame."""
-    dtype = {
-        'Gene': str,
-        'Expression': float,
-    }
-    csv = pd.read_csv(fname, sep='\t', header=0, dtype=dtype, low_memory=False)
-    return csv.set_index('Gene')
+    expression = load_expression(fname)
+    index = pd.Index(expression.genes, name=expression.header[0])
+    return pd.DataFrame(np.array(expression.values), index=index, columns=expression.header[1:2])
 
 
 def get_csv(fnames):
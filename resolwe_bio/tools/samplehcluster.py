@@ -9,13 +9,14 @@ import sys
 
 import numpy as np
 import pandas as pd
-from scipy.stats import spearmanr, pearsonr, zscore
+from scipy.stats import zscore
 from scipy.cluster.hierarchy import dendrogram, linkage
-from scipy.spatial.distance import pdist
 
 from resolwe_runtime_utils import error, warning
 
+from clustering_distances import get_distances
 from clustering_leaf_ordering import knn, optimal, simulated_annealing
+from expression_cache import load_expression
 
 
 def parse_args():
@@ -38,7 +39,9 @@ def parse_args():
 
 def get_expression(fname, sep='\t', gene_set=[]):
     """Read expressions from file and return only expressions of genes in gene_set."""
-    df = pd.read_csv(fname, sep='\t', header=0, index_col=0, compression='gzip')
+    expression = load_expression(fname, sep)
+    index = pd.Index(expression.genes, name=expression.header[0])
+    df = pd.DataFrame(np.array(expression.values), index=index, columns=expression.header[1:2])
     df.index = df.index.map(str)
     if not gene_set:
         return df
@@ -90,10 +93,8 @@ def transform(expressions, log2=False, const=1.0, normalization=None, ddof=1):
 
 def get_distance_metric(distance_metric):
     """Get distance metric."""
-    if distance_metric == 'spearman':
-        return lambda x, y: 1.0 - spearmanr(x, y).correlation
-    elif distance_metric == 'pearson':
-        return 'correlation'
+    if distance_metric == 'correlation':
+        return 'pearson'
     return distance_metric
 
 
@@ -128,7 +129,7 @@ def get_clustering(
     if len(expressions.columns) < 2:
         return np.array([]), {'leaves': list(range(len(expressions.columns)))}
     try:
-        distances = pdist(np.transpose(np.array(expressions)), metric=distance_metric)
+        distances = get_distances(np.transpose(np.array(expressions)), metric=distance_metric)
         if np.isnan(distances).any():
             distances = np.nan_to_num(distances, copy=False)
             warning('Distances between some samples were undefined and were set to zero.')
@@ -71,6 +71,8 @@ setup(
         ],
         'test': [
             'check-manifest',
+            # required by tests of tool libraries
+            'numpy',
             # pycodestyle 2.3.0 raises false-positive for variables
             # starting with 'def'
             # https://github.com/PyCQA/pycodestyle/issues/617
@@ -8,12 +8,13 @@ from resolwe.api_urls import api_router as resolwe_router
 from resolwe.elastic import routers as search_routers
 from resolwe.flow.views import EntityViewSet
 from resolwe_bio.kb.views import (FeatureSearchViewSet, FeatureAutocompleteViewSet, FeatureViewSet,
-                                  MappingViewSet, MappingSearchViewSet)
+                                  MappingViewSet, MappingSearchViewSet, MappingTranslateViewSet)
 
 api_router = routers.DefaultRouter(trailing_slash=False)  # pylint: disable=invalid-name
 api_router.register(r'sample', EntityViewSet)
 api_router.register(r'kb/feature/admin', FeatureViewSet)
 api_router.register(r'kb/mapping/admin', MappingViewSet)
+api_router.register(r'kb/mapping/translate', MappingTranslateViewSet, 'kb_mapping_translate')
 
 search_router = search_routers.SearchRouter(trailing_slash=False)  # pylint: disable=invalid-name
 search_router.register(r'kb/feature/search', FeatureSearchViewSet, 'kb_feature_search')